@@ -1,58 +1,194 @@
-"""
-LeadMatchAgent
-主调度器，负责智能线索匹配流程控制。
-"""
-from tools.icp_loader import ICPLoader
-from tools.context_loader import ContextLoader
-from tools.llm_client import LLMClient
-from tools.result_persister import MatchResultPersister
-from typing import List, Dict
-import datetime
-from agents.base_agent import BaseAgent
-
-class LeadMatchAgent(BaseAgent):
-    """
-    智能线索匹配主调度器
-    """
-    def __init__(self, icp_loader=None, context_loader=None, llm_client=None, persister=None):
-        self.icp_loader = icp_loader or ICPLoader()
-        self.context_loader = context_loader or ContextLoader()
-        self.llm_client = llm_client or LLMClient()
-        self.persister = persister or MatchResultPersister()
-
-    def run_sync(self, customer_id: str, leads_list: List[Dict]) -> List[Dict]:
-        """
-        执行主流程：对每个lead进行智能匹配，返回结构化结果列表。
-        :param customer_id: 客户ID
-        :param leads_list: 线索列表，每条为dict
-        :return: 匹配结果列表
-        """
-        icp = self.icp_loader.load(customer_id)
-        results = []
-        for lead in leads_list:
-            context = self.context_loader.load(lead)
-            match_result = self.llm_client.match(icp, lead, context)
-            result_record = {
-                "customer_id": customer_id,
-                "lead_id": lead.get("id"),
-                **match_result,
-                "model": self.llm_client.model_name,
-                "prompt_version": self.llm_client.prompt_version,
-                "timestamp": datetime.datetime.now().isoformat()
-            }
-            results.append(result_record)
-        self.persister.save_batch(results)
-        return results
-
-    async def run(self, input: Dict) -> Dict:
-        """
-        统一异步入口，兼容 BaseAgent 规范。
-        :param input: {"customer_id": str, "leads_list": List[Dict]}
-        :return: {"results": List[Dict]}
-        """
-        customer_id = input.get("customer_id")
-        if not customer_id:
-            raise ValueError("customer_id 不能为空")
-        leads_list = input.get("leads_list", [])
-        results = self.run_sync(customer_id, leads_list)
-        return {"results": results} 
\ No newline at end of file
+"""
+LeadMatchAgent
+主调度器，负责智能线索匹配流程控制。
+"""
+from tools.icp_loader import ICPLoader
+from tools.context_loader import ContextLoader
+from tools.llm_client import LLMClient
+from tools.result_persister import MatchResultPersister
+from tools.model_router import ModelRouter
+from tools.context_compactor import ContextCompactor
+from typing import Any, Callable, List, Dict, Optional
+import asyncio
+import datetime
+from agents.base_agent import BaseAgent
+from utils.lead_scorer import LeadScorer, REJECT, ESCALATE
+
+class LeadMatchAgent(BaseAgent):
+    """
+    智能线索匹配主调度器
+    """
+    def __init__(self, icp_loader=None, context_loader=None, llm_client=None, persister=None, max_concurrency: Optional[int] = None,
+                 batch_mode: bool = False, pre_score: bool = True, scorer_options: Optional[Dict] = None,
+                 model_tiers: Optional[List[Dict]] = None, router=None, streaming: bool = False,
+                 label_only: bool = False, on_verdict: Optional[Callable[[Dict, bool], Any]] = None,
+                 context_budget: Optional[int] = 400, compactor=None):
+        self.icp_loader = icp_loader or ICPLoader()
+        self.context_loader = context_loader or ContextLoader()
+        self.llm_client = llm_client or LLMClient()
+        self.persister = persister or MatchResultPersister()
+        # 同时处理的线索数，默认与大模型客户端的并发上限一致（客户端没有该属性时为8）
+        self.max_concurrency = max_concurrency or getattr(self.llm_client, "max_concurrency", 8)
+        # 批量模式：多条线索打包进一个请求（LLMClient.amatch_many）
+        self.batch_mode = batch_mode
+        # 规则预评分：明显不符的线索直接拒绝、明显符合的直接通过，只有不确定区间的线索调用大模型
+        self.pre_score = pre_score
+        self.scorer_options = scorer_options or {}
+        # 模型分级路由：配置 model_tiers 后逐条匹配先用便宜模型，置信度不足再升级（批量模式不使用）
+        self.router = router or (ModelRouter(self.llm_client, model_tiers) if model_tiers else None)
+        # 流式模式：结论先于理由输出，结论到达即回调 on_verdict(lead, qualified)；label_only 时不生成理由
+        self.streaming = streaming
+        self.label_only = label_only
+        self.on_verdict = on_verdict
+        # 上下文压缩：每条线索（线索+上下文）放入prompt的token上限，None表示不压缩
+        self.compactor = compactor or (ContextCompactor(context_budget) if context_budget else None)
+
+    def run_sync(self, customer_id: str, leads_list: List[Dict]) -> List[Dict]:
+        """
+        同步执行主流程（内部使用异步并发匹配引擎）。
+        :param customer_id: 客户ID
+        :param leads_list: 线索列表，每条为dict
+        :return: 匹配结果列表
+        """
+        return asyncio.run(self.match_leads(customer_id, leads_list))
+
+    async def match_leads(self, customer_id: str, leads_list: List[Dict]) -> List[Dict]:
+        """
+        并发匹配：最多 max_concurrency 个线索同时在途（模型RPM/TPM限速与重试由LLMClient负责），
+        结果按输入顺序写回。batch_mode 下按token预算把多条线索打包进一个请求。
+        pre_score 时先做规则预评分，只有不确定区间的线索调用大模型。
+        :param customer_id: 客户ID
+        :param leads_list: 线索列表，每条为dict
+        :return: 匹配结果列表，与leads_list一一对应
+        """
+        icp = self.icp_loader.load(customer_id)
+        results: List[Optional[Dict]] = [None] * len(leads_list)
+        details: List[Optional[Dict]] = [None] * len(leads_list)
+        pending = list(range(len(leads_list)))
+        if self.pre_score:
+            details = LeadScorer.compile(icp, **self.scorer_options).score_many(leads_list)
+            pending = []
+            for index, detail in enumerate(details):
+                if detail["decision"] == ESCALATE:
+                    pending.append(index)
+                else:
+                    results[index] = self._build_record(customer_id, leads_list[index], self._rule_result(detail), detail)
+
+        if self.batch_mode:
+            try:
+                contexts = await self._load_contexts([leads_list[i] for i in pending])
+                inputs = [self._prompt_inputs(icp, leads_list[i], context) for i, context in zip(pending, contexts)]
+                leads = [lead for lead, _ in inputs]
+                contexts = [context for _, context in inputs]
+                match_results = await self.llm_client.amatch_many(icp, leads, contexts)
+            except Exception as e:
+                # 与逐条匹配一致：受影响的线索记录失败结果，不中断整批
+                print(f"批量匹配 {len(pending)} 条线索失败: {e}")
+                match_results = [{"qualified": False, "reason": f"匹配失败: {e}", "source": "异常"} for _ in pending]
+            for index, match_result in zip(pending, match_results):
+                results[index] = self._build_record(customer_id, leads_list[index], match_result, details[index])
+        else:
+            contexts = dict(zip(pending, await self._load_contexts([leads_list[i] for i in pending])))
+            next_index = 0
+
+            async def worker():
+                nonlocal next_index
+                while next_index < len(pending):
+                    index = pending[next_index]
+                    next_index += 1
+                    try:
+                        match_result = await self._match_one(icp, leads_list[index], contexts.pop(index), index, details)
+                    except Exception as e:
+                        # 单条线索失败只记录该条，不中断整批
+                        print(f"线索 {leads_list[index].get('id')} 匹配失败: {e}")
+                        match_result = {"qualified": False, "reason": f"匹配失败: {e}", "source": "异常"}
+                    results[index] = self._build_record(customer_id, leads_list[index], match_result, details[index])
+
+            workers = min(self.max_concurrency, len(pending))
+            await asyncio.gather(*(worker() for _ in range(workers)))
+        await self._save_batch(results)
+        return results
+
+    async def _match_one(self, icp: Dict, lead: Dict, context: Dict, index: int, details: List[Optional[Dict]]) -> Dict:
+        """
+        逐条匹配一条线索：模型分级路由 / 流式 / 普通匹配。
+        """
+        prompt_lead, context = self._prompt_inputs(icp, lead, context)
+        if self.router is not None:
+            match_result = await self.router.amatch(icp, prompt_lead, context)
+            # 路由过程记录到 score_detail
+            details[index] = dict(details[index] or {}, route=match_result.pop("route"))
+            return match_result
+        if self.streaming:
+            on_verdict = (lambda qualified: self.on_verdict(lead, qualified)) if self.on_verdict else None
+            return await self.llm_client.astream_match(icp, prompt_lead, context, label_only=self.label_only,
+                                                       on_verdict=on_verdict)
+        return await self.llm_client.amatch(icp, prompt_lead, context)
+
+    async def _load_contexts(self, leads: List[Dict]) -> List[Dict]:
+        """
+        批量加载上下文（按公司域名去重查询）；不支持 load_many 的加载器逐条加载。
+        """
+        load_many = getattr(self.context_loader, "load_many", None)
+        if load_many is not None:
+            return await load_many(leads)
+        return [self.context_loader.load(lead) for lead in leads]
+
+    async def _save_batch(self, results: List[Dict]):
+        """
+        持久化匹配结果；不支持 asave_batch 的持久化器在线程中调用 save_batch，不阻塞事件循环。
+        """
+        asave_batch = getattr(self.persister, "asave_batch", None)
+        if asave_batch is not None:
+            return await asave_batch(results)
+        return await asyncio.to_thread(self.persister.save_batch, results)
+
+    def _prompt_inputs(self, icp: Dict, lead: Dict, context: Dict):
+        """
+        按token预算压缩线索与上下文（prompt实际使用的输入）。
+        """
+        if self.compactor is None:
+            return lead, context
+        return self.compactor.compact(icp, lead, context)
+
+    @staticmethod
+    def _rule_result(detail: Dict) -> Dict:
+        """
+        规则预评分直接判定的结果（不调用大模型）。
+        """
+        if detail["decision"] == REJECT:
+            reasons = detail["hard_fail"] or [name for name, value in detail["components"].items() if value == 0.0]
+            reason = f"规则预筛拒绝：{'、'.join(reasons)} 不符（得分 {detail['rule_score']}）"
+        else:
+            reason = f"规则预筛通过：各维度均符合（得分 {detail['rule_score']}）"
+        return {"qualified": detail["decision"] != REJECT, "reason": reason, "source": "规则预筛"}
+
+    def _build_record(self, customer_id: str, lead: Dict, match_result: Dict, score_detail: Optional[Dict] = None) -> Dict:
+        """
+        组装单条匹配结果记录（含规则预评分 lead_score/score_detail）。
+        规则预筛直接判定的记录没有调用模型，model 与 prompt_version 为 None。
+        """
+        by_rule = match_result.get("source") == "规则预筛"
+        return {
+            "customer_id": customer_id,
+            "lead_id": lead.get("id"),
+            **match_result,
+            "lead_score": score_detail.get("rule_score") if score_detail else None,
+            "score_detail": score_detail,
+            "model": None if by_rule else match_result.get("model") or self.llm_client.model_name,
+            "prompt_version": None if by_rule else self.llm_client.prompt_version,
+            "timestamp": datetime.datetime.now().isoformat()
+        }
+
+    async def run(self, input: Dict) -> Dict:
+        """
+        统一异步入口，兼容 BaseAgent 规范。
+        :param input: {"customer_id": str, "leads_list": List[Dict]}
+        :return: {"results": List[Dict]}
+        """
+        customer_id = input.get("customer_id")
+        if not customer_id:
+            raise ValueError("customer_id 不能为空")
+        leads_list = input.get("leads_list", [])
+        results = await self.match_leads(customer_id, leads_list)
+        return {"results": results}
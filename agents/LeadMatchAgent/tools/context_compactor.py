@@ -0,0 +1,212 @@
+"""
+ContextCompactor
+负责在token预算内压缩线索与上下文，控制每条线索的prompt大小。
+"""
+from dataclasses import asdict, is_dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from tools.prompt_template import canonical_dumps
+from utils.token_estimator import estimate_tokens
+
+# 字段规则：priority 越小越先放入预算；max_chars 截断字符串，max_items/item_chars 截断列表；drop 表示从不放入prompt
+# 按完整路径（如 "context.company.name"）或字段名查找，找不到时使用 DEFAULT_RULE
+DEFAULT_FIELD_RULES: Dict[str, Dict[str, Any]] = {
+    "id": {"priority": 0},
+    "company_name": {"priority": 0, "max_chars": 80},
+    "name": {"priority": 0, "max_chars": 80},
+    "job_title": {"priority": 0, "max_chars": 80},
+    "company_industry": {"priority": 0, "max_chars": 60},
+    "industry": {"priority": 0, "max_chars": 60},
+    "company_country": {"priority": 0},
+    "company_country_code": {"priority": 1},
+    "region": {"priority": 0},
+    "company_size": {"priority": 0},
+    "seniority": {"priority": 1},
+    "department": {"priority": 1},
+    "company_domain": {"priority": 1},
+    "company_website": {"priority": 1},
+    "website": {"priority": 1},
+    "company_location": {"priority": 1, "max_chars": 80},
+    "product_desc": {"priority": 1, "max_chars": 200},
+    "desc": {"priority": 1, "max_chars": 200},
+    "product_keywords": {"priority": 1, "max_items": 10, "item_chars": 30},
+    "keywords": {"priority": 1, "max_items": 10, "item_chars": 30},
+    "language": {"priority": 2},
+    "summary": {"priority": 2, "max_chars": 300},
+    "jobs": {"priority": 2, "max_items": 3, "item_chars": 80},
+    "educations": {"priority": 3, "max_items": 2, "item_chars": 60},
+    "linkedin": {"priority": 3, "max_chars": 100},
+    "work_email": {"priority": 3},
+    # 联系方式与系统字段对匹配判断没有帮助
+    "personal_email": {"drop": True},
+    "tels": {"drop": True},
+    "facebook": {"drop": True},
+    "twitter": {"drop": True},
+    "instagram": {"drop": True},
+    "youtube": {"drop": True},
+    "tiktok": {"drop": True},
+    "pinterest": {"drop": True},
+    "reddit": {"drop": True},
+    "google_map": {"drop": True},
+    "line": {"drop": True},
+    "whatsapp": {"drop": True},
+    "zalo": {"drop": True},
+    "telegram": {"drop": True},
+    "lead_score": {"drop": True},
+    "score_detail": {"drop": True},
+    "match_status": {"drop": True},
+    "match_status_history": {"drop": True},
+}
+DEFAULT_RULE = {"priority": 2, "max_chars": 200, "max_items": 5, "item_chars": 60}
+
+_ELLIPSIS = "…"
+
+
+class ContextCompactor:
+    """
+    按token预算压缩线索与上下文：
+    - 按字段优先级依次放入，超出预算的低优先级字段丢弃，放不下的长文本按剩余预算截断
+    - 字符串/列表按字段规则截断，空值与联系方式等无关字段不放入
+    - 去重：与已放入字段内容相同的值（如上下文重复线索字段）、已在ICP头中原样出现的长文本不再放入
+    token数用本地估算（utils.token_estimator），不调用模型。
+    """
+    def __init__(self, token_budget: int = 400, field_rules: Optional[Dict[str, Dict[str, Any]]] = None,
+                 min_dedup_chars: int = 20, model: Optional[str] = None):
+        """
+        :param token_budget: 每条线索（线索+上下文）的token上限
+        :param field_rules: 覆盖/补充默认字段规则
+        :param min_dedup_chars: 与ICP去重的最短文本长度（短值如国家、行业是匹配依据，不去重）
+        :param model: token估算使用的模型编码
+        """
+        self.token_budget = token_budget
+        self.field_rules = {**DEFAULT_FIELD_RULES, **(field_rules or {})}
+        self.min_dedup_chars = min_dedup_chars
+        self.model = model
+
+    def _rule(self, path: str) -> Dict[str, Any]:
+        rule = self.field_rules.get(path)
+        if rule is None:
+            rule = self.field_rules.get(path.rsplit(".", 1)[-1], DEFAULT_RULE)
+        return rule
+
+    @staticmethod
+    def _normalize(value: Any) -> str:
+        return " ".join(str(value).split()).lower()
+
+    @staticmethod
+    def _truncate_text(text: str, max_chars: Optional[int]) -> str:
+        if max_chars and len(text) > max_chars:
+            return text[:max_chars - 1] + _ELLIPSIS
+        return text
+
+    def _flatten(self, value: Any, path: str, out: List[Tuple[str, Any]]):
+        if isinstance(value, dict):
+            if path and self._rule(path).get("drop"):
+                return
+            for key, item in value.items():
+                self._flatten(item, f"{path}.{key}" if path else str(key), out)
+        else:
+            out.append((path, value))
+
+    def _prepare(self, path: str, value: Any, rule: Dict[str, Any]) -> Any:
+        """按规则截断，空值返回None"""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.strip()
+            return self._truncate_text(value, rule.get("max_chars")) or None
+        if isinstance(value, (list, tuple)):
+            items = [v for v in value if v not in (None, "", [], {})]
+            max_items = rule.get("max_items")
+            if max_items:
+                items = items[:max_items]
+            item_chars = rule.get("item_chars")
+            items = [self._truncate_text(v.strip(), item_chars) if isinstance(v, str) else v for v in items]
+            return items or None
+        return value
+
+    def _cost(self, path: str, value: Any) -> int:
+        # 额外1个token计入字段间分隔符
+        return estimate_tokens(canonical_dumps({path.rsplit(".", 1)[-1]: value}), self.model) + 1
+
+    def _fit(self, path: str, value: Any, remaining: int) -> Any:
+        """放不下时按剩余预算截断字符串/列表，仍放不下返回None"""
+        if isinstance(value, str):
+            cost = self._cost(path, value)
+            keep = len(value) * remaining // max(cost, 1) - 1
+            while keep > 0:
+                candidate = value[:keep] + _ELLIPSIS
+                if self._cost(path, candidate) <= remaining:
+                    return candidate
+                keep = keep * 3 // 4
+            return None
+        if isinstance(value, list):
+            items = []
+            for item in value:
+                if self._cost(path, items + [item]) > remaining:
+                    break
+                items.append(item)
+            return items or None
+        return None
+
+    def compact(self, icp: Dict, lead: Any, context: Optional[Dict] = None) -> Tuple[Dict, Dict]:
+        """
+        压缩一条线索及其上下文。
+        :param icp: 客户画像（用于去重）
+        :param lead: 线索 dict 或 StandardizedLead
+        :param context: 上下文 dict
+        :return: (压缩后的线索, 压缩后的上下文)，结构与输入一致，只保留放入预算的字段
+        """
+        if is_dataclass(lead):
+            lead = asdict(lead)
+        items: List[Tuple[str, Any]] = []
+        self._flatten(lead or {}, "", items)
+        self._flatten(context or {}, "context", items)
+
+        icp_values: List[Any] = []
+        self._flatten(icp or {}, "", icp_values)
+        icp_text = " ".join(self._normalize(v) for _, v in icp_values if v is not None)
+
+        candidates = []
+        for order, (path, value) in enumerate(items):
+            rule = self._rule(path)
+            if rule.get("drop"):
+                continue
+            value = self._prepare(path, value, rule)
+            if value is None:
+                continue
+            candidates.append((rule.get("priority", DEFAULT_RULE["priority"]), order, path, value))
+        candidates.sort(key=lambda c: (c[0], c[1]))
+
+        remaining = self.token_budget - 2 # 预留外层括号
+        seen = set()
+        kept: Dict[str, Any] = {}
+        for _, _, path, value in candidates:
+            text = self._normalize(value if not isinstance(value, list) else " ".join(map(str, value)))
+            if text in seen:
+                continue
+            if len(text) >= self.min_dedup_chars and text in icp_text:
+                continue
+            cost = self._cost(path, value)
+            if cost > remaining:
+                value = self._fit(path, value, remaining)
+                if value is None:
+                    continue
+                cost = self._cost(path, value)
+            seen.add(text)
+            kept[path] = value
+            remaining -= cost
+
+        lead_view: Dict[str, Any] = {}
+        context_view: Dict[str, Any] = {}
+        # 按原始顺序重建嵌套结构
+        for path, _ in items:
+            if path not in kept:
+                continue
+            parts = path.split(".")
+            target = lead_view
+            if parts[0] == "context":
+                target, parts = context_view, parts[1:]
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = kept[path]
+        return lead_view, context_view
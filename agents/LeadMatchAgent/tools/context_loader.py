@@ -1,34 +1,214 @@
-"""
-ContextLoader
-负责提取 lead 上下文信息。
-
-"""
-from typing import Dict
-
-class ContextLoader:
-    """
-    上下文信息提取器
-    """
-    def load(self, lead: Dict) -> Dict:
-        """
-        根据 lead 信息提取上下文（公司、产品、联系人等）。此处为 mock 实现。
-        :param lead: 线索 dict
-        :return: 上下文 dict
-        """
-        # TODO: 可扩展为数据库/API读取
-        return {
-            "company": {
-                "name": lead.get("company_name", "未知公司"),
-                "industry": lead.get("industry", "科技"),
-                "website": lead.get("company_website", "https://example.com")
-            },
-            "product": {
-                "desc": lead.get("product_desc", "AI智能产品"),
-                "keywords": lead.get("product_keywords", ["AI", "智能"])
-            },
-            "contact": {
-                "name": lead.get("contact_name", "张三"),
-                "job_title": lead.get("job_title", "CTO"),
-                "region": lead.get("region", "中国")
-            }
-        } 
\ No newline at end of file
+"""
+ContextLoader
+负责提取 lead 上下文信息。
+
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.cache import LRUCache
+from utils.dedup import normalize_domain
+
+
+class ContextBackend(ABC):
+    """
+    公司级上下文后端接口：按域名批量查询，返回 {域名: 公司上下文}，查不到的域名不出现在结果中。
+    """
+    @abstractmethod
+    async def fetch_companies(self, domains: List[str]) -> Dict[str, Dict]:
+        pass
+
+
+class SQLiteContextBackend(ContextBackend):
+    """
+    本地SQLite公司上下文库（真实数据库/API接入前的替身）：domain 为主键，公司上下文以JSON保存。
+    查询按批使用 IN 语句，在线程中执行不阻塞事件循环。
+    """
+    def __init__(self, path: str, table: str = "company_context"):
+        self.path = path
+        self.table = table
+        self.lookups = 0 # 累计查询的域名数
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (domain TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+        self._conn.commit()
+
+    def upsert(self, companies: Dict[str, Dict]):
+        """
+        写入/更新公司上下文 {域名: 上下文}
+        """
+        rows = [(normalize_domain(domain), json.dumps(value, ensure_ascii=False)) for domain, value in companies.items()]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(f"INSERT OR REPLACE INTO {self.table} (domain, payload) VALUES (?, ?)",
+                                       [row for row in rows if row[0]])
+
+    def _fetch(self, domains: List[str]) -> Dict[str, Dict]:
+        placeholders = ",".join("?" * len(domains))
+        with self._lock:
+            self.lookups += len(domains)
+            rows = self._conn.execute(
+                f"SELECT domain, payload FROM {self.table} WHERE domain IN ({placeholders})", domains
+            ).fetchall()
+        return {domain: json.loads(payload) for domain, payload in rows}
+
+    async def fetch_companies(self, domains: List[str]) -> Dict[str, Dict]:
+        return await asyncio.to_thread(self._fetch, domains)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ContextLoader:
+    """
+    上下文信息提取器：线索自带字段 + 可选的公司级上下文（按 company_domain 从后端查询）。
+    公司上下文按域名缓存（LRU + TTL，查不到的域名也缓存），load_many 对整批线索按域名去重后分批查询。
+    """
+    def __init__(self, backend: Optional[ContextBackend] = None, cache_size: int = 10000,
+                 cache_ttl: Optional[float] = 3600, batch_size: int = 200, max_concurrency: int = 4):
+        """
+        :param backend: 公司上下文后端，None表示只使用线索自带字段
+        :param cache_size: 缓存的公司数上限（LRU淘汰）
+        :param cache_ttl: 公司上下文缓存有效期（秒），None表示一直有效
+        :param batch_size: 每次后端查询的域名数
+        :param max_concurrency: 同时进行的后端查询数
+        """
+        self.backend = backend
+        self.cache = LRUCache(cache_size)
+        self.cache_ttl = cache_ttl
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def load(self, lead: Dict, company: Optional[Dict] = None) -> Dict:
+        """
+        根据 lead 信息提取上下文（公司、产品、联系人等）。此处为 mock 实现。
+        :param lead: 线索 dict
+        :param company: 公司级上下文，None时使用缓存中的结果（不查询后端）
+        :return: 上下文 dict
+        """
+        if company is None:
+            company = self._cached(self._domain(lead)) or {}
+        return {
+            "company": {
+                "name": lead.get("company_name", "未知公司"),
+                "industry": lead.get("industry", "科技"),
+                "website": lead.get("company_website", "https://example.com"),
+                **company
+            },
+            "product": {
+                "desc": lead.get("product_desc", "AI智能产品"),
+                "keywords": lead.get("product_keywords", ["AI", "智能"])
+            },
+            "contact": {
+                "name": lead.get("contact_name", "张三"),
+                "job_title": lead.get("job_title", "CTO"),
+                "region": lead.get("region", "中国")
+            }
+        }
+
+    async def load_many(self, leads: List[Dict]) -> List[Dict]:
+        """
+        批量提取上下文：按公司域名去重，只对缓存未命中的域名分批查询后端，结果与leads一一对应。
+        """
+        domains = [self._domain(lead) for lead in leads]
+        companies = await self._load_companies(d for d in domains if d)
+        return [self.load(lead, companies.get(domain) or {}) for lead, domain in zip(leads, domains)]
+
+    @staticmethod
+    def _domain(lead: Dict) -> Optional[str]:
+        domain = lead.get("company_domain") or lead.get("company_website")
+        if not domain:
+            email = lead.get("work_email") or ""
+            domain = email.rpartition("@")[2] if "@" in email else None
+        return normalize_domain(domain)
+
+    def _cached(self, domain: Optional[str]) -> Optional[Dict]:
+        if not domain:
+            return None
+        item = self.cache.get(domain)
+        if item is None:
+            return None
+        value, created = item
+        if self.cache_ttl is not None and time.time() - created > self.cache_ttl:
+            self.cache.delete(domain)
+            return None
+        return value
+
+    async def _load_companies(self, domains: Iterable[str]) -> Dict[str, Dict]:
+        result: Dict[str, Dict] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing: List[str] = []
+        loop = asyncio.get_running_loop()
+        for domain in dict.fromkeys(domains):
+            cached = self._cached(domain)
+            inflight = self._inflight.get(domain)
+            if cached is not None:
+                result[domain] = cached
+            elif inflight is not None and inflight.get_loop() is loop:
+                # 其他调用正在查询该域名，等待其结果
+                waiting[domain] = inflight
+            elif self.backend is not None:
+                missing.append(domain)
+        owned: Dict[str, asyncio.Future] = {}
+        try:
+            if missing:
+                for domain in missing:
+                    self._inflight[domain] = waiting[domain] = owned[domain] = loop.create_future()
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+                await asyncio.gather(*(self._fetch_batch(batch, semaphore) for batch in batches))
+            for domain, future in waiting.items():
+                try:
+                    # shield：本调用被取消时不取消其他调用共享的future
+                    result[domain] = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    # 发起查询的调用被取消，本次按无公司上下文处理
+                    result[domain] = {}
+        finally:
+            # 被取消时尚未开始的批次不会执行_fetch_batch，这里兜底释放本调用登记的future
+            self._release(owned)
+        return result
+
+    def _release(self, futures: Dict[str, asyncio.Future]):
+        """移除并取消仍未完成的查询，避免后续调用等待永远不会完成的future"""
+        for domain, future in futures.items():
+            if self._inflight.get(domain) is future:
+                del self._inflight[domain]
+            if not future.done():
+                future.cancel()
+
+    async def _fetch_batch(self, domains: List[str], semaphore: asyncio.Semaphore):
+        futures = {domain: self._inflight[domain] for domain in domains if domain in self._inflight}
+        try:
+            try:
+                async with semaphore:
+                    found = await self.backend.fetch_companies(domains)
+            except Exception as e:
+                print(f"公司上下文查询失败: {e}")
+                found = None
+            for domain, future in futures.items():
+                if future.done():
+                    continue
+                if found is None:
+                    # 查询失败不缓存，本次按无公司上下文处理
+                    future.set_result({})
+                    continue
+                value = found.get(domain) or {}
+                # 查不到的域名也缓存，避免反复查询
+                self.cache.set(domain, value)
+                future.set_result(value)
+        finally:
+            # 正常结束时future均已完成；被取消时取消剩余future，等待者不会挂起
+            self._release(futures)
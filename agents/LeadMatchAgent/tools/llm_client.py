@@ -1,65 +1,583 @@
-"""
-LLMClient
-负责 prompt 构建与大模型 API 调用。
-"""
-from typing import Dict
-import openai
-import os
-
-class LLMClient:
-    """
-    大模型调用客户端
-    """
-    def __init__(self, model_name="gpt-3.5-turbo", prompt_version="v1.2"):
-        self.model_name = model_name
-        self.prompt_version = prompt_version
-        self.prompt_template_path = os.path.join(os.path.dirname(__file__), "prompt_templates", "match_prompt.txt")
-
-    def _load_prompt_template(self) -> str:
-        """
-        加载 prompt 模板，可热更新。
-        """
-        try:
-            with open(self.prompt_template_path, "r", encoding="utf-8") as f:
-                return f.read()
-        except Exception:
-            # 默认模板
-            return "请根据客户画像与线索上下文，判断是否匹配，并说明理由。"
-
-    def match(self, icp: Dict, lead: Dict, context: Dict) -> Dict:
-        """
-        构建 prompt 并调用大模型 API，返回结构化判断结果。
-        :param icp: 客户画像 dict
-        :param lead: 线索 dict
-        :param context: 上下文 dict
-        :return: {qualified, reason, source}
-        """
-        prompt = self._build_prompt(icp, lead, context)
-        # 调用 OpenAI API
-        try:
-            response = openai.ChatCompletion.create(
-                model=self.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.2
-            )
-            content = response["choices"][0]["message"]["content"]
-            # 简单结构化解析（实际可用正则/JSON等）
-            qualified = "是" in content or "匹配" in content
-            return {
-                "qualified": qualified,
-                "reason": content,
-                "source": "自动解析"
-            }
-        except Exception as e:
-            return {
-                "qualified": False,
-                "reason": f"模型调用失败: {e}",
-                "source": "异常"
-            }
-
-    def _build_prompt(self, icp: Dict, lead: Dict, context: Dict) -> str:
-        """
-        构建 prompt 内容。
-        """
-        template = self._load_prompt_template()
-        return template.format(icp=icp, lead=lead, context=context) 
\ No newline at end of file
+"""
+LLMClient
+负责 prompt 构建与大模型 API 调用。
+"""
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import openai
+import os
+import re
+import weakref
+from tools.prompt_template import PromptTemplate, TemplateManager, canonical_dumps
+from utils.cache import TieredCache
+from utils.rate_limiter import TokenBucket, backoff_delay
+from utils.singleflight import SingleFlight
+from utils.token_estimator import estimate_tokens
+
+
+# 流式模式下的结论行，如 "匹配: 是"
+_VERDICT_RE = re.compile(r"匹配\s*[:：]\s*(是|否)")
+
+
+class ModelRateLimiter:
+    """
+    单个模型的限速：RPM（每分钟请求数）与 TPM（每分钟token数）两个令牌桶。
+    """
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.requests = TokenBucket(rpm / 60, rpm) if rpm else None
+        self.tokens = TokenBucket(tpm / 60, tpm) if tpm else None
+
+    async def acquire(self, tokens: int):
+        if self.requests is not None:
+            await self.requests.acquire()
+        if self.tokens is not None:
+            await self.tokens.acquire(tokens)
+
+
+class LLMClient:
+    """
+    大模型调用客户端
+    """
+    def __init__(self, model_name="gpt-3.5-turbo", prompt_version="v1.2", max_concurrency: int = 8,
+                 rate_limits: Optional[Dict[str, Dict[str, float]]] = None, max_retries: int = 3,
+                 timeout: float = 60, async_client=None, use_cache: bool = True, cache: Optional[TieredCache] = None,
+                 cache_path: Optional[str] = "storage/llm_match_cache.db", cache_ttl: Optional[float] = None,
+                 batch_token_budget: int = 6000, max_batch_size: int = 20, template_manager: Optional[TemplateManager] = None):
+        """
+        :param max_concurrency: 异步调用的最大并发数
+        :param rate_limits: 各模型限速，如 {"gpt-3.5-turbo": {"rpm": 3500, "tpm": 90000}}
+        :param max_retries: 限流/超时/连接错误/服务端错误的最大重试次数
+        :param async_client: 可注入的 openai.AsyncOpenAI 实例
+        :param use_cache: 是否缓存匹配结果（按 ICP/线索/上下文/模型/prompt版本/模板内容寻址）
+        :param cache: 可注入的缓存，默认内存LRU + cache_path 磁盘SQLite
+        :param cache_ttl: 缓存有效期（秒），None表示模型与prompt不变时一直有效
+        :param batch_token_budget: 批量模式下单个请求的输入token预算
+        :param max_batch_size: 批量模式下单个请求最多包含的线索数
+        :param template_manager: 可注入的模板管理器（编译缓存 + 文件变化时热更新）
+        """
+        self.model_name = model_name
+        self.base_prompt_version = prompt_version
+        self.templates = template_manager or TemplateManager()
+        self.prompt_template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompt_templates", "match_prompt.txt")
+        self.batch_prompt_template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompt_templates", "batch_match_prompt.txt")
+        self.structured_prompt_template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompt_templates", "structured_match_prompt.txt")
+        self.structured_output_tokens = 120 # 结构化输出预留的输出token数
+        self.stream_prompt_template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompt_templates", "stream_match_prompt.txt")
+        self.batch_token_budget = batch_token_budget
+        self.max_batch_size = max_batch_size
+        self.batch_output_tokens = 80 # 批量模式下每条线索预留的输出token数
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits or {}
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.completion_tokens = 256 # 限速预留的输出token数
+        self._async_client = async_client
+        # 并发信号量按事件循环分别创建（run_sync 每次调用都会新建事件循环）
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+        self.cache_ttl = cache_ttl
+        self.cache = None
+        if use_cache:
+            self.cache = cache if cache is not None else TieredCache(4096, cache_path, table="llm_match")
+        self._flights = SingleFlight() # 相同输入的并发请求只调用一次模型
+
+    @property
+    def prompt_version(self) -> str:
+        """
+        prompt版本：配置的版本号 + 当前匹配模板内容哈希，模板修改后自动变化。
+        """
+        return f"{self.base_prompt_version}+{self._load_prompt_template().hash[:8]}"
+
+    @prompt_version.setter
+    def prompt_version(self, value: str):
+        self.base_prompt_version = value
+
+    def _load_prompt_template(self) -> PromptTemplate:
+        """
+        加载编译后的 prompt 模板（文件变化时热更新）。
+        """
+        # 默认模板
+        return self.templates.get(self.prompt_template_path, "请根据客户画像与线索上下文，判断是否匹配，并说明理由。")
+
+    def match(self, icp: Dict, lead: Dict, context: Dict) -> Dict:
+        """
+        构建 prompt 并调用大模型 API，返回结构化判断结果。
+        :param icp: 客户画像 dict
+        :param lead: 线索 dict
+        :param context: 上下文 dict
+        :return: {qualified, reason, source}
+        """
+        key = self._cache_key(icp, lead, context, self.model_name)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        prompt = self._build_prompt(icp, lead, context)
+        # 调用 OpenAI API
+        try:
+            response = openai.ChatCompletion.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.2
+            )
+            content = response["choices"][0]["message"]["content"]
+            result = self._parse_content(content)
+            self._cache_set(key, result)
+            return result
+        except Exception as e:
+            return {
+                "qualified": False,
+                "reason": f"模型调用失败: {e}",
+                "source": "异常"
+            }
+
+    async def amatch(self, icp: Dict, lead: Dict, context: Dict) -> Dict:
+        """
+        match 的异步版本：受并发上限与模型RPM/TPM限速约束，限流/超时等错误按抖动指数退避重试。
+        命中缓存时不调用模型；相同输入的并发请求合并为一次调用。
+        :return: {qualified, reason, source}
+        """
+        key = self._cache_key(icp, lead, context, self.model_name)
+        cached = await self._cache_aget(key)
+        if cached is not None:
+            return cached
+
+        async def call():
+            prompt = self._build_prompt(icp, lead, context)
+            result = self._parse_content(await self._acomplete(prompt, self.model_name))
+            await self._cache_aset(key, result)
+            return result
+
+        try:
+            return dict(await self._flights.do(key, call))
+        except Exception as e:
+            return {
+                "qualified": False,
+                "reason": f"模型调用失败: {e}",
+                "source": "异常"
+            }
+
+    async def amatch_structured(self, icp: Dict, lead: Dict, context: Dict, model: Optional[str] = None) -> Dict:
+        """
+        结构化匹配：模型输出带置信度的JSON，供模型分级路由使用。
+        回复无法解析时置信度记为0（由路由升级到更强的模型）。
+        :param model: 使用的模型，默认 model_name
+        :return: {qualified, confidence, reason, source, model}
+        """
+        model = model or self.model_name
+        template = self._load_structured_prompt_template()
+        key = self._cache_key(icp, lead, context, model, template)
+        cached = await self._cache_aget(key)
+        if cached is not None:
+            return cached
+
+        async def call():
+            prompt = template.render(icp=icp, lead=lead, context=context)
+            content = await self._acomplete(prompt, model, max_tokens=self.structured_output_tokens)
+            result = self._parse_structured_content(content)
+            if result is None:
+                # 不缓存无法解析的回复；连结论行也没有时抛出，置信度同样记为0
+                return dict(self._parse_content(content), confidence=0.0, model=model)
+            result["model"] = model
+            await self._cache_aset(key, result)
+            return result
+
+        try:
+            return dict(await self._flights.do(key, call))
+        except Exception as e:
+            return {
+                "qualified": False,
+                "confidence": 0.0,
+                "reason": f"模型调用失败: {e}",
+                "source": "异常",
+                "model": model
+            }
+
+    async def astream_match(self, icp: Dict, lead: Dict, context: Dict, label_only: bool = False,
+                            on_verdict: Optional[Callable[[bool], Any]] = None) -> Dict:
+        """
+        流式匹配：模板要求模型先输出结论行（"匹配: 是/否"）再输出理由，结论一到达即回调 on_verdict。
+        label_only 时只要结论：使用模板中的 label_max_tokens/label_stop，并在拿到结论后立即断开流；
+        否则使用模板中的 max_tokens/stop 读完理由。
+        :param on_verdict: 拿到结论时的回调，参数为 qualified（可为协程函数）
+        :return: {qualified, reason, source}
+        """
+        template = self._load_stream_prompt_template()
+        options = template.options
+        key = self._cache_key(icp, lead, context, self.model_name, template, variant="label" if label_only else "full")
+        reported = False
+
+        async def report(qualified: bool):
+            nonlocal reported
+            if on_verdict is not None and not reported:
+                reported = True
+                outcome = on_verdict(qualified)
+                if asyncio.iscoroutine(outcome):
+                    await outcome
+
+        cached = await self._cache_aget(key)
+        if cached is not None:
+            await report(cached["qualified"])
+            return cached
+
+        async def call():
+            prompt = template.render(icp=icp, lead=lead, context=context)
+            kwargs = {"max_tokens": options.get("label_max_tokens" if label_only else "max_tokens", self.completion_tokens)}
+            stop = options.get("label_stop" if label_only else "stop")
+            if stop:
+                kwargs["stop"] = stop
+            text, qualified = "", None
+            stream = self._astream(prompt, self.model_name, **kwargs)
+            try:
+                async for delta in stream:
+                    text += delta
+                    if qualified is None:
+                        match = _VERDICT_RE.search(text)
+                        if match:
+                            qualified = match.group(1) == "是"
+                            await report(qualified)
+                            if label_only:
+                                break
+            finally:
+                # 提前结束时关闭流，服务端停止生成
+                await stream.aclose()
+            # 没有结论行时抛出，按调用失败处理且不缓存
+            result = dict(self._parse_content(text), source="流式解析")
+            await self._cache_aset(key, result)
+            return result
+
+        try:
+            result = dict(await self._flights.do(key, call))
+        except Exception as e:
+            return {
+                "qualified": False,
+                "reason": f"模型调用失败: {e}",
+                "source": "异常"
+            }
+        # 合并到他人调用的请求在结果返回时回调
+        await report(result["qualified"])
+        return result
+
+    async def amatch_many(self, icp: Dict, leads: List[Dict], contexts: List[Dict]) -> List[Dict]:
+        """
+        批量匹配：多条线索共用一个ICP头打包进一个请求，模型按 lead_id 返回JSON结果。
+        每批按输入token预算贪心装箱；解析失败或缺失的线索单独重试。结果与leads一一对应。
+        """
+        results: List[Optional[Dict]] = [None] * len(leads)
+        # 批量结果由批量模板生成，与单条匹配分开缓存
+        template = self._load_batch_prompt_template()
+        keys = [self._cache_key(icp, lead, context, self.model_name, template, variant="batch")
+                for lead, context in zip(leads, contexts)]
+        pending = []
+        for index, key in enumerate(keys):
+            results[index] = await self._cache_aget(key)
+            if results[index] is None:
+                pending.append(index)
+
+        async def run_batch(batch: List[int]):
+            parsed = {}
+            try:
+                parsed = await self._amatch_batch(icp, [(self._batch_lead_id(leads[i], i), leads[i], contexts[i]) for i in batch])
+            except Exception as e:
+                print(f"批量匹配失败，逐条重试: {e}")
+            for i in batch:
+                result = parsed.get(self._batch_lead_id(leads[i], i))
+                if result is None:
+                    # 该线索的结果缺失或无法解析，单独重试
+                    results[i] = await self.amatch(icp, leads[i], contexts[i])
+                else:
+                    await self._cache_aset(keys[i], result)
+                    results[i] = result
+
+        batches = self._pack_batches(icp, [(i, leads[i], contexts[i]) for i in pending])
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+        return results
+
+    @staticmethod
+    def _batch_lead_id(lead: Dict, index: int) -> str:
+        lead_id = lead.get("id")
+        return str(lead_id) if lead_id is not None else f"#{index}"
+
+    def _batch_line(self, lead_id: str, lead: Dict, context: Dict) -> str:
+        return canonical_dumps({"lead_id": lead_id, "lead": lead, "context": context})
+
+    def _pack_batches(self, icp: Dict, items: List[Tuple[int, Dict, Dict]]) -> List[List[int]]:
+        """
+        按输入token预算与最大批大小贪心装箱；单条超出预算的线索单独成批。
+        """
+        header_tokens = estimate_tokens(self._load_batch_prompt_template().body, self.model_name) + \
+            estimate_tokens(canonical_dumps(icp), self.model_name)
+        batches, batch, used = [], [], header_tokens
+        for index, lead, context in items:
+            tokens = estimate_tokens(self._batch_line(self._batch_lead_id(lead, index), lead, context), self.model_name)
+            if batch and (used + tokens > self.batch_token_budget or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch, used = [], header_tokens
+            batch.append(index)
+            used += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def _amatch_batch(self, icp: Dict, items: List[Tuple[str, Dict, Dict]]) -> Dict[str, Dict]:
+        """
+        发送一个批量请求，返回 {lead_id: 结果}，只包含成功解析的线索。
+        """
+        lines = "\n".join(self._batch_line(lead_id, lead, context) for lead_id, lead, context in items)
+        prompt = self._load_batch_prompt_template().render(icp=icp, leads=lines)
+        content = await self._acomplete(prompt, self.model_name, max_tokens=self.batch_output_tokens * len(items) + 50)
+        return self._parse_batch_content(content, {lead_id for lead_id, _, _ in items})
+
+    @staticmethod
+    def _parse_batch_content(content: str, lead_ids) -> Dict[str, Dict]:
+        """
+        解析批量回复：取第一个 { 到最后一个 } 之间的JSON对象（兼容代码块包裹），逐条校验。
+        """
+        match = re.search(r"\{.*\}", content or "", re.S)
+        if not match:
+            return {}
+        try:
+            data = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        parsed = {}
+        for lead_id in lead_ids:
+            entry = data.get(lead_id)
+            if isinstance(entry, dict) and isinstance(entry.get("qualified"), bool):
+                parsed[lead_id] = {
+                    "qualified": entry["qualified"],
+                    "reason": str(entry.get("reason", "")),
+                    "source": "批量解析"
+                }
+        return parsed
+
+    @staticmethod
+    def _parse_structured_content(content: str) -> Optional[Dict]:
+        """
+        解析结构化回复 {"qualified", "confidence", "reason"}，格式不符时返回None。
+        """
+        match = re.search(r"\{.*\}", content or "", re.S)
+        if not match:
+            return None
+        try:
+            data = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict) or not isinstance(data.get("qualified"), bool):
+            return None
+        try:
+            confidence = min(max(float(data.get("confidence")), 0.0), 1.0)
+        except (TypeError, ValueError):
+            return None
+        return {
+            "qualified": data["qualified"],
+            "confidence": confidence,
+            "reason": str(data.get("reason", "")),
+            "source": "结构化解析"
+        }
+
+    def _load_stream_prompt_template(self) -> PromptTemplate:
+        """
+        加载流式匹配 prompt 模板（开头 --- 之间为 max_tokens / stop / label_max_tokens / label_stop 等调用选项）。
+        """
+        return self.templates.get(
+            self.stream_prompt_template_path,
+            "---\nlabel_max_tokens: 8\nlabel_stop: [\"\\n\"]\n---\n客户画像：{icp}\n线索信息：{lead}\n上下文信息：{context}\n第一行先回答 匹配: 是/否，第二行 理由: ..."
+        )
+
+    def _load_structured_prompt_template(self) -> PromptTemplate:
+        """
+        加载结构化匹配 prompt 模板。
+        """
+        return self.templates.get(
+            self.structured_prompt_template_path,
+            "客户画像：{icp}\n线索信息：{lead}\n上下文信息：{context}\n只输出JSON：{{\"qualified\": true/false, \"confidence\": 0~1, \"reason\": \"...\"}}"
+        )
+
+    def _load_batch_prompt_template(self) -> PromptTemplate:
+        """
+        加载批量匹配 prompt 模板。
+        """
+        return self.templates.get(
+            self.batch_prompt_template_path,
+            "客户画像：{icp}\n线索（每行一条JSON）：\n{leads}\n请以 lead_id 为键输出JSON：{{\"<lead_id>\": {{\"qualified\": true/false, \"reason\": \"...\"}}}}"
+        )
+
+    def _parse_content(self, content: str) -> Dict:
+        """
+        按模板的回答格式解析：结论取 "匹配: 是/否" 行，理由取结论之后的内容。
+        回复中没有结论行时抛出 ValueError（调用方按失败处理，不写缓存）。
+        """
+        match = _VERDICT_RE.search(content)
+        if match is None:
+            raise ValueError(f"模型回复中没有匹配结论: {content[:100]}")
+        reason = content[match.end():].strip()
+        if reason.startswith("理由"):
+            reason = reason[2:].lstrip(":： ")
+        return {
+            "qualified": match.group(1) == "是",
+            "reason": reason,
+            "source": "自动解析"
+        }
+
+    def _cache_key(self, icp: Dict, lead: Dict, context: Dict, model: str, template: Optional[PromptTemplate] = None,
+                   variant: str = "") -> str:
+        """
+        内容寻址缓存key：规范化输入 + 模型 + prompt版本 + 模板内容的sha256，
+        模型、prompt_version或模板变化时自动失效。template 默认为单条匹配模板，variant 区分同一模板的不同调用方式。
+        """
+        if template is None:
+            template = self._load_prompt_template()
+        payload = canonical_dumps(
+            {
+                "icp": icp,
+                "lead": lead,
+                "context": context,
+                "model": model,
+                "prompt_version": self.base_prompt_version,
+                "template": template.hash,
+                "variant": variant
+            }
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _fresh(self, item) -> Optional[Dict[str, Any]]:
+        if item is None:
+            return None
+        value, age = item
+        if self.cache_ttl is not None and age > self.cache_ttl:
+            return None
+        return dict(value, cached=True)
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._fresh(self.cache.get(key)) if self.cache is not None else None
+
+    async def _cache_aget(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._fresh(await self.cache.aget(key)) if self.cache is not None else None
+
+    def _cache_set(self, key: str, result: Dict[str, Any]):
+        if self.cache is not None:
+            self.cache.set(key, result)
+
+    async def _cache_aset(self, key: str, result: Dict[str, Any]):
+        if self.cache is not None:
+            await self.cache.aset(key, result)
+
+    def close(self):
+        """
+        关闭结果缓存
+        """
+        if self.cache is not None:
+            self.cache.close()
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI()
+        return self._async_client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    def _get_limiter(self, model: str) -> ModelRateLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limits = self.rate_limits.get(model, {})
+            limiter = self._limiters[model] = ModelRateLimiter(limits.get("rpm"), limits.get("tpm"))
+        return limiter
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """
+        限流、超时、连接错误与服务端错误可重试
+        """
+        retryable = tuple(
+            cls for cls in (
+                getattr(openai, "RateLimitError", None),
+                getattr(openai, "APITimeoutError", None),
+                getattr(openai, "APIConnectionError", None),
+                getattr(openai, "InternalServerError", None)
+            ) if cls is not None
+        )
+        return isinstance(error, retryable + (asyncio.TimeoutError,))
+
+    async def _acomplete(self, prompt: str, model: str, **kwargs) -> str:
+        """
+        调用 Chat Completions 异步接口，返回回复文本。
+        """
+        limiter = self._get_limiter(model)
+        tokens = estimate_tokens(prompt, model) + kwargs.get("max_tokens", self.completion_tokens)
+        temperature = kwargs.pop("temperature", 0.2)
+        attempt = 0
+        while True:
+            await limiter.acquire(tokens)
+            try:
+                async with self._get_semaphore():
+                    response = await self._get_async_client().chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=temperature,
+                        timeout=self.timeout,
+                        **kwargs
+                    )
+                return response.choices[0].message.content or ""
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def _astream(self, prompt: str, model: str, **kwargs) -> AsyncIterator[str]:
+        """
+        流式调用 Chat Completions，逐段产出回复文本。
+        只在尚未收到任何内容时重试；调用方提前结束时关闭底层连接。
+        """
+        limiter = self._get_limiter(model)
+        tokens = estimate_tokens(prompt, model) + kwargs.get("max_tokens", self.completion_tokens)
+        temperature = kwargs.pop("temperature", 0.2)
+        attempt = 0
+        while True:
+            await limiter.acquire(tokens)
+            produced = False
+            try:
+                async with self._get_semaphore():
+                    stream = await self._get_async_client().chat.completions.create(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                        temperature=temperature,
+                        timeout=self.timeout,
+                        stream=True,
+                        **kwargs
+                    )
+                    try:
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                produced = True
+                                yield delta
+                    finally:
+                        close = getattr(stream, "close", None)
+                        if close is not None:
+                            outcome = close()
+                            if asyncio.iscoroutine(outcome):
+                                await outcome
+                return
+            except Exception as e:
+                if produced or attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def _build_prompt(self, icp: Dict, lead: Dict, context: Dict) -> str:
+        """
+        构建 prompt 内容。
+        """
+        return self._load_prompt_template().render(icp=icp, lead=lead, context=context)
@@ -0,0 +1,46 @@
+"""
+ModelRouter
+模型分级路由：先用便宜/快速的模型做结构化判断，置信度不足时升级到更强的模型。
+"""
+from typing import Dict, List, Optional
+
+# 默认两级：小模型置信度达到0.8即采纳，否则交给大模型（最后一级的结果总是采纳）
+DEFAULT_TIERS = [
+    {"model": "gpt-4o-mini", "min_confidence": 0.8},
+    {"model": "gpt-4o"}
+]
+
+
+class ModelRouter:
+    """
+    模型分级路由器
+    """
+    def __init__(self, llm_client, tiers: Optional[List[Dict]] = None):
+        """
+        :param llm_client: LLMClient 实例（负责限速、重试与缓存）
+        :param tiers: 从便宜到昂贵的模型列表，如 [{"model": "gpt-4o-mini", "min_confidence": 0.8}, {"model": "gpt-4o"}]，
+                      min_confidence 为该级结果被采纳的最低置信度
+        """
+        self.llm_client = llm_client
+        self.tiers = tiers or DEFAULT_TIERS
+        if not self.tiers:
+            raise ValueError("tiers 不能为空")
+
+    async def amatch(self, icp: Dict, lead: Dict, context: Dict) -> Dict:
+        """
+        逐级调用，直到某一级的置信度达到阈值或到达最后一级。
+        :return: 采纳的那一级的结构化结果，附加 route（每一级的模型、结论与置信度）
+        """
+        route = []
+        for level, tier in enumerate(self.tiers):
+            result = await self.llm_client.amatch_structured(icp, lead, context, model=tier["model"])
+            confidence = result.get("confidence", 0.0)
+            accepted = level == len(self.tiers) - 1 or confidence >= tier.get("min_confidence", 0.0)
+            route.append({
+                "model": tier["model"],
+                "qualified": result.get("qualified"),
+                "confidence": confidence,
+                "accepted": accepted
+            })
+            if accepted:
+                return dict(result, route=route)
@@ -0,0 +1,103 @@
+"""
+PromptTemplate / TemplateManager
+负责 prompt 模板的编译、缓存与热更新。
+"""
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def canonical_dumps(value: Any) -> str:
+    """
+    规范化紧凑序列化：键排序、无多余空白、保留中文，相同内容总是得到相同文本。
+    """
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class PromptTemplate:
+    """
+    编译后的 prompt 模板：
+    - 开头 --- 之间的 "key: JSON值" 行为调用选项（如 max_tokens / stop），其余为正文
+    - 正文按 str.format 语法只解析一次，渲染时直接拼接
+    - 字符串参数原样填入，其余参数（dict/list等）填入规范化紧凑JSON
+    """
+    def __init__(self, text: str):
+        self.text = text
+        self.hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self.options, self.body = self._split_front_matter(text)
+        self._parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(self.body):
+            if field_name is not None and (format_spec or conversion or not field_name.isidentifier()):
+                raise ValueError(f"模板字段只支持 {{name}} 形式: {field_name}")
+            self._parts.append((literal, field_name))
+        self.fields = {name for _, name in self._parts if name}
+
+    @staticmethod
+    def _split_front_matter(text: str) -> Tuple[Dict[str, Any], str]:
+        options: Dict[str, Any] = {}
+        if not text.startswith("---"):
+            return options, text
+        header, _, body = text[3:].partition("\n---\n")
+        for line in header.splitlines():
+            name, sep, value = line.partition(":")
+            if not sep or not name.strip():
+                continue
+            try:
+                options[name.strip()] = json.loads(value.strip())
+            except json.JSONDecodeError:
+                options[name.strip()] = value.strip()
+        return options, body
+
+    def render(self, **values) -> str:
+        """
+        渲染模板，缺少字段时抛出 KeyError。
+        """
+        out = []
+        for literal, name in self._parts:
+            out.append(literal)
+            if name is not None:
+                value = values[name]
+                out.append(value if isinstance(value, str) else canonical_dumps(value))
+        return "".join(out)
+
+
+class TemplateManager:
+    """
+    模板管理器：按路径缓存编译后的模板，文件 mtime/大小变化时才重新读取，
+    内容哈希变化时才重新编译；两次检查之间至少间隔 check_interval 秒。
+    文件不存在或读取失败时使用 fallback 文本。
+    """
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, fallback: str = "") -> PromptTemplate:
+        now = time.monotonic()
+        entry = self._entries.get(path)
+        if entry is not None and now - entry["checked"] < self.check_interval:
+            return entry["template"]
+        with self._lock:
+            entry = self._entries.get(path)
+            try:
+                stat = os.stat(path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signature = None
+            if entry is not None and entry["signature"] == signature:
+                entry["checked"] = now
+                return entry["template"]
+            text = fallback
+            if signature is not None:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except OSError:
+                    signature = None
+            template = entry["template"] if entry is not None and entry["template"].text == text else PromptTemplate(text)
+            self._entries[path] = {"signature": signature, "checked": now, "template": template}
+            return template
@@ -1,32 +1,233 @@
-"""
-MatchResultPersister
-负责持久化匹配结果。
-作者：AI助手
-"""
-from typing import List, Dict
-import json
-import os
-
-class MatchResultPersister:
-    """
-    匹配结果持久化器
-    """
-    def __init__(self, output_path=None):
-        self.output_path = output_path or os.path.join(os.path.dirname(__file__), "match_results.json")
-
-    def save_batch(self, results: List[Dict]):
-        """
-        批量写入匹配结果到本地 JSON 文件。
-        :param results: 匹配结果列表
-        """
-        try:
-            if os.path.exists(self.output_path):
-                with open(self.output_path, "r", encoding="utf-8") as f:
-                    old = json.load(f)
-            else:
-                old = []
-            old.extend(results)
-            with open(self.output_path, "w", encoding="utf-8") as f:
-                json.dump(old, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"持久化失败: {e}")
\ No newline at end of file
+"""
+MatchResultPersister
+负责持久化匹配结果。
+作者：AI助手
+"""
+from typing import List, Dict, Optional, Iterator, Union
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+
+
+class NDJSONResultStore:
+    """
+    追加写入的NDJSON结果日志：每批结果一次追加写入，写入成本只与批大小有关。
+    查询需要顺序扫描，适合归档/离线分析；在线查询请使用 SQLiteResultStore。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def save_batch(self, results: List[Dict]):
+        if not results:
+            return
+        data = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in results)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def iter_results(self) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时可能留下半行，跳过
+                    continue
+
+    def query(self, customer_id: Optional[str] = None, lead_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        results = []
+        for r in self.iter_results():
+            if customer_id is not None and r.get("customer_id") != customer_id:
+                continue
+            if lead_id is not None and r.get("lead_id") != lead_id:
+                continue
+            timestamp = r.get("timestamp") or ""
+            if (since is not None and timestamp < since) or (until is not None and timestamp >= until):
+                continue
+            results.append(r)
+        results.sort(key=lambda r: r.get("timestamp") or "", reverse=True)
+        return results[:limit] if limit else results
+
+    def latest(self, lead_id: str, customer_id: Optional[str] = None) -> Optional[Dict]:
+        results = self.query(customer_id=customer_id, lead_id=lead_id, limit=1)
+        return results[0] if results else None
+
+    def close(self):
+        pass
+
+
+class SQLiteResultStore:
+    """
+    SQLite（WAL模式）结果存储：按 customer_id / lead_id / timestamp 建索引，每批结果一个事务写入。
+    完整结果以JSON保存在payload列，索引列只用于查询。
+    """
+    def __init__(self, path: str, table: str = "match_results"):
+        self.path = path
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, customer_id TEXT, lead_id TEXT, timestamp TEXT, "
+            "qualified INTEGER, model TEXT, prompt_version TEXT, payload TEXT NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_lead_ts ON {table} (lead_id, timestamp)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_customer_lead_ts ON {table} (customer_id, lead_id, timestamp)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (timestamp)")
+        self._conn.commit()
+
+    @staticmethod
+    def _row(r: Dict) -> tuple:
+        qualified = r.get("qualified")
+        return (
+            r.get("customer_id"),
+            None if r.get("lead_id") is None else str(r.get("lead_id")),
+            r.get("timestamp"),
+            None if qualified is None else int(bool(qualified)),
+            r.get("model"),
+            r.get("prompt_version"),
+            json.dumps(r, ensure_ascii=False, separators=(",", ":"), default=str)
+        )
+
+    def save_batch(self, results: List[Dict]):
+        if not results:
+            return
+        rows = [self._row(r) for r in results]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO {self.table} (customer_id, lead_id, timestamp, qualified, model, prompt_version, payload) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+
+    def query(self, customer_id: Optional[str] = None, lead_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """按条件查询，按时间倒序返回；since/until 为ISO格式时间（左闭右开）"""
+        conditions, params = [], []
+        if customer_id is not None:
+            conditions.append("customer_id = ?")
+            params.append(customer_id)
+        if lead_id is not None:
+            conditions.append("lead_id = ?")
+            params.append(str(lead_id))
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until)
+        sql = f"SELECT payload FROM {self.table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def latest(self, lead_id: str, customer_id: Optional[str] = None) -> Optional[Dict]:
+        """某条线索最近一次的匹配结果"""
+        results = self.query(customer_id=customer_id, lead_id=lead_id, limit=1)
+        return results[0] if results else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MatchResultPersister:
+    """
+    匹配结果持久化器，后端可插拔：
+    - "sqlite"（默认）：SQLite WAL，带索引，支持按线索/客户/时间查询
+    - "ndjson"：追加写入的NDJSON日志
+    - 也可直接传入实现了 save_batch/query/latest/close 的存储对象
+    默认路径的SQLite库为空时，先导入旧版写入的 match_results.json（原文件保留不动）。
+    """
+    def __init__(self, output_path=None, backend: Union[str, object] = "sqlite"):
+        if not isinstance(backend, str):
+            self.store = backend
+            self.output_path = getattr(backend, "path", output_path)
+            return
+        base_dir = os.path.dirname(__file__)
+        if backend == "sqlite":
+            self.output_path = output_path or os.path.join(base_dir, "match_results.db")
+            self.store = SQLiteResultStore(self.output_path)
+            if output_path is None:
+                self._import_legacy_json(os.path.join(base_dir, "match_results.json"))
+        elif backend == "ndjson":
+            self.output_path = output_path or os.path.join(base_dir, "match_results.ndjson")
+            self.store = NDJSONResultStore(self.output_path)
+        else:
+            raise ValueError(f"不支持的持久化后端: {backend}")
+
+    def _import_legacy_json(self, path: str):
+        """
+        首次打开（库为空）时导入旧版 JSON 数组格式的结果文件。
+        """
+        if not os.path.exists(path) or self.store.count() > 0:
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                results = json.load(f)
+            self.store.save_batch([r for r in results if isinstance(r, dict)])
+            print(f"已导入旧版匹配结果 {len(results)} 条: {path}")
+        except (OSError, ValueError, TypeError) as e:
+            print(f"导入旧版匹配结果失败: {e}")
+
+    def save_batch(self, results: List[Dict]):
+        """
+        批量写入匹配结果（追加写入，成本只与本批大小有关）。
+        :param results: 匹配结果列表
+        """
+        try:
+            self.store.save_batch(results)
+        except Exception as e:
+            print(f"持久化失败: {e}")
+
+    async def asave_batch(self, results: List[Dict]):
+        """
+        异步批量写入，磁盘I/O放到线程中执行。
+        """
+        await asyncio.to_thread(self.save_batch, results)
+
+    def query(self, customer_id: Optional[str] = None, lead_id: Optional[str] = None,
+              since: Optional[str] = None, until: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        按客户、线索与时间范围查询匹配结果，按时间倒序返回。
+        """
+        return self.store.query(customer_id=customer_id, lead_id=lead_id, since=since, until=until, limit=limit)
+
+    def latest(self, lead_id: str, customer_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        某条线索最近一次的匹配结果，不存在时返回None。
+        """
+        return self.store.latest(lead_id, customer_id=customer_id)
+
+    def close(self):
+        self.store.close()
@@ -1,179 +1,551 @@
-import asyncio
-import yaml
-import os
-import importlib
-from typing import List, Dict, Any, Optional
-from agents.LeadSearchAgent.tools.DataSourceBaseTool import ICP, StandardizedLead
-from utils.standardizer import DataStandardizer
-from agents.base_agent import BaseAgent
-
-
-class LeadSearchAgent(BaseAgent):
-    """Lead搜索Agent - 核心调度逻辑"""
-    
-    def __init__(self, config_path: str = "configs/data_sources.yaml"):
-        self.config_path = config_path
-        self.tools = {}
-        self.config = self._load_config() #加载配置文件
-        self._initialize_tools() #初始化所有工具
-    
-    def _load_config(self) -> Dict[str, Any]:
-        """加载配置文件"""
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-            print(f"成功加载配置文件: {self.config_path}")
-            return config
-        except Exception as e:
-            print(f"加载配置文件失败: {e}")
-            return {"data_sources": {}, "global": {}}
-    
-    def _initialize_tools(self):
-        """初始化所有工具"""
-        data_sources = self.config.get('data_sources', {})
-        
-        for source_id, source_config in data_sources.items():
-            # 判断现在这个数据源是否启用
-            if not source_config.get('enabled', False):
-                continue
-            
-            tool_class_name = source_config.get('tool_class') # 工具类名
-            tool_module_path = source_config.get('module_path') # 工具类所在的模块路径
-            if not tool_class_name or not tool_module_path:
-                print(f"数据源 {source_id} 缺少工具类名 或 模块路径")
-                continue
-            
-            try:
-                # 动态导入工具类
-                tool_class = self._import_tool_by_path(tool_module_path, tool_class_name)
-                if tool_class:
-                    tool = tool_class(source_config['name'], source_config.get('config', {}))
-                    self.tools[source_id] = tool
-                    print(f"已加载工具: {source_config['name']} ({tool_class_name})")
-                else:
-                    print(f"无法导入工具类: {tool_class_name}")
-                    
-            except Exception as e:
-                print(f"初始化工具 {source_id} 失败: {e}")
-    
-    def _import_tool_by_path(self,module_path: str, class_name: str):
-        """动态导入工具类"""
-        # 根据module_path导入类对象，返回类对象
-        try:
-            # 导入模块
-            module = importlib.import_module(module_path)
-            return getattr(module, class_name)
-        except Exception as e:
-            print(f"导入模块失败: {e}")
-            return None
-    
-    async def _search_all_sources(self, icp: ICP, limit_per_source: int = 100) -> List[StandardizedLead]:
-        """异步并发搜索所有数据源
-        icp:理想客户画像
-        limit_per_source: 每个数据源的搜索限制
-        """
-        # self.tools是一个字典{source_id: tool}
-        print(f"开始并发搜索，目标数据源: {len(self.tools)}")
-        
-        # 创建并发任务
-        tasks = []
-        for source_id, tool in self.tools.items():
-            if tool.is_available:
-                #如果tool.is_available为True，则创建一个异步任务，并添加到tasks列表中，返回的是一个协程对象
-                task = self._search_single_source(source_id, tool, icp, limit_per_source)
-                tasks.append(task)
-            else:
-                print(f"跳过不可用的数据源: {source_id}")
-        
-        if not tasks:
-            print("没有可用的数据源")
-            return []
-        
-        # 并发执行所有任务，并设置最大并发数
-        max_concurrent = self.config.get('global', {}).get('max_concurrent', 4)
-        # asyncio.Semaphore是并发令牌桶机制，只允许max_concurrent个任务同时执行
-        semaphore = asyncio.Semaphore(max_concurrent)
-        
-        # 创建一个新函数，用于限制并发数
-        async def limited_task(task):
-            async with semaphore:
-                return await task
-        # 用limited_task包装每个任务，限制并发数
-        limited_tasks = [limited_task(task) for task in tasks]
-        # 并发执行所有封装好的任务，并设置最大并发数；return_exceptions=True表示即使有异常，也继续执行其他任务
-        results = await asyncio.gather(*limited_tasks, return_exceptions=True)
-        
-        # 处理结果
-        all_leads = []
-        # 遍历每个搜索结果
-        for i, result in enumerate(results):
-            # 如果result是异常，就记录哪个数据源失败
-            if isinstance(result, Exception):
-                print(f"数据源 {list(self.tools.keys())[i]} 搜索失败: {result}")
-            # 如果result是列表，就说明搜索成功，将其加入总结果集中
-            elif isinstance(result, list):
-                all_leads.extend(result)
-        
-        # 将所有数据源返回的leads合并和去重
-        merged_leads = DataStandardizer.merge_leads([all_leads])
-        print(f"搜索完成，找到 {len(merged_leads)} 个唯一leads")
-        # 返回最终的搜索结果
-        return merged_leads
-    
-    async def _search_single_source(self, source_id: str, tool, icp: ICP, limit: int) -> List[StandardizedLead]:
-        """搜索单个数据源"""
-        try:
-            print(f"正在搜索数据源: {source_id}")
-            leads = await tool.search_leads(icp, limit)
-            print(f"{source_id} 找到 {len(leads)} 个leads")
-            return leads
-            
-        except Exception as e:
-            print(f"{source_id} 搜索出错: {e}")
-            return []
-    
-    async def _search_specific_source(self, source_id: str, icp: ICP, limit: int = 100) -> List[StandardizedLead]:
-        """搜索指定数据源"""
-        if source_id not in self.tools:
-            print(f"数据源不存在: {source_id}")
-            return []
-        
-        tool = self.tools[source_id]
-        if not tool.is_available:
-            print(f"数据源不可用: {source_id}")
-            return []
-        
-        return await self._search_single_source(source_id, tool, icp, limit)
-    
-    def _get_available_sources(self) -> List[Dict[str, Any]]:
-        """获取可用数据源信息"""
-        sources = []
-        for source_id, tool in self.tools.items():
-            sources.append({
-                'id': source_id,
-                'name': tool.name,
-                'available': tool.is_available,
-                'info': tool.get_tool_info()
-            })
-        return sources
-    
-    def _filter_leads(self, leads: List[StandardizedLead], filters: Dict[str, Any]) -> List[StandardizedLead]:
-        """过滤leads"""
-        return DataStandardizer.filter_leads(leads, filters) 
-    
-    async def run(self, input: Dict) -> Dict:
-        """执行主流程统一异步入口，兼容 BaseAgent 规范。
-        :param input: {"icp": ICP, "limit": int}
-        """
-        # 获取可用数据源
-        available_sources = self._get_available_sources()
-        print(f"\n可用数据源 ({len(available_sources)}):")
-        for source in available_sources:
-            status = "yes" if source['available'] else "no"
-            print(f"  {status} {source['name']} ({source['id']})")
-        
-        icp = input['icp']
-        # 异步并发搜索所有数据源
-        print(f"\n开始异步并发搜索...")
-        leads = await self._search_all_sources(icp, input['limit'])
-        return {"leads": leads}
\ No newline at end of file
+import asyncio
+import yaml
+import os
+import importlib
+from collections import deque
+from dataclasses import asdict, replace
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Union
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import ICP, StandardizedLead
+from agents.LeadSearchAgent.tools.http_transport import HttpTransport
+from utils.standardizer import DataStandardizer
+from utils.dedup import LeadDeduplicator
+from utils.lead_batch import LeadBatch
+from utils.latency_tracker import LatencyTracker
+from utils.rate_limiter import TokenBucket, AIMDLimiter, SourceLimiter
+from utils.cache import TieredCache
+from utils.singleflight import SingleFlight
+from utils.field_mapper import FieldMapper, DEFAULT_MAPPINGS_PATH
+from utils.raw_archive import RawArchive
+from agents.base_agent import BaseAgent
+
+
+class LeadSearchAgent(BaseAgent):
+    """Lead搜索Agent - 核心调度逻辑"""
+    
+    def __init__(self, config_path: str = "configs/data_sources.yaml"):
+        self.config_path = config_path
+        self.tools = {}
+        self.config = self._load_config() #加载配置文件
+        self.transport = self._create_transport() #共享HTTP连接池，生命周期与Agent一致
+        self.latency_tracker = LatencyTracker() #各数据源耗时样本，用于对冲请求
+        self.search_cache = self._create_search_cache() #ICP搜索结果缓存（内存LRU + 磁盘）
+        self._refreshing: Dict[str, asyncio.Task] = {} #正在后台刷新的缓存key
+        self._flights = SingleFlight() #相同数据源查询的并发请求合并
+        self.raw_archives: Dict[str, RawArchive] = {} #各数据源原始响应归档
+        self._initialize_tools() #初始化所有工具
+    
+    def _load_config(self) -> Dict[str, Any]:
+        """加载配置文件"""
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f)
+            print(f"成功加载配置文件: {self.config_path}")
+            return config
+        except Exception as e:
+            print(f"加载配置文件失败: {e}")
+            return {"data_sources": {}, "global": {}}
+    
+    def _create_transport(self) -> HttpTransport:
+        """根据全局配置创建共享HTTP传输层"""
+        global_config = self.config.get('global', {})
+        http_config = dict(global_config.get('http', {}))
+        http_config.setdefault('timeout', global_config.get('default_timeout', 30))
+        return HttpTransport(http_config)
+
+    def _create_limiter(self, source_id: str, source_config: Dict[str, Any]) -> SourceLimiter:
+        """根据数据源rate_limit与全局配置创建流量控制器"""
+        global_config = self.config.get('global', {})
+        bucket = None
+        if source_config.get('rate_limit'):
+            # rate_limit为每小时请求数
+            bucket = TokenBucket.per_hour(source_config['rate_limit'], source_config.get('rate_limit_burst'))
+        adaptive = global_config.get('adaptive_concurrency', {})
+        latency_target_ms = adaptive.get('latency_target_ms')
+        concurrency = AIMDLimiter(
+            initial=adaptive.get('initial', 4),
+            min_limit=adaptive.get('min', 1),
+            max_limit=adaptive.get('max', 32),
+            latency_target=latency_target_ms / 1000 if latency_target_ms else None
+        )
+        return SourceLimiter(
+            source_id,
+            bucket=bucket,
+            concurrency=concurrency,
+            retry_attempts=global_config.get('retry_attempts', 3),
+            base_delay=global_config.get('retry_base_delay', 0.5),
+            max_delay=global_config.get('retry_max_delay', 30)
+        )
+
+    def _create_field_mapper(self, source_id: str) -> FieldMapper:
+        """按数据源id编译字段映射（configs/field_mappings.yaml）"""
+        path = self.config.get('global', {}).get('field_mappings', DEFAULT_MAPPINGS_PATH)
+        return FieldMapper.for_source(source_id, path)
+
+    def _create_raw_archive(self, source_id: str) -> RawArchive:
+        """按全局raw_archive配置创建数据源的原始响应归档"""
+        archive_config = self.config.get('global', {}).get('raw_archive', {})
+        archive = RawArchive(
+            archive_config.get('directory', 'raw_data'),
+            source_id,
+            compression=archive_config.get('compression', 'zstd'),
+            max_segment_bytes=int(archive_config.get('max_segment_mb', 64) * 1024 * 1024),
+            dedup=archive_config.get('dedup', True)
+        )
+        self.raw_archives[source_id] = archive
+        return archive
+
+    def _initialize_tools(self):
+        """初始化所有工具"""
+        data_sources = self.config.get('data_sources', {})
+        
+        for source_id, source_config in data_sources.items():
+            # 判断现在这个数据源是否启用
+            if not source_config.get('enabled', False):
+                continue
+            
+            tool_class_name = source_config.get('tool_class') # 工具类名
+            tool_module_path = source_config.get('module_path') # 工具类所在的模块路径
+            if not tool_class_name or not tool_module_path:
+                print(f"数据源 {source_id} 缺少工具类名 或 模块路径")
+                continue
+            
+            try:
+                # 动态导入工具类
+                tool_class = self._import_tool_by_path(tool_module_path, tool_class_name)
+                if tool_class:
+                    tool = tool_class(
+                        source_config['name'],
+                        source_config.get('config', {}),
+                        transport=self.transport,
+                        limiter=self._create_limiter(source_id, source_config.get('config', {})),
+                        field_mapper=self._create_field_mapper(source_id),
+                        raw_archive=self._create_raw_archive(source_id)
+                    )
+                    self.tools[source_id] = tool
+                    print(f"已加载工具: {source_config['name']} ({tool_class_name})")
+                else:
+                    print(f"无法导入工具类: {tool_class_name}")
+                    
+            except Exception as e:
+                print(f"初始化工具 {source_id} 失败: {e}")
+    
+    def _import_tool_by_path(self,module_path: str, class_name: str):
+        """动态导入工具类"""
+        # 根据module_path导入类对象，返回类对象
+        try:
+            # 导入模块
+            module = importlib.import_module(module_path)
+            return getattr(module, class_name)
+        except Exception as e:
+            print(f"导入模块失败: {e}")
+            return None
+    
+    async def stream(self, icp: ICP, limit_per_source: int = 100, deadline_ms: Optional[float] = None,
+                     source_status: Optional[Dict[str, Dict[str, Any]]] = None) -> AsyncIterator[StandardizedLead]:
+        """流式并发搜索所有数据源，每个数据源（每页）返回后立即产出去重后的lead
+        icp:理想客户画像
+        limit_per_source: 每个数据源的搜索限制
+        deadline_ms: 整体时间预算（毫秒），到期后停止并放弃未完成的数据源
+        source_status: 可选，传入dict以接收各数据源完成状态
+        用法: async for lead in agent.stream(icp, limit)
+        """
+        # self.tools是一个字典{source_id: tool}
+        print(f"开始并发搜索，目标数据源: {len(self.tools)}")
+        if source_status is None:
+            source_status = {}
+        
+        sources = []
+        for source_id, tool in self.tools.items():
+            if tool.is_available:
+                sources.append((source_id, tool))
+                source_status[source_id] = {"status": "pending", "leads": 0, "elapsed_ms": None, "hedged": False}
+            else:
+                print(f"跳过不可用的数据源: {source_id}")
+        
+        if not sources:
+            print("没有可用的数据源")
+            return
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + deadline_ms / 1000 if deadline_ms is not None else None
+        # asyncio.Semaphore是并发令牌桶机制，只允许max_concurrent个数据源同时执行
+        max_concurrent = self.config.get('global', {}).get('max_concurrent', 4)
+        semaphore = asyncio.Semaphore(max_concurrent)
+        # 各数据源把每批leads放入队列，数据源结束时放入结束标记
+        queue: asyncio.Queue = asyncio.Queue()
+        source_done = object()
+        
+        async def produce(source_id: str, tool):
+            try:
+                async with semaphore:
+                    async for batch in self._stream_single_source(source_id, tool, icp, limit_per_source,
+                                                                  source_status[source_id]):
+                        await queue.put(batch)
+            finally:
+                await queue.put(source_done)
+        
+        tasks = [asyncio.create_task(produce(source_id, tool)) for source_id, tool in sources]
+        remaining = len(tasks)
+        # 增量去重，与merge_leads使用同一套多键去重引擎；产出的是去重器保存的拷贝，重复记录并入该拷贝，
+        # 不修改数据源结果中（可能同时在缓存或其他订阅者手中）的原对象
+        deduplicator = LeadDeduplicator()
+        try:
+            while remaining:
+                timeout = None if deadline is None else deadline - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    batch = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if batch is source_done:
+                    remaining -= 1
+                    continue
+                for lead in batch:
+                    if not lead:
+                        continue
+                    lead, is_new = deduplicator.add(lead)
+                    if is_new:
+                        yield lead
+        finally:
+            # 到期或调用方提前退出时取消仍在进行的数据源
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for source_id, status in source_status.items():
+                if status["status"] in ("pending", "running"):
+                    if deadline is not None:
+                        status["status"] = "timeout"
+                        print(f"{source_id} 未在时间预算内完成，已返回部分结果")
+                    else:
+                        status["status"] = "cancelled"
+    
+    async def _search_all_sources(self, icp: ICP, limit_per_source: int = 100, deadline_ms: Optional[float] = None,
+                                  source_status: Optional[Dict[str, Dict[str, Any]]] = None) -> List[StandardizedLead]:
+        """异步并发搜索所有数据源，收集stream的全部结果
+        icp:理想客户画像
+        limit_per_source: 每个数据源的搜索限制
+        deadline_ms: 整体时间预算（毫秒）
+        """
+        merged_leads = [lead async for lead in self.stream(icp, limit_per_source, deadline_ms, source_status)]
+        print(f"搜索完成，找到 {len(merged_leads)} 个唯一leads")
+        # 返回最终的搜索结果
+        return merged_leads
+    
+    def _hedge_delay(self, source_id: str, tool) -> Optional[float]:
+        """对冲请求的触发延迟：该数据源历史耗时的分位数，未开启或样本不足时返回None"""
+        hedge_config = self.config.get('global', {}).get('hedge', {})
+        if not tool.config.get('hedge', hedge_config.get('enabled', False)):
+            return None
+        return self.latency_tracker.percentile(
+            source_id,
+            hedge_config.get('percentile', 95),
+            min_samples=hedge_config.get('min_samples', 20)
+        )
+    
+    async def _hedged_search(self, tool, icp: ICP, limit: int, delay: float, status: Dict[str, Any]) -> List[StandardizedLead]:
+        """对冲请求：主请求超过delay仍未返回时再发一个相同请求，取先成功返回的结果"""
+        tasks = {asyncio.create_task(tool.search_leads(icp, limit))}
+        error = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                status["hedged"] = True
+                tasks.add(asyncio.create_task(tool.search_leads(icp, limit)))
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # 等待被取消的请求真正结束（释放连接、不留下未取回的异常）
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _create_search_cache(self) -> Optional[TieredCache]:
+        """根据全局配置创建搜索结果缓存，未开启时返回None"""
+        cache_config = self.config.get('global', {}).get('cache', {})
+        if not cache_config.get('enabled', False):
+            return None
+        # 超过 ttl + stale_ttl 的条目不会再被返回，打开时从磁盘清理
+        return TieredCache(
+            max_entries=cache_config.get('max_entries', 1024),
+            path=cache_config.get('path'),
+            table="search_results",
+            max_age=cache_config.get('ttl', 3600) + cache_config.get('stale_ttl', 0)
+        )
+    
+    def _cache_key(self, source_id: str, tool, icp: ICP, limit: int) -> str:
+        """缓存键：数据源 + limit + 该数据源查询的ICP指纹（按租户区分的数据源包含agent_id）"""
+        return f"{source_id}:{limit}:{tool.query_fingerprint(icp)}"
+    
+    async def _cache_lookup(self, source_id: str, tool, icp: ICP, limit: int) -> Optional[List[StandardizedLead]]:
+        """查询缓存：新鲜直接返回；过期但在stale窗口内时返回旧值并后台刷新；否则返回None"""
+        if self.search_cache is None:
+            return None
+        key = self._cache_key(source_id, tool, icp, limit)
+        item = await self.search_cache.aget(key)
+        if item is None:
+            return None
+        records, age = item
+        cache_config = self.config.get('global', {}).get('cache', {})
+        ttl = cache_config.get('ttl', 3600)
+        stale_ttl = cache_config.get('stale_ttl', 0)
+        if age >= ttl + stale_ttl:
+            return None
+        if age >= ttl:
+            self._schedule_refresh(key, tool, icp, limit)
+        # 不按租户区分的数据源缓存可跨Agent复用，icp_id按本次ICP回填
+        return [StandardizedLead(**{**record, 'icp_id': icp.agent_id}) for record in records]
+    
+    async def _cache_store(self, key: str, leads: List[StandardizedLead]):
+        """写入缓存，只应在请求完整结束后调用；空结果（可能是数据源出错）不缓存"""
+        if self.search_cache is None or not leads:
+            return
+        await self.search_cache.aset(key, [asdict(lead) for lead in leads])
+    
+    def _schedule_refresh(self, key: str, tool, icp: ICP, limit: int):
+        """后台刷新过期缓存，同一key同时只刷新一次"""
+        if key in self._refreshing:
+            return
+        
+        async def refresh():
+            try:
+                await self._cache_store(key, await tool.search_leads(icp, limit))
+            except Exception as e:
+                print(f"缓存后台刷新失败 {key}: {e}")
+        
+        task = asyncio.create_task(refresh())
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+    
+    async def _fetch_source(self, source_id: str, tool, icp: ICP, limit: int,
+                            status: Dict[str, Any]) -> AsyncIterator[List[StandardizedLead]]:
+        """实际请求数据源（未命中缓存时），逐批产出，完成后记录耗时并写入缓存
+        只有完整结束的请求才写入缓存：出错、到期取消或调用方提前退出时，已产出的部分结果不缓存。
+        """
+        print(f"正在搜索数据源: {source_id}")
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        collected = []
+        completed = False
+        try:
+            hedge_delay = self._hedge_delay(source_id, tool)
+            if hedge_delay is not None:
+                # 对冲模式下整体返回，避免重复请求的分页结果交错
+                leads = await self._hedged_search(tool, icp, limit, hedge_delay, status)
+                collected.extend(leads)
+                yield leads
+            else:
+                async for leads in tool.stream_leads(icp, limit):
+                    collected.extend(leads)
+                    yield leads
+            completed = True
+        finally:
+            if not completed:
+                print(f"{source_id} 请求未完整结束，部分结果不写入缓存")
+        self.latency_tracker.record(source_id, loop.time() - start)
+        await self._cache_store(self._cache_key(source_id, tool, icp, limit), collected)
+    
+    async def _stream_single_source(self, source_id: str, tool, icp: ICP, limit: int,
+                                    status: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[StandardizedLead]]:
+        """流式搜索单个数据源，逐批产出，并记录完成状态与耗时
+        优先读缓存；相同(数据源, 查询指纹, limit)的并发搜索合并为一次请求（按租户区分的数据源不跨Agent合并）。
+        """
+        if status is None:
+            status = {}
+        status["status"] = "running"
+        status.setdefault("leads", 0)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            cached = await self._cache_lookup(source_id, tool, icp, limit)
+            if cached is not None:
+                status["cached"] = True
+                status["leads"] += len(cached)
+                yield cached
+            else:
+                key = self._cache_key(source_id, tool, icp, limit)
+                if self._flights.in_flight(key):
+                    status["coalesced"] = True
+                async for leads in self._flights.stream(key, lambda: self._fetch_source(source_id, tool, icp, limit, status)):
+                    # 不按租户区分的数据源，合并请求的结果跨Agent共享，icp_id按本次ICP回填
+                    if any(lead.icp_id != icp.agent_id for lead in leads):
+                        leads = [replace(lead, icp_id=icp.agent_id) for lead in leads]
+                    status["leads"] += len(leads)
+                    yield leads
+            status["status"] = "completed"
+            status["elapsed_ms"] = round((loop.time() - start) * 1000, 1)
+            print(f"{source_id} 找到 {status['leads']} 个leads")
+            
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = str(e)
+            status["elapsed_ms"] = round((loop.time() - start) * 1000, 1)
+            print(f"{source_id} 搜索出错: {e}")
+    
+    async def _search_single_source(self, source_id: str, tool, icp: ICP, limit: int) -> List[StandardizedLead]:
+        """搜索单个数据源（优先读缓存，相同查询指纹的并发搜索合并为一次请求）"""
+        try:
+            leads = await self._cache_lookup(source_id, tool, icp, limit)
+            if leads is None:
+                key = self._cache_key(source_id, tool, icp, limit)
+                
+                async def fetch():
+                    print(f"正在搜索数据源: {source_id}")
+                    result = await tool.search_leads(icp, limit)
+                    await self._cache_store(key, result)
+                    return result
+                
+                leads = await self._flights.do(key, fetch)
+                if any(lead.icp_id != icp.agent_id for lead in leads):
+                    leads = [replace(lead, icp_id=icp.agent_id) for lead in leads]
+            print(f"{source_id} 找到 {len(leads)} 个leads")
+            return leads
+            
+        except Exception as e:
+            print(f"{source_id} 搜索出错: {e}")
+            return []
+    
+    async def _search_specific_source(self, source_id: str, icp: ICP, limit: int = 100) -> List[StandardizedLead]:
+        """搜索指定数据源"""
+        if source_id not in self.tools:
+            print(f"数据源不存在: {source_id}")
+            return []
+        
+        tool = self.tools[source_id]
+        if not tool.is_available:
+            print(f"数据源不可用: {source_id}")
+            return []
+        
+        return await self._search_single_source(source_id, tool, icp, limit)
+    
+    def _get_available_sources(self) -> List[Dict[str, Any]]:
+        """获取可用数据源信息"""
+        sources = []
+        for source_id, tool in self.tools.items():
+            sources.append({
+                'id': source_id,
+                'name': tool.name,
+                'available': tool.is_available,
+                'info': tool.get_tool_info()
+            })
+        return sources
+    
+    async def run_many(self, icps: List[ICP], limit: int = 100,
+                       on_progress: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """多ICP批量搜索：所有 ICP×数据源 任务在同一个有界调度器上执行
+        - 查询完全相同的ICP（同数据源、同查询指纹、同limit）只请求一次，结果分发给每个ICP；
+          按租户区分的数据源查询指纹包含agent_id，不同Agent的ICP不会合并
+        - 各ICP的任务队列轮询出队，避免大批量时个别ICP长时间饥饿
+        - 固定数量的worker协程执行，不会随ICP数量无限创建协程
+        :param icps: ICP列表
+        :param limit: 每个数据源的搜索限制
+        :param on_progress: 可选回调 on_progress(icp下标, 进度dict)，每个数据源完成时调用
+        :return: 与icps一一对应的 [{"icp": ICP, "leads": List[StandardizedLead], "progress": dict}]
+        """
+        sources = [(source_id, tool) for source_id, tool in self.tools.items() if tool.is_available]
+        progress = [{"total": 0, "done": 0, "leads": 0} for _ in icps]
+        results: List[List[StandardizedLead]] = [[] for _ in icps]
+        # 合并相同查询：key -> 任务，任务挂在第一个拥有者的队列上
+        jobs: Dict[str, Dict[str, Any]] = {}
+        queues = [deque() for _ in icps]
+        for index, icp in enumerate(icps):
+            for source_id, tool in sources:
+                key = self._cache_key(source_id, tool, icp, limit)
+                job = jobs.get(key)
+                if job is None:
+                    job = jobs[key] = {"source_id": source_id, "tool": tool, "icp": icp, "owners": []}
+                    queues[index].append(job)
+                job["owners"].append(index)
+                progress[index]["total"] += 1
+        print(f"批量搜索: {len(icps)} 个ICP，{len(jobs)} 个去重后的数据源查询")
+        
+        # 轮询有待执行任务的ICP
+        active = deque(index for index, queue in enumerate(queues) if queue)
+        
+        def next_job() -> Optional[Dict[str, Any]]:
+            if not active:
+                return None
+            index = active.popleft()
+            job = queues[index].popleft()
+            if queues[index]:
+                active.append(index)
+            return job
+        
+        async def worker():
+            while True:
+                job = next_job()
+                if job is None:
+                    return
+                leads = await self._search_single_source(job["source_id"], job["tool"], job["icp"], limit)
+                for owner in job["owners"]:
+                    agent_id = icps[owner].agent_id
+                    if any(lead.icp_id != agent_id for lead in leads):
+                        owner_leads = [replace(lead, icp_id=agent_id) for lead in leads]
+                    else:
+                        owner_leads = leads
+                    results[owner].extend(owner_leads)
+                    progress[owner]["done"] += 1
+                    progress[owner]["leads"] += len(owner_leads)
+                    if on_progress is not None:
+                        on_progress(owner, progress[owner])
+        
+        global_config = self.config.get('global', {})
+        max_workers = global_config.get('batch_concurrency', global_config.get('max_concurrent', 4))
+        await asyncio.gather(*(worker() for _ in range(min(max_workers, len(jobs)))))
+        
+        return [
+            {"icp": icp, "leads": DataStandardizer.merge_leads([results[index]]), "progress": progress[index]}
+            for index, icp in enumerate(icps)
+        ]
+    
+    def _filter_leads(self, leads: List[StandardizedLead], filters: Union[ICP, Dict[str, Any]]) -> List[StandardizedLead]:
+        """过滤leads"""
+        return DataStandardizer.filter_leads(leads, filters) 
+    
+    async def run(self, input: Dict) -> Dict:
+        """执行主流程统一异步入口，兼容 BaseAgent 规范。
+        :param input: {"icp": ICP, "limit": int, "deadline_ms": 可选，整体时间预算（毫秒），
+                       "as_batch": 可选，为True时以列式LeadBatch返回leads（大结果集内存占用更小）}
+        :return: {"leads": List[StandardizedLead] 或 LeadBatch, "source_status": 各数据源完成状态}
+        """
+        # 获取可用数据源
+        available_sources = self._get_available_sources()
+        print(f"\n可用数据源 ({len(available_sources)}):")
+        for source in available_sources:
+            status = "yes" if source['available'] else "no"
+            print(f"  {status} {source['name']} ({source['id']})")
+        
+        icp = input['icp']
+        # 异步并发搜索所有数据源
+        print(f"\n开始异步并发搜索...")
+        source_status = {}
+        leads = await self._search_all_sources(icp, input['limit'], input.get('deadline_ms'), source_status)
+        if input.get('as_batch', False):
+            leads = LeadBatch.from_leads(leads)
+        return {"leads": leads, "source_status": source_status}
+
+    async def aclose(self):
+        """释放所有工具、缓存、原始数据归档、字段映射进程池及共享连接池"""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        if self.search_cache is not None:
+            self.search_cache.close()
+        for tool in self.tools.values():
+            await tool.aclose()
+            if tool.field_mapper is not None:
+                await asyncio.to_thread(tool.field_mapper.close)
+        for archive in self.raw_archives.values():
+            await archive.aclose()
+        await self.transport.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
\ No newline at end of file
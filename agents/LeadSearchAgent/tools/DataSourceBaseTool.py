@@ -1,121 +1,226 @@
-import asyncio
-import json
-import os
-from abc import ABC, abstractmethod
-import string
-from typing import List, Dict, Any, Optional, Literal, TypedDict
-from dataclasses import dataclass, asdict
-from pydantic import BaseModel
-from dataclasses import field
-
-# 匹配状态离散枚举：未经过大模型的raw数据，经过大模型的scored数据，经过大模型的推荐数据
-MatchStatus = Literal["raw","scored","recommended"]
-
-class MatchStatusRecord(TypedDict):
-    """状态变更记录结构"""
-    from_status:str # 变更前状态
-    to_status:str # 变更后状态
-    reason:str # 变更原因
-    updated_by:str # 变更人
-    timestamp:str # 变更时间
-    
-
-@dataclass
-class StandardizedLead:
-    """标准化的Lead数据结构"""
-    icp_id: Optional[str] = None # icp_id
-    # 公司基本信息
-    company_id: Optional[str] = None # 公司id
-    company_name: Optional[str] = None # 公司名称
-    company_domain: Optional[str] = None # 公司域名
-    company_industry: Optional[str] = None # 公司行业
-    company_location: Optional[str] = None # 公司位置
-    company_country: Optional[str] = None # 公司国家
-    company_country_code: Optional[str] = None # 公司国家代码
-    company_size: Optional[str] = None # 公司规模
-
-    #联系人信息
-    full_name: Optional[str] = None # 联系人全名
-    job_title: Optional[str] = None # 联系人职位
-    seniority: Optional[str] = None # 联系人职级
-    department: Optional[str] = None # 联系人部门
-    work_email: Optional[str] = None # 联系人邮箱
-    personal_email: Optional[str] = None # 联系人个人邮箱
-    language: Optional[str] = None # 联系人语言
-    tels: Optional[List[str]] = None # 联系人电话
-    facebook: Optional[str] = None # 联系人facebook
-    linkedin: Optional[str] = None # 联系人linkedin
-    twitter: Optional[str] = None # 联系人twitter
-    instagram: Optional[str] = None # 联系人instagram
-    youtube: Optional[str] = None # 联系人youtube
-    tiktok: Optional[str] = None # 联系人tiktok
-    pinterest: Optional[str] = None # 联系人pinterest
-    reddit: Optional[str] = None # 联系人reddit
-    google_map: Optional[str] = None # 联系人google_map
-    line: Optional[str] = None # 联系人line
-    whatsapp: Optional[str] = None # 联系人whatsapp
-    zalo: Optional[str] = None # 联系人zalo
-    telegram: Optional[str] = None # 联系人telegram
-    summary: Optional[str] = None # 联系人简介
-    educations: Optional[List[str]] = None # 联系人教育经历
-    jobs: Optional[List[str]] = None # 联系人工作经历
-    
-    # Lead拓展上下文
-    context: Optional[Dict[str, Any]] = field(default_factory=dict) # 上下文
-
-    # 系统字段（用于评分结果缓存/结果回填）
-    lead_score: Optional[float] = None # 评分
-    score_detail: Optional[Dict[str, Any]] = None # 大模型输出多维度评分明细
-    match_status: Optional[str] = None # 匹配状态
-    match_status_history:Optional[List[MatchStatusRecord]] = field(default_factory=list) # 匹配状态历史记录
-
-
-@dataclass
-class ICP:
-    """理想客户画像"""
-    agent_id: Optional[str] = None # 代理id
-    keywords: Optional[List[str]] = None # 关键词列表 
-    countries: Optional[List[str]] = None # 国家信息
-    sectors: Optional[List[str]] = None # 行业领域
-    job_titles: Optional[List[str]] = None # 职位名称
-    email_blacklist: Optional[List[str]] = None # 邮箱黑名单
-    customer_sources: Optional[List[str]] = None # 客户来源渠道
-    company_size: Optional[str] = None # 公司规模
-
-
-class DataSourceBaseTool(ABC):
-    """数据源工具基类"""
-    
-    def __init__(self, name: str, config: Dict[str, Any]):
-        self.name = name
-        self.config = config
-        self.is_available = self._check_availability()
-    
-    @abstractmethod
-    def _check_availability(self) -> bool:
-        """检查工具是否可用"""
-        pass
-    
-    @abstractmethod
-    async def search_leads(self, icp: ICP, limit: int = 100) -> List[StandardizedLead]:
-        """异步搜索leads"""
-        pass
-    
-    def get_tool_info(self) -> Dict[str, Any]:
-        """获取工具信息"""
-        return {
-            'name': self.name,
-            'type': self.config.get('type', 'unknown'),
-            'available': self.is_available
-        }
-    
-    def save_raw_data(self, raw_data: Dict[str, Any]) -> str:
-        """保存原始数据到本地文件"""
-        os.makedirs("raw_data", exist_ok=True)
-        filename = f"raw_data/{self.name.lower()}.json"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(raw_data, f, ensure_ascii=False, indent=2)
-        
-        print(f"原始数据已保存到: {filename}")
-        return filename 
\ No newline at end of file
+import asyncio
+import hashlib
+import json
+from abc import ABC, abstractmethod
+import string
+from typing import List, Dict, Any, Optional, Literal, TypedDict, AsyncIterator
+from dataclasses import dataclass, asdict
+from pydantic import BaseModel
+from dataclasses import field
+import aiohttp
+from .http_transport import HttpTransport, HttpStatusError
+
+# 匹配状态离散枚举：未经过大模型的raw数据，经过大模型的scored数据，经过大模型的推荐数据
+MatchStatus = Literal["raw","scored","recommended"]
+
+class MatchStatusRecord(TypedDict):
+    """状态变更记录结构"""
+    from_status:str # 变更前状态
+    to_status:str # 变更后状态
+    reason:str # 变更原因
+    updated_by:str # 变更人
+    timestamp:str # 变更时间
+    
+
+@dataclass
+class StandardizedLead:
+    """标准化的Lead数据结构"""
+    icp_id: Optional[str] = None # icp_id
+    # 公司基本信息
+    company_id: Optional[str] = None # 公司id
+    company_name: Optional[str] = None # 公司名称
+    company_domain: Optional[str] = None # 公司域名
+    company_industry: Optional[str] = None # 公司行业
+    company_location: Optional[str] = None # 公司位置
+    company_country: Optional[str] = None # 公司国家
+    company_country_code: Optional[str] = None # 公司国家代码
+    company_size: Optional[str] = None # 公司规模
+
+    #联系人信息
+    full_name: Optional[str] = None # 联系人全名
+    job_title: Optional[str] = None # 联系人职位
+    seniority: Optional[str] = None # 联系人职级
+    department: Optional[str] = None # 联系人部门
+    work_email: Optional[str] = None # 联系人邮箱
+    personal_email: Optional[str] = None # 联系人个人邮箱
+    language: Optional[str] = None # 联系人语言
+    tels: Optional[List[str]] = None # 联系人电话
+    facebook: Optional[str] = None # 联系人facebook
+    linkedin: Optional[str] = None # 联系人linkedin
+    twitter: Optional[str] = None # 联系人twitter
+    instagram: Optional[str] = None # 联系人instagram
+    youtube: Optional[str] = None # 联系人youtube
+    tiktok: Optional[str] = None # 联系人tiktok
+    pinterest: Optional[str] = None # 联系人pinterest
+    reddit: Optional[str] = None # 联系人reddit
+    google_map: Optional[str] = None # 联系人google_map
+    line: Optional[str] = None # 联系人line
+    whatsapp: Optional[str] = None # 联系人whatsapp
+    zalo: Optional[str] = None # 联系人zalo
+    telegram: Optional[str] = None # 联系人telegram
+    summary: Optional[str] = None # 联系人简介
+    educations: Optional[List[str]] = None # 联系人教育经历
+    jobs: Optional[List[str]] = None # 联系人工作经历
+    
+    # Lead拓展上下文
+    context: Optional[Dict[str, Any]] = field(default_factory=dict) # 上下文
+
+    # 系统字段（用于评分结果缓存/结果回填）
+    lead_score: Optional[float] = None # 评分
+    score_detail: Optional[Dict[str, Any]] = None # 大模型输出多维度评分明细
+    match_status: Optional[str] = None # 匹配状态
+    match_status_history:Optional[List[MatchStatusRecord]] = field(default_factory=list) # 匹配状态历史记录
+
+
+@dataclass
+class ICP:
+    """理想客户画像"""
+    agent_id: Optional[str] = None # 代理id
+    keywords: Optional[List[str]] = None # 关键词列表 
+    countries: Optional[List[str]] = None # 国家信息
+    sectors: Optional[List[str]] = None # 行业领域
+    job_titles: Optional[List[str]] = None # 职位名称
+    email_blacklist: Optional[List[str]] = None # 邮箱黑名单
+    customer_sources: Optional[List[str]] = None # 客户来源渠道
+    company_size: Optional[str] = None # 公司规模
+
+    def fingerprint(self, include_agent_id: bool = False) -> str:
+        """规范化指纹：列表去重排序、忽略大小写与首尾空白
+        include_agent_id=False 时不含agent_id，只适用于查询与agent_id无关的数据源（结果可跨Agent复用）
+        """
+        def normalize(values: Optional[List[str]]) -> List[str]:
+            return sorted({str(v).strip().lower() for v in values or [] if v is not None and str(v).strip()})
+        canonical = {
+            'keywords': normalize(self.keywords),
+            'countries': normalize(self.countries),
+            'sectors': normalize(self.sectors),
+            'job_titles': normalize(self.job_titles),
+            'email_blacklist': normalize(self.email_blacklist),
+            'customer_sources': normalize(self.customer_sources),
+            'company_size': (self.company_size or '').strip().lower()
+        }
+        if include_agent_id:
+            canonical['agent_id'] = self.agent_id
+        payload = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class DataSourceBaseTool(ABC):
+    """数据源工具基类"""
+
+    # 查询结果是否按agent_id（租户）区分：为True时缓存与合并请求的key包含agent_id；
+    # 只有查询条件确实不含agent_id的数据源才可设为False，跨Agent复用结果
+    tenant_scoped = True
+    
+    def __init__(self, name: str, config: Dict[str, Any], transport=None, limiter=None, field_mapper=None, raw_archive=None):
+        self.name = name
+        self.config = config
+        self.transport = transport # 共享HTTP传输层（HttpTransport），由Agent注入
+        self.limiter = limiter # 数据源流量控制（SourceLimiter：限速/自适应并发/重试），由Agent注入
+        self.field_mapper = field_mapper # 原始记录 -> StandardizedLead 字段映射（FieldMapper），由Agent注入
+        self.raw_archive = raw_archive # 原始响应归档（RawArchive），由Agent注入
+        self._owns_transport = False # 未注入时自建传输层，由工具自己负责关闭
+        self._owns_raw_archive = False
+        self.is_available = self._check_availability()
+    
+    @abstractmethod
+    def _check_availability(self) -> bool:
+        """检查工具是否可用"""
+        pass
+    
+    @abstractmethod
+    async def search_leads(self, icp: ICP, limit: int = 100) -> List[StandardizedLead]:
+        """异步搜索leads"""
+        pass
+    
+    def query_fingerprint(self, icp: ICP) -> str:
+        """本数据源查询的ICP指纹：决定哪些ICP可以共享缓存与合并请求"""
+        return icp.fingerprint(include_agent_id=self.tenant_scoped)
+
+    async def stream_leads(self, icp: ICP, limit: int = 100) -> AsyncIterator[List[StandardizedLead]]:
+        """流式搜索leads，按批次产出；支持分页的数据源可重写为逐页产出"""
+        yield await self.search_leads(icp, limit)
+    
+    def _get_transport(self) -> HttpTransport:
+        """获取HTTP传输层，未注入时按自身配置创建"""
+        if self.transport is None:
+            self.transport = HttpTransport({'timeout': self.config.get('timeout', 30)})
+            self._owns_transport = True
+        return self.transport
+
+    def _get_field_mapper(self):
+        """获取字段映射，未注入时按config中的field_mapping（默认为小写工具名）从映射配置创建"""
+        if self.field_mapper is None:
+            from utils.field_mapper import FieldMapper
+            self.field_mapper = FieldMapper.for_source(self.config.get('field_mapping', self.name.lower()))
+        return self.field_mapper
+
+    async def _post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> Any:
+        """通过共享连接池发送JSON请求，超时取数据源配置；注入了limiter时经过限速、自适应并发与重试"""
+        async def send():
+            return await self._get_transport().post_json(url, payload, headers=headers, timeout=self.config.get('timeout'))
+        if self.limiter is None:
+            return await send()
+        return await self.limiter.call(send, is_overload=self._is_overload, is_retryable=self._is_retryable)
+    
+    async def _post_json_stream(self, url: str, payload: Dict[str, Any], key: str,
+                                headers: Optional[Dict[str, str]] = None, batch_size: int = 500,
+                                meta: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Any]]:
+        """发送JSON请求并流式解析响应中key对应的数组，按批产出；注入了limiter时同样经过流量控制"""
+        def send():
+            return self._get_transport().stream_json_array(
+                "POST", url, key, headers=headers, timeout=self.config.get('timeout'),
+                batch_size=batch_size, meta=meta, json=payload
+            )
+        stream = send() if self.limiter is None else self.limiter.stream(
+            send, is_overload=self._is_overload, is_retryable=self._is_retryable
+        )
+        async for batch in stream:
+            yield batch
+    
+    @staticmethod
+    def _is_overload(error: Exception) -> bool:
+        """限流（429）、服务端错误（5xx）与超时视为过载信号"""
+        if isinstance(error, HttpStatusError):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, asyncio.TimeoutError)
+    
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """连接类错误可重试"""
+        return isinstance(error, aiohttp.ClientError)
+
+    async def aclose(self):
+        """释放工具自建的传输层与归档，共享的由Agent关闭"""
+        if self._owns_transport and self.transport is not None:
+            await self.transport.aclose()
+            self.transport = None
+            self._owns_transport = False
+        if self._owns_raw_archive and self.raw_archive is not None:
+            await self.raw_archive.aclose()
+            self.raw_archive = None
+            self._owns_raw_archive = False
+
+    def get_tool_info(self) -> Dict[str, Any]:
+        """获取工具信息"""
+        return {
+            'name': self.name,
+            'type': self.config.get('type', 'unknown'),
+            'available': self.is_available
+        }
+    
+    def _get_raw_archive(self):
+        """获取原始响应归档，未注入时在raw_data/<工具名>下创建"""
+        if self.raw_archive is None:
+            from utils.raw_archive import RawArchive
+            self.raw_archive = RawArchive("raw_data", self.name.lower())
+            self._owns_raw_archive = True
+        return self.raw_archive
+
+    def save_raw_data(self, raw_data: Any, meta: Optional[Dict[str, Any]] = None) -> str:
+        """追加原始数据到归档（压缩NDJSON分段，相同内容只存一次），写盘在后台线程完成，不阻塞搜索
+        :return: 归档目录
+        """
+        archive = self._get_raw_archive()
+        archive.append(raw_data, meta)
+        return archive.directory
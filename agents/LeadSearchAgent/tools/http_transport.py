@@ -0,0 +1,131 @@
+"""
+HttpTransport
+数据源工具共享的异步HTTP传输层：长连接池、按主机连接数限制、DNS缓存、可配置超时、响应压缩。
+"""
+import aiohttp
+from typing import Dict, Any, Optional, AsyncIterator, List
+from utils.json_stream import iter_json_array
+
+# brotli为可选依赖，安装 Brotli 或 brotlicffi 后aiohttp可自动解码br响应
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+
+class HttpStatusError(RuntimeError):
+    """HTTP非200响应"""
+
+    def __init__(self, status: int, detail: str = ""):
+        self.status = status
+        self.detail = detail
+        super().__init__(f"HTTP {status}，详情: {detail}")
+
+
+class HttpTransport:
+    """异步HTTP传输层，连接池生命周期与Agent一致"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.limit = config.get('limit', 100) # 连接池最大连接数
+        self.limit_per_host = config.get('limit_per_host', 10) # 单个主机最大连接数
+        self.dns_cache_ttl = config.get('dns_cache_ttl', 300) # DNS缓存时间（秒）
+        self.keepalive_timeout = config.get('keepalive_timeout', 30) # 空闲长连接保持时间（秒）
+        self.connect_timeout = config.get('connect_timeout', 5) # 建立连接超时（秒）
+        self.timeout = config.get('timeout', 30) # 默认请求总超时（秒）
+        self.compression = config.get('compression', True) # 是否请求gzip/brotli压缩响应
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """懒加载共享会话（必须在事件循环中调用）"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout),
+                headers=self._default_headers(),
+                auto_decompress=True
+            )
+        return self._session
+
+    def _default_headers(self) -> Dict[str, str]:
+        """会话级默认请求头"""
+        if not self.compression:
+            return {"Accept-Encoding": "identity"}
+        encodings = "gzip, deflate, br" if BROTLI_AVAILABLE else "gzip, deflate"
+        return {"Accept-Encoding": encodings}
+
+    def _build_timeout(self, timeout: Optional[float]) -> Optional[aiohttp.ClientTimeout]:
+        """单次请求超时，未指定时使用会话默认值"""
+        if timeout is None:
+            return None
+        return aiohttp.ClientTimeout(total=timeout, connect=min(self.connect_timeout, timeout))
+
+    async def request_json(self, method: str, url: str, headers: Optional[Dict[str, str]] = None,
+                           timeout: Optional[float] = None, **kwargs) -> Any:
+        """发送请求并返回解析后的JSON，非200响应抛出HttpStatusError"""
+        session = self._get_session()
+        request_timeout = self._build_timeout(timeout)
+        if request_timeout is not None:
+            kwargs['timeout'] = request_timeout
+        async with session.request(method, url, headers=headers, **kwargs) as response:
+            if response.status != 200:
+                detail = await response.text()
+                raise HttpStatusError(response.status, detail)
+            # 部分内部接口返回的Content-Type不规范，这里不校验
+            return await response.json(content_type=None)
+
+    async def stream_json_array(self, method: str, url: str, key: str, headers: Optional[Dict[str, str]] = None,
+                                timeout: Optional[float] = None, batch_size: int = 500,
+                                meta: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncIterator[List[Any]]:
+        """发送请求并流式解析响应中顶层key对应的数组，按批产出元素，不在内存中保留完整响应
+        :param meta: 传入dict时填充数组以外的顶层字段
+        """
+        session = self._get_session()
+        request_timeout = self._build_timeout(timeout)
+        if request_timeout is not None:
+            kwargs['timeout'] = request_timeout
+        async with session.request(method, url, headers=headers, **kwargs) as response:
+            if response.status != 200:
+                detail = await response.text()
+                raise HttpStatusError(response.status, detail)
+            async for batch in iter_json_array(response.content, key, batch_size=batch_size, meta=meta):
+                yield batch
+
+    async def post_json(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None,
+                        timeout: Optional[float] = None) -> Any:
+        """发送JSON POST请求"""
+        return await self.request_json("POST", url, headers=headers, timeout=timeout, json=payload)
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None,
+                       headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> Any:
+        """发送GET请求"""
+        return await self.request_json("GET", url, headers=headers, timeout=timeout, params=params)
+
+    async def aclose(self):
+        """关闭连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def closed(self) -> bool:
+        """连接池是否已关闭"""
+        return self._session is None or self._session.closed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
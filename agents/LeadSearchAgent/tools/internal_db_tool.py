@@ -1,160 +1,134 @@
-import sqlite3
-import asyncio
-import aiohttp
-from typing import List, Dict, Any
-from .DataSourceBaseTool import DataSourceBaseTool, ICP, StandardizedLead
-import requests
-import traceback
-import json
-
-class InternalDBTool(DataSourceBaseTool):
-    """内部数据库工具"""
-    
-    def _check_availability(self) -> bool:
-        """检查API是否可用"""
-        return True
-    
-    async def search_leads(self, icp: ICP, limit: int = 100) -> List[StandardizedLead]:
-        """异步搜索leads"""
-        if not self.is_available:
-            return []
-        
-        try:
-            # 构建查询条件
-            query_conditions = self._build_query_conditions(icp, limit)
-            # 查询数据库
-            raw_data = await self._query_database(query_conditions)
-            
-            # 保存原始数据
-            self.save_raw_data(raw_data)
-            
-            # 标准化数据
-            standardized_leads = self._standardize_data(raw_data, icp)
-            
-            return standardized_leads
-            
-        except Exception as e:
-            print(f"内部数据库搜索出错: {e}")
-            print(f"内部数据库搜索出错: {traceback.print_exc()}")
-            return []
-    
-    def _build_query_conditions(self, icp: ICP, limit: int) -> Dict[str, Any]:
-        """构建查询条件"""
-        conditions = {}
-        if icp.agent_id:
-            conditions['agent_id'] = icp.agent_id        
-        if icp.sectors:
-            conditions['company_type'] = icp.sectors
-        if icp.keywords:
-            conditions['products_keywords'] = icp.keywords
-        if icp.countries:
-            conditions['countries'] = icp.countries
-        if icp.email_blacklist:
-            conditions['blacklinks'] = icp.email_blacklist
-        if icp.job_titles:
-            conditions['job_title'] = icp.job_titles
-        conditions['product_industry'] = []
-        conditions['expect_cnt'] = 10
-        conditions['limit'] = limit
-        conditions['offset'] = 0
-        if icp.customer_sources:
-            conditions['source'] = icp.customer_sources
-        return conditions
-    
-    async def _query_database(self, conditions: Dict[str, Any]) -> Dict[str, Any]:
-        """查询数据库"""
-        base_url = self.config.get('base_url', 'http://120.26.142.54/api/contacts/getAgentContacts')
-        headers = {
-            "Content-Type": "application/json",
-        }
-        timeout = self.config.get('timeout', 60)
-        try:
-            response = requests.post(base_url, headers=headers, json=conditions, timeout=timeout)
-            if response.status_code == 200:
-                print("状态码：", response.status_code)
-                print(response.text)
-                return response.json()
-            else:
-                raise RuntimeError(f"InternalDB API错误: {response.status_code}，详情: {response.text}")
-        except requests.exceptions.RequestException as e:
-            print(f"请求失败: {e}")
-        
-        # 异步请求失败，采用同步请求
-        # async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-        #     async with session.post(
-        #         f"{base_url}",
-        #         headers=headers,
-        #         json=payload
-        #     ) as response:
-        #         if response.status == 200:
-        #             data = await response.json()
-        #             print("完整响应：", json.dumps(data, indent=2))
-        #             return data.get('results', [])
-        #         else:
-        #             error_data = await response.text()
-        #             print(f"InternalDB API错误: {response.status}")
-        #             print(f"InternalDB API错误: {error_data}")
-        #             print(conditions)
-        #             raise RuntimeError(f"InternalDB API错误: {response.status}，详情: {error_data}")
-    
-    def _standardize_data(self, raw_data: Dict[str, Any], icp: ICP) -> List[StandardizedLead]:
-        """标准化内部数据库数据"""
-        standardized_leads = []
-        all_leads = raw_data.get('contacts', [])
-        print(all_leads)
-        for lead in all_leads:
-            standard_lead = StandardizedLead(
-            icp_id=icp.agent_id,
-            company_id=lead.get('company_id',None),
-            company_name=lead.get('company_name',None),
-            company_domain=lead.get('company_domain',None),
-            company_industry=lead.get('company_industry',None),
-            company_location=lead.get('company_location',None),
-            company_size=lead.get('company_size',None),
-            company_country=lead.get('company_country',None),
-            company_country_code=lead.get('company_country_code',None),
-            
-    
-            # 联系人信息
-            full_name=lead.get('full_name',None),
-            job_title=lead.get('job_title',None),
-            seniority=lead.get('seniority',None),
-            department=lead.get('department',None),
-            work_email=lead.get('work_email',None),
-            personal_email=lead.get('personal_email',None),
-            language=lead.get('language',None),
-            tels=lead.get('tels',None),
-            facebook=lead.get('facebook',None),
-            linkedin=lead.get('linkedin',None),
-            twitter=lead.get('twitter',None),
-            instagram=lead.get('instagram',None),
-            youtube=lead.get('youtube',None),
-            tiktok=lead.get('tiktok',None),
-            pinterest=lead.get('pinterest',None),
-            reddit=lead.get('reddit',None),
-            google_map=lead.get('google_map',None),
-            line=lead.get('line',None),
-            whatsapp=lead.get('whatsapp',None),
-            zalo=lead.get('zalo',None),
-            telegram=lead.get('telegram',None),
-            summary=lead.get('summary',None),
-            educations=lead.get('educations',None),
-            jobs=lead.get('jobs',None),
-
-            # 系统字段
-            match_status="raw"
-          )
-        standardized_leads.append(standard_lead)
-
-        # for item in raw_data:
-        #     lead = StandardizedLead(
-        #         name=item.get('company_name', ''),
-        #         url=item.get('website'),
-        #         email=item.get('email'),
-        #         industry=item.get('industry'),
-        #         source_name=self.name,
-        #         raw_data=item
-        #     )
-        #     standardized_leads.append(lead)
-        
-        return standardized_leads 
+import sqlite3
+import asyncio
+import aiohttp
+from collections import deque
+from typing import List, Dict, Any, AsyncIterator
+from .DataSourceBaseTool import DataSourceBaseTool, ICP, StandardizedLead
+from .http_transport import HttpStatusError
+
+class InternalDBTool(DataSourceBaseTool):
+    """内部数据库工具"""
+    
+    def _check_availability(self) -> bool:
+        """检查API是否可用"""
+        return True
+    
+    async def search_leads(self, icp: ICP, limit: int = 100) -> List[StandardizedLead]:
+        """异步搜索leads"""
+        standardized_leads = []
+        async for leads in self.stream_leads(icp, limit):
+            standardized_leads.extend(leads)
+        return standardized_leads
+    
+    async def stream_leads(self, icp: ICP, limit: int = 100) -> AsyncIterator[List[StandardizedLead]]:
+        """逐批产出标准化leads：响应体边到达边解析，每解析出一批contacts立即标准化"""
+        if not self.is_available:
+            return
+        
+        meta = {'agent_id': icp.agent_id, 'fingerprint': icp.fingerprint(), 'limit': limit}
+        # 分页并发查询数据库，按页序产出；出错时异常交给调用方，数据源状态记为失败
+        async for page in self.iter_pages(icp, limit):
+            # 原始响应片段追加到归档（后台写盘）
+            self.save_raw_data(page, meta)
+            if not page.get('contacts'):
+                continue
+            # 标准化数据
+            yield await self._standardize_data(page, icp)
+    
+    async def iter_pages(self, icp: ICP, limit: int) -> AsyncIterator[Dict[str, Any]]:
+        """分页并发拉取，按页序产出原始响应片段（{'contacts': [...]}，同一页可能分多个片段）
+        大limit拆分为page_size大小的请求，最多max_concurrent_pages个同时在途；
+        后端返回不足一页时视为数据已取完，取消后续请求。
+        """
+        page_size = max(1, self.config.get('page_size', 100))
+        max_concurrent_pages = max(1, self.config.get('max_concurrent_pages', 4))
+        # (offset, 本页条数)
+        pages = [(offset, min(page_size, limit - offset)) for offset in range(0, limit, page_size)]
+
+        async def fetch_page(offset: int, size: int, queue: asyncio.Queue):
+            # 当前页的片段直接交给消费方；窗口内后续页的片段暂存在各自队列中（每页最多page_size条）
+            try:
+                async for fragment in self._query_database(self._build_query_conditions(icp, size, offset)):
+                    queue.put_nowait(fragment)
+            finally:
+                queue.put_nowait(None)
+
+        # 滑动窗口：最多max_concurrent_pages个请求在途，避免短页后浪费大量请求
+        in_flight = deque()
+        next_index = 0
+        current = None # 正在消费的页请求（已移出窗口，提前结束时同样需要取消）
+        try:
+            while next_index < len(pages) or in_flight:
+                while next_index < len(pages) and len(in_flight) < max_concurrent_pages:
+                    offset, size = pages[next_index]
+                    queue = asyncio.Queue()
+                    in_flight.append((size, queue, asyncio.create_task(fetch_page(offset, size, queue))))
+                    next_index += 1
+                size, queue, current = in_flight.popleft()
+                received = 0
+                while True:
+                    fragment = await queue.get()
+                    if fragment is None:
+                        break
+                    received += len(fragment.get('contacts', []))
+                    yield fragment
+                await current
+                current = None
+                if received < size:
+                    break
+        finally:
+            pending = [task for _, _, task in in_flight]
+            if current is not None:
+                pending.append(current)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _build_query_conditions(self, icp: ICP, limit: int, offset: int = 0) -> Dict[str, Any]:
+        """构建查询条件"""
+        conditions = {}
+        if icp.agent_id:
+            conditions['agent_id'] = icp.agent_id        
+        if icp.sectors:
+            conditions['company_type'] = icp.sectors
+        if icp.keywords:
+            conditions['products_keywords'] = icp.keywords
+        if icp.countries:
+            conditions['countries'] = icp.countries
+        if icp.email_blacklist:
+            conditions['blacklinks'] = icp.email_blacklist
+        if icp.job_titles:
+            conditions['job_title'] = icp.job_titles
+        conditions['product_industry'] = []
+        conditions['expect_cnt'] = 10
+        conditions['limit'] = limit
+        conditions['offset'] = offset
+        if icp.customer_sources:
+            conditions['source'] = icp.customer_sources
+        return conditions
+    
+    async def _query_database(self, conditions: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """查询数据库（非阻塞，复用共享连接池），流式解析响应中的contacts数组，按批产出 {'contacts': [...]}
+        响应中其余顶层字段在最后以 contacts 为空的片段产出；响应中没有contacts数组（如 {"code": 500, "msg": ...}）时抛出。
+        """
+        base_url = self.config.get('base_url', 'http://120.26.142.54/api/contacts/getAgentContacts')
+        headers = {
+            "Content-Type": "application/json",
+        }
+        meta = {}
+        try:
+            async for contacts in self._post_json_stream(base_url, conditions, 'contacts', headers=headers,
+                                                         batch_size=self.config.get('stream_batch_size', 500), meta=meta):
+                yield {'contacts': contacts}
+        except HttpStatusError as e:
+            raise RuntimeError(f"InternalDB API错误: {e.status}，详情: {e.detail}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # 网络错误、超时或响应体不完整/非法JSON：抛出而不是静默结束，避免分页拿到残缺结果当作完成
+            raise RuntimeError(f"InternalDB 请求失败: {e!r}") from e
+        if meta:
+            yield dict(meta, contacts=[])
+
+    async def _standardize_data(self, raw_data: Dict[str, Any], icp: ICP) -> List[StandardizedLead]:
+        """标准化内部数据库数据（字段映射见 configs/field_mappings.yaml，超大页按配置转入进程池）"""
+        return await self._get_field_mapper().aconvert(raw_data.get('contacts', []), icp.agent_id)
@@ -0,0 +1,68 @@
+"""
+测试 ContextLoader 公司上下文批量查询与取消处理
+"""
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "agents", "LeadMatchAgent", "tools"))
+from context_loader import ContextBackend, ContextLoader
+
+class FakeBackend(ContextBackend):
+    """记录每次查询的域名；block=True 时查询一直挂起"""
+    def __init__(self, block=False):
+        self.block = block
+        self.calls = []
+
+    async def fetch_companies(self, domains):
+        self.calls.append(list(domains))
+        if self.block:
+            await asyncio.sleep(10)
+        return {domain: {"domain_name": domain} for domain in domains if domain != "missing.com"}
+
+def test_load_many_batches_and_caches():
+    async def main():
+        backend = FakeBackend()
+        loader = ContextLoader(backend, batch_size=2)
+        leads = [{"company_domain": d} for d in ("a.com", "b.com", "a.com", "missing.com")]
+        contexts = await loader.load_many(leads)
+        assert contexts[2]["company"]["domain_name"] == "a.com"
+        assert "domain_name" not in contexts[3]["company"]
+        assert sorted(sum(backend.calls, [])) == ["a.com", "b.com", "missing.com"]
+        await loader.load_many(leads)
+        assert len(backend.calls) == 2
+    asyncio.run(main())
+
+def test_cancelled_load_does_not_leave_inflight_futures():
+    backend = FakeBackend(block=True)
+    loader = ContextLoader(backend)
+    leads = [{"company_domain": "a.com"}]
+
+    async def cancelled():
+        first = asyncio.ensure_future(loader.load_many(leads))
+        joined = asyncio.ensure_future(loader.load_many(leads))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        # 加入同一查询的调用不挂起，按无公司上下文返回
+        contexts = await asyncio.wait_for(joined, 1)
+        assert "domain_name" not in contexts[0]["company"]
+        assert not loader._inflight
+
+    asyncio.run(cancelled())
+    # 新的事件循环中重新查询，不等待上一个循环遗留的future
+    backend.block = False
+    contexts = asyncio.run(asyncio.wait_for(loader.load_many(leads), 1))
+    assert contexts[0]["company"]["domain_name"] == "a.com"
+
+def test_backend_requires_fetch_companies():
+    try:
+        ContextBackend()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("ContextBackend 应为抽象类")
+
+if __name__ == "__main__":
+    test_load_many_batches_and_caches()
+    test_cancelled_load_does_not_leave_inflight_futures()
+    test_backend_requires_fetch_companies()
@@ -0,0 +1,96 @@
+"""
+测试增量JSON数组解析在任意块边界下的正确性
+"""
+import sys
+import os
+import asyncio
+import json
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.json_stream import JsonArrayStream, iter_json_array
+
+PAYLOAD = {
+    "code": 0,
+    "contacts": [
+        {"id": 1, "score": 12.5, "rank": -3e2, "name": "李雷 🚀"},
+        {"id": 22, "title": "CTO ] [ }{ ,", "note": "转义\"引号\\\\"},
+        100,
+        "末尾]",
+        [1, [2, 3]],
+    ],
+    "total": 12345,
+    "msg": "ok",
+}
+RAW = json.dumps(PAYLOAD, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _parse(chunks):
+    parser = JsonArrayStream("contacts")
+    items = []
+    for chunk in chunks:
+        items.extend(parser.feed(chunk))
+    items.extend(parser.close())
+    return items, parser.meta
+
+def test_every_two_chunk_split():
+    # 覆盖所有切分位置：数字中间、多字节UTF-8字符中间、字符串内的"]"前后
+    for cut in range(len(RAW) + 1):
+        items, meta = _parse([RAW[:cut], RAW[cut:]])
+        assert items == PAYLOAD["contacts"], cut
+        assert meta == {"code": 0, "total": 12345, "msg": "ok"}, cut
+
+def test_single_byte_chunks():
+    items, meta = _parse([RAW[i:i + 1] for i in range(len(RAW))])
+    assert items == PAYLOAD["contacts"] and meta["total"] == 12345
+
+def test_number_at_chunk_end_waits_for_delimiter():
+    parser = JsonArrayStream("contacts")
+    # "12" 可能是 "12.5" 的前半部分，不能提前产出
+    assert parser.feed(b'{"contacts":[12') == []
+    assert parser.feed(b'.5,7') == [12.5]
+    assert parser.feed(b']}') == [7]
+    assert parser.close() == []
+
+def test_truncated_response_raises():
+    for cut in (len(RAW) - 1, len(RAW) // 2):
+        try:
+            _parse([RAW[:cut]])
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"截断在{cut}的响应应当抛出ValueError")
+
+class FakeContent:
+    """模拟 aiohttp response.content，按固定大小返回字节块"""
+    def __init__(self, data, size):
+        self.data = data
+        self.size = size
+
+    async def read(self, n):
+        chunk, self.data = self.data[:min(n, self.size)], self.data[min(n, self.size):]
+        return chunk
+
+def test_missing_array_raises():
+    async def main():
+        try:
+            [batch async for batch in iter_json_array(FakeContent(b'{"code":500,"msg":"error"}', 7), "contacts")]
+        except ValueError as e:
+            assert "contacts" in str(e)
+        else:
+            raise AssertionError("没有contacts数组的响应应当抛出ValueError")
+        # 空数组是正常的空结果
+        assert [batch async for batch in iter_json_array(FakeContent(b'{"contacts":[]}', 7), "contacts")] == []
+    asyncio.run(main())
+
+def test_iter_json_array_batches():
+    async def main():
+        batches = [batch async for batch in iter_json_array(FakeContent(RAW, 7), "contacts", batch_size=2)]
+        assert [len(b) for b in batches] == [2, 2, 1]
+        assert sum(batches, []) == PAYLOAD["contacts"]
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    test_every_two_chunk_split()
+    test_single_byte_chunks()
+    test_number_at_chunk_end_waits_for_delimiter()
+    test_truncated_response_raises()
+    test_iter_json_array_batches()
+    test_missing_array_raises()
@@ -0,0 +1,121 @@
+"""
+测试 LeadMatchAgent 并发匹配主流程（使用假的路由器，不访问网络）
+"""
+import sys
+import os
+import types
+import asyncio
+import tempfile
+import threading
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "agents", "LeadMatchAgent"))
+# LeadMatchAgent 内部使用 from tools.xxx 导入，避免与根目录的 tools 包冲突
+_tools = types.ModuleType("tools")
+_tools.__path__ = [os.path.join(ROOT, "agents", "LeadMatchAgent", "tools")]
+sys.modules["tools"] = _tools
+from lead_match_agent import LeadMatchAgent
+from tools.llm_client import LLMClient
+from tools.result_persister import MatchResultPersister
+
+class SlowCompletions:
+    """每次调用稍作等待，使并发请求在信号量上排队"""
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        message = types.SimpleNamespace(content="匹配: 是\n理由: ok")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+class FailingRouter:
+    """id 为 bad 的线索抛出异常，其余判定匹配"""
+    async def amatch(self, icp, lead, context):
+        if lead.get("id") == "bad":
+            raise RuntimeError("router exploded")
+        return {"qualified": True, "reason": "ok", "source": "结构化解析", "route": []}
+
+def test_failed_lead_does_not_abort_batch():
+    with tempfile.TemporaryDirectory() as directory:
+        persister = MatchResultPersister(os.path.join(directory, "match_results.db"))
+        agent = LeadMatchAgent(llm_client=LLMClient(use_cache=False), persister=persister, router=FailingRouter(),
+                               pre_score=False, max_concurrency=2)
+        leads = [{"id": "a"}, {"id": "bad"}, {"id": "c"}]
+        results = agent.run_sync("cus_001", leads)
+        assert [r["lead_id"] for r in results] == ["a", "bad", "c"]
+        assert results[0]["qualified"] and results[2]["qualified"]
+        assert results[1]["source"] == "异常" and not results[1]["qualified"] and "router exploded" in results[1]["reason"]
+        # 失败的线索同样写入持久化
+        assert persister.store.latest("bad")["source"] == "异常"
+        persister.store.close()
+
+def test_run_sync_twice_on_same_agent():
+    with tempfile.TemporaryDirectory() as directory:
+        completions = SlowCompletions()
+        fake = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+        client = LLMClient(async_client=fake, max_concurrency=1, use_cache=False,
+                           rate_limits={"gpt-3.5-turbo": {"rpm": 600, "tpm": 600000}})
+        persister = MatchResultPersister(os.path.join(directory, "match_results.db"))
+        agent = LeadMatchAgent(llm_client=client, persister=persister, pre_score=False, max_concurrency=4)
+        leads = [{"id": f"lead_{i}"} for i in range(4)]
+        # 每次 run_sync 都新建事件循环，信号量与限速锁不能绑定在上一个循环上
+        for _ in range(2):
+            results = agent.run_sync("cus_001", leads)
+            assert [r["source"] for r in results] == ["自动解析"] * 4, results
+        assert completions.calls == 8
+        persister.store.close()
+
+class MinimalClient:
+    """只实现 amatch 的客户端（没有 max_concurrency）"""
+    model_name = "fake-model"
+    prompt_version = "v0"
+
+    async def amatch(self, icp, lead, context):
+        return {"qualified": True, "reason": "ok", "source": "自动解析"}
+
+class SyncPersister:
+    """只有同步 save_batch 的持久化器，记录调用所在线程"""
+    def __init__(self):
+        self.saved = []
+        self.threads = []
+
+    def save_batch(self, results):
+        self.threads.append(threading.current_thread())
+        self.saved.extend(results)
+
+def test_minimal_client_and_sync_persister():
+    persister = SyncPersister()
+    agent = LeadMatchAgent(llm_client=MinimalClient(), persister=persister, pre_score=False)
+    assert agent.max_concurrency == 8
+    results = agent.run_sync("cus_001", [{"id": "a"}, {"id": "b"}])
+    assert [r["lead_id"] for r in persister.saved] == ["a", "b"] and all(r["qualified"] for r in results)
+    # 同步 save_batch 在线程中执行，不阻塞事件循环
+    assert persister.threads and persister.threads[0] is not threading.main_thread()
+
+class FailingBatchClient(MinimalClient):
+    async def amatch_many(self, icp, leads, contexts):
+        raise RuntimeError("batch exploded")
+
+def test_batch_failure_records_each_lead():
+    persister = SyncPersister()
+    agent = LeadMatchAgent(llm_client=FailingBatchClient(), persister=persister, pre_score=False, batch_mode=True)
+    results = agent.run_sync("cus_001", [{"id": "a"}, {"id": "b"}])
+    assert [r["lead_id"] for r in results] == ["a", "b"]
+    assert all(r["source"] == "异常" and not r["qualified"] and "batch exploded" in r["reason"] for r in results)
+    assert len(persister.saved) == 2
+
+def test_rule_settled_records_have_no_model():
+    persister = SyncPersister()
+    agent = LeadMatchAgent(llm_client=MinimalClient(), persister=persister, context_budget=None)
+    agent.icp_loader = types.SimpleNamespace(load=lambda customer_id: {"keywords": ["AI"], "email_blacklist": ["spam.com"]})
+    results = agent.run_sync("cus_001", [{"id": "spam", "email": "a@spam.com"}, {"id": "a"}])
+    assert results[0]["source"] == "规则预筛" and results[0]["model"] is None and results[0]["prompt_version"] is None
+    assert results[1]["model"] == "fake-model" and results[1]["prompt_version"] == "v0"
+
+if __name__ == "__main__":
+    test_failed_lead_does_not_abort_batch()
+    test_run_sync_twice_on_same_agent()
+    test_minimal_client_and_sync_persister()
+    test_batch_failure_records_each_lead()
+    test_rule_settled_records_have_no_model()
@@ -0,0 +1,210 @@
+"""
+测试 LLMClient 异步匹配（使用假的 AsyncOpenAI，不访问网络）
+"""
+import sys
+import os
+import types
+import asyncio
+import json
+import re
+import time
+ROOT = os.path.dirname(os.path.dirname(__file__))
+sys.path.append(ROOT)
+# LeadMatchAgent 内部使用 from tools.xxx 导入，避免与根目录的 tools 包冲突
+_tools = types.ModuleType("tools")
+_tools.__path__ = [os.path.join(ROOT, "agents", "LeadMatchAgent", "tools")]
+sys.modules["tools"] = _tools
+from tools import llm_client
+from tools.llm_client import LLMClient
+
+# 重试不等待退避时间
+llm_client.backoff_delay = lambda attempt: 0
+
+def _response(content):
+    message = types.SimpleNamespace(content=content)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+class FakeCompletions:
+    """批量prompt按lead_id返回JSON，单条prompt返回结论行"""
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[0]["content"]
+        self.calls.append(prompt)
+        ids = re.findall(r'"lead_id":"([^"]+)"', prompt)
+        if ids:
+            return _response(json.dumps({i: {"qualified": True, "reason": "batch"} for i in ids}))
+        return _response("匹配: 是\n理由: single")
+
+class StreamingCompletions:
+    """stream=True 时按片段流式返回；记录已发送的片段数与流是否被关闭"""
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.sent = 0
+        self.closed = False
+        self.kwargs = None
+
+    async def create(self, model, messages, **kwargs):
+        self.kwargs = kwargs
+        completions = self
+
+        class Stream:
+            def __aiter__(self):
+                return self._gen()
+
+            async def _gen(self):
+                for piece in completions.pieces:
+                    completions.sent += 1
+                    delta = types.SimpleNamespace(content=piece)
+                    yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+            async def close(self):
+                completions.closed = True
+
+        return Stream()
+
+class FlakyCompletions(FakeCompletions):
+    """前 failures 次调用抛出 error"""
+    def __init__(self, failures, error):
+        super().__init__()
+        self.failures = failures
+        self.error = error
+
+    async def create(self, model, messages, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            self.calls.append(None)
+            raise self.error
+        return await super().create(model, messages, **kwargs)
+
+def _client(completions, **options):
+    fake = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    return LLMClient(async_client=fake, cache_path=None, **options)
+
+def test_amatch_many_caches_under_batch_key():
+    async def main():
+        completions = FakeCompletions()
+        client = _client(completions)
+        icp = {"keywords": ["AI"]}
+        leads = [{"id": "lead_1"}, {"id": "lead_2"}]
+        first = await client.amatch_many(icp, leads, [{}, {}])
+        assert [r["reason"] for r in first] == ["batch", "batch"] and len(completions.calls) == 1
+        # 单条匹配不读取批量结果的缓存，反之亦然
+        single = await client.amatch(icp, leads[0], {})
+        assert single["reason"] != "batch" and len(completions.calls) == 2
+        again = await client.amatch_many(icp, leads, [{}, {}])
+        assert all(r["cached"] and r["reason"] == "batch" for r in again) and len(completions.calls) == 2
+    asyncio.run(main())
+
+def test_amatch_caches_and_coalesces():
+    async def main():
+        completions = FakeCompletions()
+        client = _client(completions)
+        results = await asyncio.gather(*(client.amatch({"k": 1}, {"id": "a"}, {}) for _ in range(3)))
+        assert len(completions.calls) == 1
+        assert all(r["qualified"] and r["source"] == "自动解析" for r in results)
+        cached = await client.amatch({"k": 1}, {"id": "a"}, {})
+        assert cached["cached"] and len(completions.calls) == 1
+    asyncio.run(main())
+
+def test_amatch_retries_retryable_errors_only():
+    async def main():
+        completions = FlakyCompletions(2, asyncio.TimeoutError())
+        result = await _client(completions).amatch({}, {"id": "a"}, {})
+        assert result["qualified"] and len(completions.calls) == 3
+
+        completions = FlakyCompletions(5, asyncio.TimeoutError())
+        result = await _client(completions, max_retries=2).amatch({}, {"id": "a"}, {})
+        assert result["source"] == "异常" and len(completions.calls) == 3
+
+        completions = FlakyCompletions(1, ValueError("bad request"))
+        result = await _client(completions).amatch({}, {"id": "a"}, {})
+        assert result["source"] == "异常" and "bad request" in result["reason"] and len(completions.calls) == 1
+    asyncio.run(main())
+
+def test_amatch_parses_verdict_line_and_skips_unparsable_replies():
+    class ReplyCompletions(FakeCompletions):
+        def __init__(self, reply):
+            super().__init__()
+            self.reply = reply
+
+        async def create(self, model, messages, **kwargs):
+            self.calls.append(messages[0]["content"])
+            return _response(self.reply)
+
+    async def main():
+        completions = ReplyCompletions("匹配: 否\n理由: 行业不符")
+        result = await _client(completions).amatch({}, {"id": "a"}, {})
+        assert result == {"qualified": False, "reason": "行业不符", "source": "自动解析"}
+
+        # 没有结论行的回复按失败处理，不写缓存，下次调用重新请求模型
+        completions = ReplyCompletions("这条线索看起来是匹配的")
+        client = _client(completions)
+        for _ in range(2):
+            result = await client.amatch({}, {"id": "a"}, {})
+            assert result["source"] == "异常" and not result["qualified"]
+        assert len(completions.calls) == 2
+    asyncio.run(main())
+
+def test_amatch_many_retries_missing_leads_individually():
+    class PartialBatch(FakeCompletions):
+        async def create(self, model, messages, **kwargs):
+            prompt = messages[0]["content"]
+            ids = re.findall(r'"lead_id":"([^"]+)"', prompt)
+            if ids:
+                self.calls.append(prompt)
+                # 批量回复缺少 lead_2
+                return _response(json.dumps({"lead_1": {"qualified": False, "reason": "batch"}}))
+            return await super().create(model, messages, **kwargs)
+
+    async def main():
+        completions = PartialBatch()
+        results = await _client(completions).amatch_many({}, [{"id": "lead_1"}, {"id": "lead_2"}], [{}, {}])
+        assert results[0]["reason"] == "batch" and not results[0]["qualified"]
+        assert results[1]["source"] == "自动解析" and len(completions.calls) == 2
+    asyncio.run(main())
+
+def test_astream_match_reports_verdict_and_stops_for_labels():
+    async def main():
+        verdicts = []
+        completions = StreamingCompletions(["匹配", ": 是", "\n理由: ", "行业", "一致"])
+        result = await _client(completions).astream_match({}, {"id": "a"}, {}, on_verdict=verdicts.append)
+        assert result == {"qualified": True, "reason": "行业一致", "source": "流式解析"}
+        assert verdicts == [True] and completions.sent == 5
+
+        completions = StreamingCompletions(["匹配: 否", "\n理由: ", "不相关"])
+        result = await _client(completions).astream_match({}, {"id": "a"}, {}, label_only=True)
+        # 拿到结论即断开，不读取理由；使用模板中的 label_max_tokens/label_stop
+        assert result["qualified"] is False and completions.sent == 1 and completions.closed
+        assert completions.kwargs["max_tokens"] == 8 and completions.kwargs["stop"] == ["\n"]
+    asyncio.run(main())
+
+def test_rpm_and_tpm_limits():
+    async def main():
+        client = _client(FakeCompletions(), rate_limits={"gpt-3.5-turbo": {"rpm": 600, "tpm": 60000}})
+        await client.amatch({}, {"id": "a"}, {})
+        limiter = client._limiters["gpt-3.5-turbo"]
+        # 每次调用消耗1个请求令牌，以及 prompt估算token + 预留输出token
+        assert 598.5 < limiter.requests._tokens <= 600
+        assert limiter.tokens._tokens <= 60000 - client.completion_tokens
+        # 请求令牌耗尽时等待补充（600 RPM = 每秒10个）
+        limiter.requests._tokens = 0
+        start = time.monotonic()
+        await client.amatch({}, {"id": "b"}, {})
+        assert time.monotonic() - start >= 0.08
+        # token令牌不足时等待补充（60000 TPM = 每秒1000个）
+        limiter.tokens._tokens = 0
+        start = time.monotonic()
+        await client.amatch({}, {"id": "c"}, {})
+        assert time.monotonic() - start >= client.completion_tokens / 1000
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    test_amatch_many_caches_under_batch_key()
+    test_amatch_caches_and_coalesces()
+    test_amatch_retries_retryable_errors_only()
+    test_amatch_parses_verdict_line_and_skips_unparsable_replies()
+    test_amatch_many_retries_missing_leads_individually()
+    test_astream_match_reports_verdict_and_stops_for_labels()
+    test_rpm_and_tpm_limits()
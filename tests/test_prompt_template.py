@@ -0,0 +1,81 @@
+"""
+测试 prompt 模板的 front matter 解析、渲染与热更新
+"""
+import sys
+import os
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "agents", "LeadMatchAgent", "tools"))
+from prompt_template import PromptTemplate, TemplateManager
+
+def test_front_matter_options_and_body():
+    template = PromptTemplate('---\nmax_tokens: 64\nstop: ["\\n\\n"]\nlabel: 仅结论\n---\n画像: {icp}\n线索: {lead}')
+    assert template.options == {"max_tokens": 64, "stop": ["\n\n"], "label": "仅结论"}
+    assert template.body == "画像: {icp}\n线索: {lead}"
+    assert template.fields == {"icp", "lead"}
+    assert template.render(icp="AI", lead={"b": 1, "a": "中"}) == '画像: AI\n线索: {"a":"中","b":1}'
+
+def test_template_without_front_matter():
+    template = PromptTemplate("匹配 {lead}")
+    assert template.options == {} and template.body == "匹配 {lead}"
+    try:
+        template.render()
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("缺少字段应抛出KeyError")
+
+def test_unsupported_fields_are_rejected():
+    for text in ("{lead!r}", "{lead:>10}", "{lead[0]}"):
+        try:
+            PromptTemplate(text)
+        except ValueError:
+            continue
+        raise AssertionError(f"不支持的字段应被拒绝: {text}")
+
+def test_manager_reloads_on_mtime_or_size_change():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "match_prompt.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("v1 {lead}")
+        manager = TemplateManager(check_interval=0)
+        first = manager.get(path, "fallback")
+        assert first.render(lead="x") == "v1 x"
+        assert manager.get(path, "fallback") is first
+
+        # 内容长度变化（即使mtime相同）也重新加载
+        stat = os.stat(path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("v22 {lead}")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        second = manager.get(path, "fallback")
+        assert second.render(lead="x") == "v22 x" and second.hash != first.hash
+
+        # 只有mtime变化、内容相同时复用已编译的模板
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert manager.get(path, "fallback") is second
+
+        # 文件删除后使用fallback
+        os.remove(path)
+        assert manager.get(path, "fallback {lead}").render(lead="x") == "fallback x"
+
+def test_manager_check_interval_skips_stat():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "match_prompt.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("v1")
+        manager = TemplateManager(check_interval=60)
+        first = manager.get(path)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("v2 changed")
+        # 检查间隔内不重新读取文件
+        assert manager.get(path) is first
+        manager._entries[path]["checked"] = time.monotonic() - 61
+        assert manager.get(path).text == "v2 changed"
+
+if __name__ == "__main__":
+    test_front_matter_options_and_body()
+    test_template_without_front_matter()
+    test_unsupported_fields_are_rejected()
+    test_manager_reloads_on_mtime_or_size_change()
+    test_manager_check_interval_skips_stat()
@@ -0,0 +1,139 @@
+"""
+测试数据源流量控制：令牌桶、AIMD并发、退避与受控流
+"""
+import sys
+import os
+import asyncio
+import random
+import time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.rate_limiter import AIMDLimiter, SourceLimiter, TokenBucket, backoff_delay
+
+class Overloaded(Exception):
+    pass
+
+def test_token_bucket_allows_burst_then_waits():
+    async def main():
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        await bucket.acquire()
+        await bucket.acquire()
+        assert time.monotonic() - start < 0.02
+        await bucket.acquire()
+        # 桶空后按20个/秒补充，第三个令牌约需50毫秒
+        assert time.monotonic() - start >= 0.04
+        # 超过桶容量的请求按桶容量计，不会永远等待
+        await asyncio.wait_for(bucket.acquire(10), 1)
+    asyncio.run(main())
+
+def test_token_bucket_per_hour():
+    bucket = TokenBucket.per_hour(3600)
+    assert bucket.rate == 1 and bucket.capacity == 60
+
+def test_token_bucket_reused_across_event_loops():
+    bucket = TokenBucket(rate=200, capacity=1)
+
+    async def contend():
+        # 桶容量为1，后续请求在锁内等待补充，其余请求在锁上排队
+        await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+
+    asyncio.run(contend())
+    asyncio.run(contend())
+
+def test_aimd_limits_concurrency_and_adapts():
+    async def main():
+        limiter = AIMDLimiter(initial=2, min_limit=1, max_limit=4)
+        await limiter.acquire()
+        await limiter.acquire()
+        blocked = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        limiter.release()
+        await asyncio.wait_for(blocked, 1)
+
+        limiter.on_overload()
+        assert limiter.limit == 1
+        limiter.on_overload()
+        assert limiter.limit == 1  # 不低于min_limit
+        for _ in range(20):
+            limiter.on_success(0.1)
+        assert limiter.limit == 4  # 加性增大，不超过max_limit
+        limiter.on_success(1.0)  # 延迟超过基线的2倍视为劣化
+        assert limiter.limit < 4
+    asyncio.run(main())
+
+def test_backoff_delay_is_jittered_and_capped():
+    random.seed(0)
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base_delay=0.5, max_delay=4)
+        assert 0 <= delay <= min(4, 0.5 * 2 ** attempt)
+
+def _limiter(**options):
+    return SourceLimiter("test", concurrency=AIMDLimiter(initial=4), base_delay=0, max_delay=0, **options)
+
+def test_stream_retries_before_first_item():
+    async def main():
+        limiter = _limiter()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise Overloaded()
+            yield "a"
+            yield "b"
+
+        items = [item async for item in limiter.stream(flaky, is_overload=lambda e: isinstance(e, Overloaded))]
+        assert items == ["a", "b"] and len(attempts) == 3
+        # 两次过载各乘性减小一次，成功后加性增大
+        assert limiter.concurrency.limit < 4 and limiter.concurrency._in_flight == 0
+    asyncio.run(main())
+
+def test_stream_does_not_retry_after_first_item():
+    async def main():
+        limiter = _limiter()
+        attempts = []
+
+        async def fails_midway():
+            attempts.append(1)
+            yield "a"
+            raise Overloaded()
+
+        items = []
+        try:
+            async for item in limiter.stream(fails_midway, is_retryable=lambda e: True):
+                items.append(item)
+        except Overloaded:
+            pass
+        else:
+            raise AssertionError("已产出数据后出错应直接抛出")
+        assert items == ["a"] and len(attempts) == 1 and limiter.concurrency._in_flight == 0
+    asyncio.run(main())
+
+def test_stream_gives_up_after_retry_attempts():
+    async def main():
+        limiter = _limiter(retry_attempts=2)
+        attempts = []
+
+        async def always_fails():
+            attempts.append(1)
+            raise Overloaded()
+            yield
+
+        try:
+            async for _ in limiter.stream(always_fails, is_retryable=lambda e: True):
+                pass
+        except Overloaded:
+            pass
+        assert len(attempts) == 3
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    test_token_bucket_allows_burst_then_waits()
+    test_token_bucket_per_hour()
+    test_token_bucket_reused_across_event_loops()
+    test_aimd_limits_concurrency_and_adapts()
+    test_backoff_delay_is_jittered_and_capped()
+    test_stream_retries_before_first_item()
+    test_stream_does_not_retry_after_first_item()
+    test_stream_gives_up_after_retry_attempts()
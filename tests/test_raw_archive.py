@@ -0,0 +1,34 @@
+"""
+测试原始响应归档：内容去重与单条坏记录的隔离
+"""
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.raw_archive import RawArchive
+
+def test_duplicate_payloads_are_stored_once():
+    with tempfile.TemporaryDirectory() as directory:
+        archive = RawArchive(directory, "internal_db", compression="gzip")
+        archive.append({"contacts": [1]}, {"page": 0})
+        archive.append({"contacts": [1]}, {"page": 1})
+        records = list(archive.iter_records())
+        archive.close()
+        assert [r["meta"]["page"] for r in records] == [0, 1]
+        assert records[0]["payload"] == {"contacts": [1]} and records[1]["ref"] is True
+
+def test_bad_record_does_not_drop_batch():
+    with tempfile.TemporaryDirectory() as directory:
+        archive = RawArchive(directory, "internal_db", compression="none")
+        # 写线程未启动前入队，保证三条记录在同一批写入
+        archive._queue.put((0.0, {"contacts": [1]}, {}))
+        archive._queue.put((0.0, {"contacts": {object()}}, {}))
+        archive._queue.put((0.0, {"contacts": [3]}, {}))
+        archive._ensure_writer()
+        records = list(archive.iter_records())
+        archive.close()
+        assert [r["payload"]["contacts"] for r in records] == [[1], [3]]
+
+if __name__ == "__main__":
+    test_duplicate_payloads_are_stored_once()
+    test_bad_record_does_not_drop_batch()
@@ -0,0 +1,25 @@
+"""
+测试 MatchResultPersister 的 SQLite 存储与旧版 JSON 导入
+"""
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), "agents", "LeadMatchAgent", "tools"))
+from result_persister import MatchResultPersister
+
+def test_import_legacy_json_once():
+    with tempfile.TemporaryDirectory() as directory:
+        legacy = os.path.join(directory, "match_results.json")
+        with open(legacy, "w", encoding="utf-8") as f:
+            json.dump([{"customer_id": "c1", "lead_id": "lead_1", "qualified": True, "timestamp": "2024-01-01T00:00:00"}], f)
+        persister = MatchResultPersister(os.path.join(directory, "match_results.db"))
+        persister._import_legacy_json(legacy)
+        persister._import_legacy_json(legacy)
+        assert persister.store.count() == 1
+        assert persister.store.latest("lead_1")["qualified"] is True
+        assert os.path.exists(legacy)
+        persister.store.close()
+
+if __name__ == "__main__":
+    test_import_legacy_json_once()
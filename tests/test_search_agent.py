@@ -0,0 +1,314 @@
+"""
+测试 LeadSearchAgent 的缓存与请求合并（按租户隔离）
+"""
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from agents.LeadSearchAgent.LeadSearchAgent import LeadSearchAgent
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import DataSourceBaseTool, ICP, StandardizedLead
+from agents.LeadSearchAgent.tools.internal_db_tool import InternalDBTool
+from agents.LeadSearchAgent.tools.clay_tool import ClaySearchTool
+from agents.LeadSearchAgent.tools.http_transport import HttpStatusError
+from utils.cache import TieredCache
+from utils.json_stream import iter_json_array
+from utils.lead_batch import LeadBatch
+
+class FakeTenantTool(DataSourceBaseTool):
+    """按agent_id返回各自联系人的假数据源"""
+    def __init__(self, tenant_scoped=True):
+        self.tenant_scoped = tenant_scoped
+        self.calls = 0
+        super().__init__("fake", {})
+
+    def _check_availability(self) -> bool:
+        return True
+
+    async def search_leads(self, icp: ICP, limit: int = 100):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [StandardizedLead(icp_id=icp.agent_id, full_name=f"{icp.agent_id}-p{i}") for i in range(limit)]
+
+class SlowInternalDB(InternalDBTool):
+    """第一页先返回一个片段，随后长时间挂起"""
+    def __init__(self):
+        super().__init__("internal_db", {"page_size": 2, "max_concurrent_pages": 2})
+        self.cancelled = []
+
+    async def _query_database(self, conditions):
+        try:
+            yield {"contacts": [{"id": conditions["offset"]}]}
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled.append(conditions["offset"])
+            raise
+
+class TruncatedInternalDB(InternalDBTool):
+    """响应体在第一批contacts之后被截断"""
+    def __init__(self):
+        super().__init__("internal_db", {"page_size": 2})
+
+    async def _post_json_stream(self, url, payload, array_key, **kwargs):
+        yield [{"id": payload["offset"]}]
+        raise ValueError("Unterminated string")
+
+class FailingPageInternalDB(InternalDBTool):
+    """第一页正常，第二页出错"""
+    def __init__(self):
+        super().__init__("internal_db", {"page_size": 2, "max_concurrent_pages": 1})
+
+    async def _query_database(self, conditions):
+        if conditions["offset"] > 0:
+            raise RuntimeError("InternalDB API错误: 500")
+        yield {"contacts": [{"id": "1", "full_name": "a"}, {"id": "2", "full_name": "b"}]}
+
+class PartialTool(FakeTenantTool):
+    """产出第一批后挂起（fail=False）或出错（fail=True）"""
+    def __init__(self, fail=False):
+        self.fail = fail
+        super().__init__()
+
+    async def stream_leads(self, icp, limit=100):
+        self.calls += 1
+        yield [StandardizedLead(icp_id=icp.agent_id, full_name="partial")]
+        if self.fail:
+            raise RuntimeError("page 2 failed")
+        await asyncio.sleep(10)
+
+def _agent(tool, cache=True):
+    agent = LeadSearchAgent(config_path="__missing__.yaml")
+    agent.tools = {"fake": tool}
+    agent.search_cache = TieredCache(16) if cache else None
+    return agent
+
+def test_search_cache_is_tenant_scoped():
+    async def main():
+        tool = FakeTenantTool()
+        agent = _agent(tool)
+        a = await agent.run({"icp": ICP(agent_id="tenantA", keywords=["AI"]), "limit": 3})
+        b = await agent.run({"icp": ICP(agent_id="tenantB", keywords=["AI"]), "limit": 3})
+        again = await agent.run({"icp": ICP(agent_id="tenantA", keywords=["ai"]), "limit": 3})
+        assert [l.full_name for l in b["leads"]] == ["tenantB-p0", "tenantB-p1", "tenantB-p2"]
+        assert not b["source_status"]["fake"].get("cached")
+        assert again["source_status"]["fake"].get("cached") and tool.calls == 2
+        assert a["leads"][0].full_name == "tenantA-p0"
+    asyncio.run(main())
+
+def test_shared_tool_reuses_cache_across_agents():
+    async def main():
+        tool = FakeTenantTool(tenant_scoped=False)
+        agent = _agent(tool)
+        await agent.run({"icp": ICP(agent_id="tenantA", keywords=["AI"]), "limit": 2})
+        b = await agent.run({"icp": ICP(agent_id="tenantB", keywords=["AI"]), "limit": 2})
+        assert tool.calls == 1 and {l.icp_id for l in b["leads"]} == {"tenantB"}
+    asyncio.run(main())
+
+def test_concurrent_searches_coalesce_per_tenant():
+    async def main():
+        tool = FakeTenantTool()
+        agent = _agent(tool, cache=False)
+        icps = [ICP(agent_id=agent_id, keywords=["AI"]) for agent_id in ("tenantA", "tenantA", "tenantB")]
+        streamed = await asyncio.gather(*(agent.run({"icp": icp, "limit": 2}) for icp in icps))
+        searched = await asyncio.gather(*(agent._search_single_source("fake", tool, icp, 2) for icp in icps))
+        # 流式与整体搜索各按租户合并：tenantA两次调用共享一次请求，tenantB单独请求
+        assert tool.calls == 4
+        assert streamed[1]["source_status"]["fake"].get("coalesced")
+        assert not streamed[2]["source_status"]["fake"].get("coalesced")
+        assert [l.full_name for l in streamed[2]["leads"]] == ["tenantB-p0", "tenantB-p1"]
+        assert [l.full_name for l in searched[2]] == ["tenantB-p0", "tenantB-p1"]
+    asyncio.run(main())
+
+def test_run_many_merges_jobs_per_tenant():
+    async def main():
+        tool = FakeTenantTool()
+        agent = _agent(tool, cache=False)
+        icps = [ICP(agent_id="tenantA", keywords=["AI"]), ICP(agent_id="tenantA", keywords=["ai "]),
+                ICP(agent_id="tenantB", keywords=["AI"])]
+        results = await agent.run_many(icps, limit=2)
+        assert tool.calls == 2
+        assert [l.full_name for l in results[1]["leads"]] == ["tenantA-p0", "tenantA-p1"]
+        assert [l.full_name for l in results[2]["leads"]] == ["tenantB-p0", "tenantB-p1"]
+    asyncio.run(main())
+
+def test_run_as_batch_returns_lead_batch():
+    async def main():
+        agent = _agent(FakeTenantTool(), cache=False)
+        icp = ICP(agent_id="tenantA")
+        plain = (await agent.run({"icp": icp, "limit": 10}))["leads"]
+        batch = (await agent.run({"icp": icp, "limit": 10, "as_batch": True}))["leads"]
+        assert isinstance(batch, LeadBatch) and batch.to_leads() == plain
+    asyncio.run(main())
+
+def test_iter_pages_cancels_current_page_on_early_exit():
+    async def main():
+        tool = SlowInternalDB()
+
+        async def consume():
+            async for _ in tool.iter_pages(ICP(agent_id="tenantA"), 4):
+                pass
+
+        try:
+            await asyncio.wait_for(consume(), 0.05)
+        except asyncio.TimeoutError:
+            pass
+        # 正在消费的第一页与窗口内的第二页都被取消
+        assert sorted(tool.cancelled) == [0, 2]
+    asyncio.run(main())
+
+def test_query_database_raises_on_truncated_response():
+    async def main():
+        tool = TruncatedInternalDB()
+        fragments = []
+        try:
+            async for fragment in tool.iter_pages(ICP(agent_id="tenantA"), 4):
+                fragments.append(fragment)
+        except RuntimeError as e:
+            assert "Unterminated" in str(e)
+        else:
+            raise AssertionError("截断的响应应当抛出异常")
+        assert fragments == [{"contacts": [{"id": 0}]}]
+    asyncio.run(main())
+
+class ErrorBodyTransport:
+    """返回200但响应体是错误信息、没有contacts数组"""
+    class Content:
+        def __init__(self, data):
+            self.data = data
+
+        async def read(self, n):
+            chunk, self.data = self.data[:n], self.data[n:]
+            return chunk
+
+    async def stream_json_array(self, method, url, key, batch_size=500, meta=None, **kwargs):
+        content = self.Content('{"code":500,"msg":"服务异常"}'.encode("utf-8"))
+        async for batch in iter_json_array(content, key, batch_size=batch_size, meta=meta):
+            yield batch
+
+def test_query_database_raises_without_contacts_array():
+    async def main():
+        tool = InternalDBTool("internal_db", {"page_size": 2})
+        tool.transport = ErrorBodyTransport()
+        try:
+            async for _ in tool._query_database({"offset": 0}):
+                pass
+        except RuntimeError as e:
+            assert "contacts" in str(e) and "服务异常" in str(e)
+        else:
+            raise AssertionError("没有contacts数组的响应应当抛出异常，而不是当作空结果")
+    asyncio.run(main())
+
+class FailingClay(ClaySearchTool):
+    def __init__(self):
+        super().__init__("clay", {"api_key": "test-key"})
+
+    async def _post_json(self, url, payload, headers=None):
+        raise HttpStatusError(500, "boom")
+
+def test_clay_errors_propagate():
+    async def main():
+        try:
+            await FailingClay().search_leads(ICP(agent_id="tenantA"))
+        except RuntimeError as e:
+            assert "500" in str(e)
+        else:
+            raise AssertionError("Clay请求失败应当抛出，而不是返回空结果")
+    asyncio.run(main())
+
+class HedgedTool(FakeTenantTool):
+    """第一次请求挂起，对冲请求立即返回；记录被取消的请求是否已结束"""
+    def __init__(self):
+        super().__init__()
+        self.finished = []
+
+    async def search_leads(self, icp, limit=100):
+        self.calls += 1
+        if self.calls == 1:
+            try:
+                await asyncio.sleep(10)
+            finally:
+                await asyncio.sleep(0)
+                self.finished.append("slow")
+        return [StandardizedLead(full_name="hedged")]
+
+def test_hedged_search_waits_for_cancelled_losers():
+    async def main():
+        tool = HedgedTool()
+        status = {}
+        leads = await _agent(tool, cache=False)._hedged_search(tool, ICP(agent_id="tenantA"), 10, 0.01, status)
+        assert [lead.full_name for lead in leads] == ["hedged"] and status["hedged"]
+        # 返回前被取消的主请求已经结束
+        assert tool.finished == ["slow"]
+    asyncio.run(main())
+
+def test_failed_page_marks_source_failed():
+    async def main():
+        agent = _agent(FailingPageInternalDB(), cache=False)
+        result = await agent.run({"icp": ICP(agent_id="tenantA"), "limit": 4})
+        status = result["source_status"]["fake"]
+        assert status["status"] == "failed" and "500" in status["error"]
+    asyncio.run(main())
+
+def test_partial_results_are_not_cached():
+    async def main():
+        icp = ICP(agent_id="tenantA", keywords=["AI"])
+        for tool, options, expected in ((PartialTool(), {"deadline_ms": 50}, "timeout"),
+                                        (PartialTool(fail=True), {}, "failed")):
+            agent = _agent(tool)
+            result = await agent.run({"icp": icp, "limit": 5, **options})
+            assert result["source_status"]["fake"]["status"] == expected
+            assert [l.full_name for l in result["leads"]] == ["partial"]
+            assert await agent._cache_lookup("fake", tool, icp, 5) is None
+    asyncio.run(main())
+
+def test_search_cache_purges_expired_entries_on_open():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "search_cache.db")
+        cache = TieredCache(path=path, table="search_results")
+        cache.set("fresh", [1])
+        cache.disk.set("expired", [2], created=time.time() - 7200)
+        cache.close()
+        agent = LeadSearchAgent(config_path="__missing__.yaml")
+        agent.config = {"global": {"cache": {"enabled": True, "path": path, "ttl": 600, "stale_ttl": 600}}}
+        reopened = agent._create_search_cache()
+        assert reopened.get("fresh")[0] == [1]
+        assert reopened.get("expired") is None
+        reopened.close()
+
+def test_tiered_cache_aget_touches_memory_on_loop_thread():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TieredCache(path=os.path.join(directory, "cache.db"))
+        cache.disk.set("k", [1], created=time.time())
+        threads = []
+        memory_get, memory_set = cache.memory.get, cache.memory.set
+        cache.memory.get = lambda *args: threads.append(threading.current_thread()) or memory_get(*args)
+        cache.memory.set = lambda *args: threads.append(threading.current_thread()) or memory_set(*args)
+
+        async def main():
+            # 第一次磁盘命中并回填内存，第二次直接命中内存
+            assert (await cache.aget("k"))[0] == [1]
+            assert (await cache.aget("k"))[0] == [1]
+            assert await cache.aget("missing") is None
+
+        asyncio.run(main())
+        # 内存LRU的读写都发生在事件循环线程，不在线程池中
+        assert len(threads) == 4 and all(t is threading.main_thread() for t in threads)
+        cache.close()
+
+if __name__ == "__main__":
+    test_search_cache_is_tenant_scoped()
+    test_shared_tool_reuses_cache_across_agents()
+    test_concurrent_searches_coalesce_per_tenant()
+    test_run_many_merges_jobs_per_tenant()
+    test_run_as_batch_returns_lead_batch()
+    test_iter_pages_cancels_current_page_on_early_exit()
+    test_query_database_raises_on_truncated_response()
+    test_query_database_raises_without_contacts_array()
+    test_clay_errors_propagate()
+    test_hedged_search_waits_for_cancelled_losers()
+    test_failed_page_marks_source_failed()
+    test_partial_results_are_not_cached()
+    test_search_cache_purges_expired_entries_on_open()
+    test_tiered_cache_aget_touches_memory_on_loop_thread()
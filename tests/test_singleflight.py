@@ -0,0 +1,138 @@
+"""
+测试请求合并（single-flight）
+"""
+import sys
+import os
+import asyncio
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.singleflight import SingleFlight
+
+def test_do_shares_one_call():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(5)))
+        assert results == ["result"] * 5 and len(calls) == 1 and not flights.in_flight("k")
+    asyncio.run(main())
+
+def test_do_cancelled_caller_does_not_cancel_others():
+    async def main():
+        flights = SingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(0.05)
+                return "result"
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "result" and not cancelled
+        try:
+            await first
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("被取消的调用方应收到CancelledError")
+    asyncio.run(main())
+
+def test_do_last_caller_cancel_cancels_call():
+    async def main():
+        flights = SingleFlight()
+        cancelled = []
+
+        async def fetch():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        callers = [asyncio.ensure_future(flights.do("k", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # 所有等待者离开后底层请求被取消，相同key可以重新发起
+        assert cancelled == [1] and not flights.in_flight("k")
+    asyncio.run(main())
+
+def test_do_errors_are_copied_per_caller():
+    async def main():
+        flights = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        errors = await asyncio.gather(*(flights.do("k", fetch) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(e, ValueError) and e.args == ("boom",) for e in errors)
+        assert errors[0] is not errors[1]
+    asyncio.run(main())
+
+def test_stream_replays_to_late_joiners():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+        release = asyncio.Event()
+
+        async def produce():
+            calls.append(1)
+            yield 1
+            yield 2
+            await release.wait()
+            yield 3
+
+        async def collect():
+            return [item async for item in flights.stream("k", produce)]
+
+        early = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)
+        # 迟到者加入时前两批已产出，先补齐再继续接收
+        late = asyncio.ensure_future(collect())
+        await asyncio.sleep(0.01)
+        release.set()
+        assert await early == [1, 2, 3] and await late == [1, 2, 3]
+        assert len(calls) == 1 and not flights.in_flight("k")
+    asyncio.run(main())
+
+def test_stream_error_reaches_every_subscriber():
+    async def main():
+        flights = SingleFlight()
+
+        async def produce():
+            yield 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("page failed")
+
+        async def collect():
+            items = []
+            try:
+                async for item in flights.stream("k", produce):
+                    items.append(item)
+            except RuntimeError as e:
+                return items, str(e)
+
+        results = await asyncio.gather(collect(), collect())
+        assert results == [([1], "page failed"), ([1], "page failed")]
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    test_do_shares_one_call()
+    test_do_cancelled_caller_does_not_cancel_others()
+    test_do_last_caller_cancel_cancels_call()
+    test_do_errors_are_copied_per_caller()
+    test_stream_replays_to_late_joiners()
+    test_stream_error_reaches_every_subscriber()
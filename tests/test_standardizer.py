@@ -0,0 +1,175 @@
+"""
+测试 lead 合并去重与过滤
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import StandardizedLead, ICP
+from utils.standardizer import DataStandardizer
+from utils.lead_batch import CompactLead, LeadBatch
+from utils.field_mapper import FieldMapper
+
+def test_merge_leads_keeps_leads_without_company_id():
+    leads = [
+        StandardizedLead(full_name="李雷", work_email="lilei@aitech.com"),
+        StandardizedLead(full_name="韩梅梅", work_email="hanmeimei@saas.com"),
+    ]
+    merged = DataStandardizer.merge_leads([leads])
+    assert len(merged) == 2
+
+def test_merge_leads_merges_fields_across_sources():
+    internal = [StandardizedLead(full_name="Li Lei", company_domain="https://www.aitech.com/", job_title="CTO")]
+    clay = [StandardizedLead(full_name="li  lei", company_domain="aitech.com", work_email="LiLei@aitech.com", tels=["+86 138-0000-0000"])]
+    linkedin = [StandardizedLead(linkedin="https://cn.linkedin.com/in/lilei/", tels=["8613800000000"], seniority="高级")]
+    merged = DataStandardizer.merge_leads([internal, clay, linkedin])
+    assert len(merged) == 1
+    lead = merged[0]
+    assert lead.job_title == "CTO"
+    assert lead.work_email == "LiLei@aitech.com"
+    assert lead.seniority == "高级"
+    assert lead.tels == ["+86 138-0000-0000", "8613800000000"]
+    # 合并结果是拷贝，各数据源原有的lead（可能在缓存中）不被修改
+    assert lead is not internal[0] and internal[0].work_email is None and internal[0].tels is None
+    assert clay[0].tels == ["+86 138-0000-0000"]
+
+def test_merge_does_not_mutate_shared_context():
+    first = StandardizedLead(work_email="a@acme.com")
+    second = StandardizedLead(work_email="a@acme.com", context={"source": "clay"})
+    third = StandardizedLead(work_email="a@acme.com", context={"source": "db", "rank": 1})
+    merged = DataStandardizer.merge_leads([[first], [second], [third]])[0]
+    assert merged.context == {"source": "clay", "rank": 1}
+    assert first.context == {} and second.context == {"source": "clay"}
+
+def test_filter_leads_with_icp():
+    icp = ICP(keywords=["SaaS"], countries=["US"], job_titles=["CEO"], email_blacklist=["gmail.com", "@corp.io", "spam"])
+    leads = [
+        StandardizedLead(company_name="Acme SaaS", job_title="Co-founder & CEO", company_country_code="us", work_email="a@acme.com"),
+        StandardizedLead(company_name="Acme SaaS", job_title="CEO", company_country_code="CN"),
+        StandardizedLead(company_name="Acme SaaS", job_title="CEO", work_email="a@mail.corp.io"),
+        StandardizedLead(company_name="Acme SaaS", job_title="CEO", personal_email="a@gmail.com"),
+        StandardizedLead(company_name="Acme SaaS", job_title="CEO", work_email="nospam@acme.com"),
+        StandardizedLead(company_name="Acme Retail", job_title="CEO"),
+    ]
+    assert DataStandardizer.filter_leads(leads, icp) == leads[:1]
+
+def test_filter_leads_normalizes_country_names_and_codes():
+    icp = ICP(countries=["中国", "United States"])
+    leads = [
+        StandardizedLead(company_country_code="CN"),
+        StandardizedLead(company_country="China"),
+        StandardizedLead(company_country="USA"),
+        StandardizedLead(company_country="Japan", company_country_code="JP"),
+    ]
+    assert DataStandardizer.filter_leads(leads, icp) == leads[:3]
+
+def test_filter_leads_with_legacy_dict():
+    leads = [
+        StandardizedLead(company_name="AI科技", company_industry="科技"),
+        StandardizedLead(company_name="SaaS软件", company_industry="软件", work_email="x@blocked.com"),
+    ]
+    assert DataStandardizer.filter_leads(leads, {"keywords": "ai,saas", "email_blacklist": "blocked.com"}) == leads[:1]
+    # 旧版写法保持子串匹配：industry 包含即可，黑名单按子串匹配整个邮箱
+    leads = [
+        StandardizedLead(company_name="A", company_industry="人工智能科技"),
+        StandardizedLead(company_name="B", company_industry="物流"),
+        StandardizedLead(company_name="C", company_industry="科技", work_email="x@notblocked.com.cn"),
+        StandardizedLead(company_name="D"),
+    ]
+    assert DataStandardizer.filter_leads(leads, {"industry": "科技", "email_blacklist": "blocked.com"}) == [leads[0], leads[3]]
+
+def test_lead_batch_merge_and_filter():
+    internal = [StandardizedLead(full_name="Li Lei", company_domain="aitech.com", company_name="AI SaaS", company_country="China")]
+    clay = [
+        StandardizedLead(full_name="li lei", company_domain="www.aitech.com", work_email="lilei@aitech.com", lead_score=0.8),
+        StandardizedLead(full_name="Han Meimei", company_name="Retail Co", company_country="China"),
+    ]
+    merged = DataStandardizer.merge_leads([LeadBatch.from_leads(internal), LeadBatch.from_leads(clay)])
+    assert isinstance(merged, LeadBatch) and len(merged) == 2
+    assert merged.categories("company_country") == ["China"]
+    filtered = DataStandardizer.filter_leads(merged, ICP(keywords=["saas"]))
+    leads = filtered.to_leads()
+    assert len(leads) == 1
+    assert leads[0].work_email == "lilei@aitech.com" and leads[0].lead_score == 0.8 and leads[0].context == {}
+
+def test_compact_lead_roundtrip():
+    lead = StandardizedLead(full_name="李雷", tels=["13800000000"])
+    compact = CompactLead.from_lead(lead)
+    assert not hasattr(compact, "__dict__") and compact._context is None
+    compact.context["source"] = "clay"
+    assert compact.to_lead() == StandardizedLead(full_name="李雷", tels=["13800000000"], context={"source": "clay"})
+
+def test_field_mapper_candidates_and_constants():
+    mapper = FieldMapper({
+        "same_name": True,
+        "fields": {"company_name": ["company_name", "name"], "work_email": ["work_email", "email"]},
+        "constants": {"match_status": "raw"},
+    })
+    leads = mapper.convert([
+        {"name": "Acme", "email": "a@acme.com", "job_title": "CEO"},
+        {"company_name": "Beta", "name": "ignored", "tels": ["123"]},
+    ], "icp-1")
+    assert leads[0] == StandardizedLead(icp_id="icp-1", company_name="Acme", work_email="a@acme.com", job_title="CEO", match_status="raw")
+    assert leads[1].company_name == "Beta" and leads[1].tels == ["123"]
+    assert leads[0].context is not leads[1].context
+
+def test_field_mapper_process_pool_is_closed():
+    mapper = FieldMapper({"same_name": True, "chunk_size": 2, "workers": 1})
+    records = [{"full_name": str(i)} for i in range(5)]
+    assert [lead.full_name for lead in mapper.convert_parallel(records, "icp")] == ["0", "1", "2", "3", "4"]
+    assert mapper._process_pool is not None
+    mapper.close()
+    assert mapper._process_pool is None
+    # 关闭后再次使用重新创建进程池
+    assert len(mapper.convert_parallel(records)) == 5
+    mapper.close()
+
+def test_lead_scorer_rejects_clear_misses_and_escalates_uncertain():
+    from utils.lead_scorer import LeadScorer
+    icp = {"keywords": ["AI", "SaaS"], "countries": ["中国", "美国"], "sectors": ["科技", "软件"],
+           "job_titles": ["CTO", "产品经理"], "company_size": "100-500人", "email_blacklist": ["spam.com"]}
+    scorer = LeadScorer.compile(icp)
+    leads = [
+        {"company_name": "AI科技", "industry": "科技", "job_title": "CTO", "region": "中国", "company_size": "200-300"},
+        {"company_name": "AI科技", "industry": "科技", "job_title": "CTO", "region": "日本"},
+        {"company_name": "AI科技", "job_title": "CTO", "email": "a@mail.spam.com"},
+        {"company_name": "AI科技", "job_title": "销售"},
+        {"company_name": "物流公司", "industry": "物流", "job_title": "销售", "company_size": "1000+"},
+    ]
+    details = scorer.score_many(leads)
+    # 默认只有邮箱黑名单是硬性条件，国家不符只降低得分
+    assert [d["decision"] for d in details] == ["accept", "escalate", "reject", "escalate", "reject"]
+    assert details[1]["hard_fail"] == [] and details[2]["hard_fail"] == ["email_blacklist"]
+    strict = LeadScorer.compile(icp, hard_gates=("email_blacklist", "countries"))
+    assert strict.score(leads[1])["hard_fail"] == ["countries"]
+    lead = StandardizedLead(company_name="SaaS软件", company_industry="软件", job_title="产品经理")
+    assert scorer.score(lead)["decision"] == "escalate" and lead.lead_score == lead.score_detail["rule_score"]
+    # 只缺公司规模时得分达到 accept_at，但有维度未知不直接通过
+    missing_size = scorer.score({"company_name": "AI科技", "industry": "科技", "job_title": "CTO", "region": "中国"})
+    assert missing_size["rule_score"] >= scorer.accept_at and missing_size["decision"] == "escalate"
+
+def test_lead_scorer_normalizes_country_names_and_codes():
+    from utils.lead_scorer import LeadScorer
+    scorer = LeadScorer.compile({"countries": ["中国", "美国"]}, hard_gates=("email_blacklist", "countries"))
+    leads = [
+        StandardizedLead(company_country_code="CN"),
+        StandardizedLead(company_country="China"),
+        {"region": "USA"},
+        {"country": "Japan"},
+    ]
+    details = scorer.score_many(leads)
+    assert [d["components"]["countries"] for d in details] == [1.0, 1.0, 1.0, 0.0]
+    assert [d["hard_fail"] for d in details] == [[], [], [], ["countries"]]
+
+if __name__ == "__main__":
+    test_merge_leads_keeps_leads_without_company_id()
+    test_merge_leads_merges_fields_across_sources()
+    test_merge_does_not_mutate_shared_context()
+    test_filter_leads_with_icp()
+    test_filter_leads_normalizes_country_names_and_codes()
+    test_filter_leads_with_legacy_dict()
+    test_lead_batch_merge_and_filter()
+    test_compact_lead_roundtrip()
+    test_field_mapper_candidates_and_constants()
+    test_field_mapper_process_pool_is_closed()
+    test_lead_scorer_rejects_clear_misses_and_escalates_uncertain()
+    test_lead_scorer_normalizes_country_names_and_codes()
@@ -1,3 +1,3 @@
-from agents.LeadSearchAgent.tools.DataSourceBaseTool import DataSourceBaseTool, StandardizedLead, ICP
-
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import DataSourceBaseTool, StandardizedLead, ICP
+
 __all__ = ['DataSourceBaseTool', 'StandardizedLead', 'ICP'] 
\ No newline at end of file
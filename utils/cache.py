@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class LRUCache:
+    """内存LRU缓存，记录写入时间供调用方判断新鲜度"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (value, 写入时间)，不存在时返回None"""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def set(self, key: str, value: Any, created: Optional[float] = None):
+        self._data[key] = (value, created if created is not None else time.time())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """磁盘缓存，值以JSON存储在SQLite中，可跨进程/跨运行复用"""
+
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """返回 (value, 写入时间)，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, created: Optional[float] = None):
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                (key, payload, created if created is not None else time.time())
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def purge(self, max_age: float) -> int:
+        """删除超过max_age秒的条目，返回删除数"""
+        with self._lock:
+            cursor = self._conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (time.time() - max_age,))
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """两级缓存：内存LRU + 可选磁盘SQLite，磁盘命中后回填内存
+    值需可JSON序列化；返回 (value, age秒)，由调用方按TTL判断新鲜/过期。
+    """
+
+    def __init__(self, max_entries: int = 1024, path: Optional[str] = None, table: str = "cache",
+                 max_age: Optional[float] = None):
+        """max_age: 条目最长保留时间（秒），打开磁盘缓存时清理更早的条目；None表示不清理"""
+        self.memory = LRUCache(max_entries)
+        self.disk = SQLiteCache(path, table) if path else None
+        if self.disk is not None and max_age is not None:
+            self.disk.purge(max_age)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        item = self.memory.get(key)
+        if item is None and self.disk is not None:
+            item = self.disk.get(key)
+            if item is not None:
+                self.memory.set(key, item[0], item[1])
+        if item is None:
+            return None
+        value, created = item
+        return value, time.time() - created
+
+    def set(self, key: str, value: Any):
+        created = time.time()
+        self.memory.set(key, value, created)
+        if self.disk is not None:
+            self.disk.set(key, value, created)
+
+    async def aget(self, key: str) -> Optional[Tuple[Any, float]]:
+        """异步读取：内存LRU只在事件循环线程中读写，线程中只执行磁盘读取，命中后回到循环线程回填内存"""
+        item = self.memory.get(key)
+        if item is None and self.disk is not None:
+            item = await asyncio.to_thread(self.disk.get, key)
+            if item is not None:
+                self.memory.set(key, item[0], item[1])
+        if item is None:
+            return None
+        value, created = item
+        return value, time.time() - created
+
+    async def aset(self, key: str, value: Any):
+        """异步写入：内存同步写，磁盘写放到线程中执行"""
+        created = time.time()
+        self.memory.set(key, value, created)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value, created)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
@@ -0,0 +1,192 @@
+import copy
+import re
+from dataclasses import fields
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import StandardizedLead
+from utils.lead_batch import LeadBatch
+
+_SCHEME_RE = re.compile(r"^[a-z][a-z0-9+.-]*://")
+_NON_DIGIT_RE = re.compile(r"\D+")
+
+# 参与字段级合并的字段（按StandardizedLead定义顺序预先计算）
+_LEAD_FIELDS = [f.name for f in fields(StandardizedLead)]
+_LIST_UNION_FIELDS = {"tels"}
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """邮箱：去空白、小写"""
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email if "@" in email else None
+
+
+def normalize_url(url: Optional[str]) -> Optional[str]:
+    """URL/域名：小写，去掉协议、www.、查询串、锚点与末尾斜杠"""
+    if not url:
+        return None
+    url = _SCHEME_RE.sub("", url.strip().lower())
+    url = url.split("?", 1)[0].split("#", 1)[0].rstrip("/")
+    if url.startswith("www."):
+        url = url[4:]
+    return url or None
+
+
+def normalize_linkedin(url: Optional[str]) -> Optional[str]:
+    """LinkedIn主页：在URL规范化基础上统一国家子域名（cn.linkedin.com -> linkedin.com）"""
+    url = normalize_url(url)
+    if not url:
+        return None
+    host, _, path = url.partition("/")
+    if host.endswith(".linkedin.com"):
+        host = "linkedin.com"
+    return f"{host}/{path}" if path else host
+
+
+@lru_cache(maxsize=65536)
+def normalize_domain(domain: Optional[str]) -> Optional[str]:
+    """公司域名：只保留主机部分（同一公司的联系人大量共用域名，结果缓存）"""
+    url = normalize_url(domain)
+    return url.split("/", 1)[0] if url else None
+
+
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    """姓名：折叠空白、忽略大小写"""
+    if not name:
+        return None
+    name = " ".join(name.split()).casefold()
+    return name or None
+
+
+def normalize_phone(phone: Any) -> Optional[str]:
+    """电话：只保留数字并去掉前导0，过短的号码不参与去重"""
+    if phone is None:
+        return None
+    digits = _NON_DIGIT_RE.sub("", str(phone)).lstrip("0")
+    return digits if len(digits) >= 7 else None
+
+
+def lead_keys(lead: StandardizedLead) -> List[Tuple[str, str]]:
+    """lead的去重键：工作邮箱、LinkedIn、公司域名+姓名、公司id+姓名、电话"""
+    keys = []
+    email = normalize_email(lead.work_email)
+    if email:
+        keys.append(("email", email))
+    linkedin = normalize_linkedin(lead.linkedin)
+    if linkedin:
+        keys.append(("linkedin", linkedin))
+    domain = normalize_domain(lead.company_domain)
+    name = normalize_name(lead.full_name)
+    if domain and name:
+        keys.append(("domain_name", f"{domain}|{name}"))
+    if lead.company_id is not None and name:
+        keys.append(("company_name", f"{lead.company_id}|{name}"))
+    for tel in lead.tels or ():
+        phone = normalize_phone(tel)
+        if phone:
+            keys.append(("tel", phone))
+    return keys
+
+
+def _key_fields(lead: StandardizedLead) -> tuple:
+    """参与去重的字段快照，用于判断合并后是否产生了新键"""
+    return (lead.work_email, lead.linkedin, lead.company_domain, lead.full_name, lead.company_id, len(lead.tels or ()))
+
+
+def merge_into(target: StandardizedLead, source: StandardizedLead) -> StandardizedLead:
+    """字段级合并：target缺失的字段用source补齐，电话取并集，context按key补齐
+    只给target赋新值，不原地修改target或source已有的list/dict（它们可能被缓存或其他调用方共享）。
+    """
+    for name in _LEAD_FIELDS:
+        source_value = getattr(source, name)
+        if source_value is None or source_value == "" or source_value == [] or source_value == {}:
+            continue
+        target_value = getattr(target, name)
+        if name in _LIST_UNION_FIELDS and target_value:
+            existing = set(target_value)
+            setattr(target, name, list(target_value) + [v for v in source_value if v not in existing])
+        elif name == "context" and target_value:
+            context = dict(target_value)
+            for key, value in source_value.items():
+                context.setdefault(key, value)
+            setattr(target, name, context)
+        elif target_value is None or target_value == "" or target_value == [] or target_value == {}:
+            if isinstance(source_value, (list, dict)):
+                source_value = type(source_value)(source_value)
+            setattr(target, name, source_value)
+    return target
+
+
+class LeadDeduplicator:
+    """基于哈希索引的多键去重引擎
+    对每条lead计算多个规范化键并建立索引，任一键命中即视为同一联系人，
+    命中多个已有记录时用并查集把它们合并为一条。整体近似线性时间。
+    copy_leads=True 时保存并返回首次出现的lead的浅拷贝，后续合并只修改拷贝，不改动调用方传入的对象
+    （搜索结果可能同时在缓存或其他订阅者手中）。
+    """
+
+    def __init__(self, copy_leads: bool = True):
+        self.copy_leads = copy_leads
+        self._records: List[Optional[StandardizedLead]] = []
+        self._parent: List[int] = []
+        self._index: Dict[Tuple[str, str], int] = {}
+
+    def _find(self, i: int) -> int:
+        root = i
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # 路径压缩
+        while self._parent[i] != root:
+            self._parent[i], i = root, self._parent[i]
+        return root
+
+    def _index_keys(self, record_id: int, keys: Iterable[Tuple[str, str]]):
+        for key in keys:
+            self._index.setdefault(key, record_id)
+
+    def add(self, lead: StandardizedLead) -> Tuple[StandardizedLead, bool]:
+        """加入一条lead，返回 (合并后的记录, 是否为新联系人)"""
+        keys = lead_keys(lead)
+        roots = sorted({self._find(self._index[key]) for key in keys if key in self._index})
+        if not roots:
+            if self.copy_leads:
+                lead = copy.copy(lead)
+            record_id = len(self._records)
+            self._records.append(lead)
+            self._parent.append(record_id)
+            self._index_keys(record_id, keys)
+            return lead, True
+
+        # 保留最早出现的记录，其余命中的记录并入其中
+        root = roots[0]
+        record = self._records[root]
+        for other in roots[1:]:
+            merge_into(record, self._records[other])
+            self._records[other] = None
+            self._parent[other] = root
+        before = _key_fields(record)
+        merge_into(record, lead)
+        self._index_keys(root, keys)
+        # 合并补齐了参与去重的字段（如邮箱）时，为新键建立索引
+        if _key_fields(record) != before:
+            self._index_keys(root, lead_keys(record))
+        return record, False
+
+    def extend(self, leads: Iterable[StandardizedLead]):
+        for lead in leads:
+            self.add(lead)
+
+    def results(self) -> List[StandardizedLead]:
+        """去重合并后的leads，按首次出现顺序"""
+        return [record for record in self._records if record is not None]
+
+    def __len__(self) -> int:
+        return sum(1 for record in self._records if record is not None)
+
+
+def dedupe_batch(batch: LeadBatch) -> LeadBatch:
+    """列式批次去重：直接在批次的行视图上合并（会修改batch），按首次出现顺序取出保留的行"""
+    deduplicator = LeadDeduplicator(copy_leads=False)
+    deduplicator.extend(batch.rows())
+    return batch.take(record.index for record in deduplicator.results())
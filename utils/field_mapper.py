@@ -0,0 +1,151 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import yaml
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import StandardizedLead
+
+DEFAULT_MAPPINGS_PATH = "configs/field_mappings.yaml"
+
+_LEAD_FIELDS = [f.name for f in fields(StandardizedLead)]
+# 系统字段不从原始记录读取（icp_id由调用方传入，其余在评分/匹配阶段填写）
+_SYSTEM_FIELDS = {"icp_id", "context", "lead_score", "score_detail", "match_status", "match_status_history"}
+_DATA_FIELDS = [name for name in _LEAD_FIELDS if name not in _SYSTEM_FIELDS]
+
+@lru_cache(maxsize=8)
+def _load_mappings(path: str, mtime: float) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def load_field_mappings(path: str = DEFAULT_MAPPINGS_PATH) -> Dict[str, Any]:
+    """读取字段映射配置（按文件修改时间缓存）"""
+    return _load_mappings(path, os.path.getmtime(path))
+
+
+def _convert_chunk(spec: Dict[str, Any], records: List[Dict[str, Any]], icp_id: Optional[str]) -> List[StandardizedLead]:
+    """进程池worker：在子进程内编译映射并转换一段记录"""
+    return FieldMapper(spec).convert(records, icp_id)
+
+
+class FieldMapper:
+    """声明式字段映射：把数据源原始记录批量转换为StandardizedLead
+    映射规格（见 configs/field_mappings.yaml）只编译一次，生成单个列表推导式的转换函数：
+    - fields: 目标字段 -> 原始key或候选key列表（依次取第一个非空值）
+    - same_name: 未在fields中列出的数据字段按同名key读取
+    - constants: 固定值字段（如 match_status: raw）
+    - process_pool_threshold: 记录数达到该值时aconvert改用进程池（0为关闭）
+    进程池在第一次使用时创建，由 close() 关闭（关闭后再次使用会重新创建）。
+    """
+
+    def __init__(self, spec: Optional[Dict[str, Any]] = None):
+        spec = spec or {}
+        self.spec = spec
+        self.columns = self._resolve_columns(spec)
+        self.constants = dict(spec.get("constants") or {})
+        unknown = [name for name in self.constants if name not in _LEAD_FIELDS]
+        if unknown:
+            raise ValueError(f"字段映射包含未知字段: {unknown}")
+        self.process_pool_threshold = spec.get("process_pool_threshold", 0)
+        self.chunk_size = max(1, spec.get("chunk_size", 20000))
+        self.workers = spec.get("workers")
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._convert = self._compile()
+
+    @staticmethod
+    def _resolve_columns(spec: Dict[str, Any]) -> List[Tuple[str, Tuple[str, ...]]]:
+        """目标字段 -> 候选key元组（预先计算）"""
+        mapping: Dict[str, Tuple[str, ...]] = {}
+        if spec.get("same_name", False):
+            mapping = {name: (name,) for name in _DATA_FIELDS}
+        for name, keys in (spec.get("fields") or {}).items():
+            if name not in _DATA_FIELDS:
+                raise ValueError(f"字段映射包含未知或系统字段: {name}")
+            keys = (keys,) if isinstance(keys, str) else tuple(keys or ())
+            if not keys or not all(isinstance(key, str) for key in keys):
+                raise ValueError(f"字段 {name} 的映射key必须为字符串或字符串列表")
+            mapping[name] = keys
+        return list(mapping.items())
+
+    def _compile(self):
+        """生成转换函数：每个字段一个get表达式（候选key用or串联），循环内没有按字段的分支
+        直接构造实例__dict__，跳过dataclass的40个关键字参数__init__；字段默认值与StandardizedLead保持一致。
+        """
+        mapped = dict(self.columns)
+        entries = []
+        for name in _LEAD_FIELDS:
+            if name in self.constants:
+                value = f"constants[{name!r}]"
+            elif name == "icp_id":
+                value = "icp_id"
+            elif name in mapped:
+                value = " or ".join(f"get({key!r})" for key in mapped[name])
+            elif name == "context":
+                value = "{}"
+            elif name == "match_status_history":
+                value = "[]"
+            else:
+                value = "None"
+            entries.append(f"{name!r}: {value}")
+        source = (
+            "def convert(records, icp_id):\n"
+            "    leads = []\n"
+            "    append = leads.append\n"
+            "    for item in records:\n"
+            "        get = item.get\n"
+            "        lead = new(Lead)\n"
+            f"        lead.__dict__ = {{{', '.join(entries)}}}\n"
+            "        append(lead)\n"
+            "    return leads\n"
+        )
+        namespace = {"Lead": StandardizedLead, "new": object.__new__, "constants": self.constants}
+        exec(compile(source, "<field_mapper>", "exec"), namespace)
+        return namespace["convert"]
+
+    @classmethod
+    def for_source(cls, source_id: str, path: str = DEFAULT_MAPPINGS_PATH) -> "FieldMapper":
+        """按数据源id从映射配置创建（编译结果按配置文件修改时间缓存），未配置的数据源使用default映射"""
+        return _mapper_for_source(source_id, path, os.path.getmtime(path))
+
+    def convert(self, records: Iterable[Dict[str, Any]], icp_id: Optional[str] = None) -> List[StandardizedLead]:
+        """批量转换（同步）"""
+        return self._convert(records, icp_id)
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._process_pool
+
+    def close(self):
+        """关闭进程池（未创建时无操作）"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    def convert_parallel(self, records: Sequence[Dict[str, Any]], icp_id: Optional[str] = None) -> List[StandardizedLead]:
+        """超大批次按chunk_size切分后交给进程池转换，结果按原顺序拼接"""
+        chunks = [records[i:i + self.chunk_size] for i in range(0, len(records), self.chunk_size)]
+        if len(chunks) <= 1:
+            return self.convert(records, icp_id)
+        pool = self._get_process_pool()
+        standardized_leads = []
+        for leads in pool.map(_convert_chunk, [self.spec] * len(chunks), chunks, [icp_id] * len(chunks)):
+            standardized_leads.extend(leads)
+        return standardized_leads
+
+    async def aconvert(self, records: Sequence[Dict[str, Any]], icp_id: Optional[str] = None) -> List[StandardizedLead]:
+        """异步转换：达到进程池阈值时在进程池中转换，避免阻塞事件循环"""
+        if self.process_pool_threshold and len(records) >= self.process_pool_threshold:
+            return await asyncio.to_thread(self.convert_parallel, records, icp_id)
+        return self.convert(records, icp_id)
+
+
+@lru_cache(maxsize=64)
+def _mapper_for_source(source_id: str, path: str, mtime: float) -> FieldMapper:
+    mappings = _load_mappings(path, mtime)
+    spec = (mappings.get("sources") or {}).get(source_id)
+    if spec is None:
+        spec = mappings.get("default") or {"same_name": True}
+    return FieldMapper(spec)
@@ -0,0 +1,186 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# ijson为可选依赖（yajl2_c后端为C实现），安装后优先使用；否则使用内置的增量解析器
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+_SCALAR_EVENTS = ("null", "boolean", "number", "string")
+
+
+class JsonArrayStream:
+    """增量解析顶层对象中指定key的数组：按字节块喂入，逐个产出已完整到达的数组元素
+    数组以外的顶层字段解析后保存在meta中。元素边界与解析使用json标准库的C扫描器（raw_decode），
+    已消费的数据及时丢弃，内存占用与响应大小无关，只与单个元素和读取块大小有关。
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.meta: Dict[str, Any] = {}
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # start: 等待顶层'{'；key: 等待下一个顶层key；value: 解析普通字段值；items: 数组元素中；done: 顶层对象结束
+        self._state = "start"
+        self._current_key: Optional[str] = None
+        self.found = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """喂入一个字节块，返回本次解析出的完整元素"""
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(chunk)
+        self._pos = 0
+        return self._parse(final=False)
+
+    def close(self) -> List[Any]:
+        """输入结束，解析剩余数据；响应不完整时抛出ValueError"""
+        self._buffer = self._buffer[self._pos:] + self._text_decoder.decode(b"", final=True)
+        self._pos = 0
+        items = self._parse(final=True)
+        if self._state != "done":
+            raise ValueError(f"JSON响应不完整，未找到完整的顶层对象（{self.key}）")
+        return items
+
+    def _skip(self, chars: str = _WHITESPACE) -> Optional[str]:
+        """跳过指定字符，返回下一个字符（数据不足时返回None）"""
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in chars:
+            pos += 1
+        self._pos = pos
+        return buffer[pos] if pos < len(buffer) else None
+
+    def _decode(self, final: bool):
+        """从当前位置解析一个完整JSON值，数据不足时返回(None, False)"""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None, False
+        # 数字可能被块边界截断（如 12|.5），非最终块时要求其后紧跟分隔符
+        if not final and (end >= len(self._buffer) or self._buffer[end] not in _DELIMITERS):
+            return None, False
+        self._pos = end
+        return value, True
+
+    def _parse(self, final: bool) -> List[Any]:
+        items = []
+        while True:
+            char = self._skip()
+            if char is None or self._state == "done":
+                return items
+            if self._state == "start":
+                if char != "{":
+                    raise ValueError(f"JSON响应顶层不是对象: {char!r}")
+                self._pos += 1
+                self._state = "key"
+            elif self._state == "key":
+                if char in ",":
+                    self._pos += 1
+                    continue
+                if char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                start = self._pos
+                key, ok = self._decode(final)
+                if not ok:
+                    return items
+                if self._skip() != ":":
+                    # 冒号尚未到达，回退到key起点等待更多数据
+                    if self._pos >= len(self._buffer) and not final:
+                        self._pos = start
+                        return items
+                    raise ValueError("JSON响应格式错误：顶层key后缺少冒号")
+                self._pos += 1
+                self._current_key = key
+                self._state = "value"
+            elif self._state == "value":
+                if self._current_key == self.key and char == "[":
+                    self._pos += 1
+                    self.found = True
+                    self._state = "items"
+                    continue
+                value, ok = self._decode(final)
+                if not ok:
+                    return items
+                self.meta[self._current_key] = value
+                self._state = "key"
+            elif self._state == "items":
+                if char == ",":
+                    self._pos += 1
+                    continue
+                if char == "]":
+                    self._pos += 1
+                    self._state = "key"
+                    continue
+                item, ok = self._decode(final)
+                if not ok:
+                    return items
+                items.append(item)
+
+
+async def _ijson_items(content, key: str, found: List[bool], meta: Dict[str, Any]) -> AsyncIterator[Any]:
+    """ijson后端：逐个产出key数组的元素；见到该数组时在found中记录，顶层标量字段写入meta"""
+    item_prefix = f"{key}.item"
+    builder, end_event = None, None
+    async for prefix, event, value in ijson.parse_async(content, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == item_prefix and event == end_event:
+                yield builder.value
+                builder = None
+        elif prefix == item_prefix:
+            if event in ("start_map", "start_array"):
+                builder, end_event = ijson.ObjectBuilder(), event.replace("start", "end")
+                builder.event(event, value)
+            else:
+                yield value
+        elif prefix == key and event == "start_array":
+            found.append(True)
+        elif prefix and "." not in prefix and event in _SCALAR_EVENTS:
+            meta[prefix] = value
+
+
+async def iter_json_array(content, key: str, batch_size: int = 500, chunk_size: int = 65536,
+                          meta: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Any]]:
+    """从异步字节流（如 aiohttp 的 response.content）中按批产出顶层key数组的元素
+    响应中没有该数组（如 {"code": 500, "msg": ...} 这类错误响应）时抛出 ValueError，不当作空结果。
+    :param meta: 传入dict时填充数组以外的顶层字段（ijson后端只收集标量字段）
+    """
+    batch: List[Any] = []
+    if ijson is not None:
+        found: List[bool] = []
+        fields: Dict[str, Any] = {}
+        async for item in _ijson_items(content, key, found, fields):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if meta is not None:
+            meta.update(fields)
+        if not found:
+            raise ValueError(f"JSON响应中没有{key}数组: {fields}")
+    else:
+        parser = JsonArrayStream(key)
+        while True:
+            chunk = await content.read(chunk_size)
+            items = parser.feed(chunk) if chunk else parser.close()
+            for item in items:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if not chunk:
+                break
+        if meta is not None:
+            meta.update(parser.meta)
+        if not parser.found:
+            raise ValueError(f"JSON响应中没有{key}数组: {parser.meta}")
+    if batch:
+        yield batch
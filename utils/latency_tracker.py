@@ -0,0 +1,30 @@
+from collections import deque
+from typing import Dict, Optional
+
+
+class LatencyTracker:
+    """按key记录最近的耗时样本，用于计算分位数（如对冲请求的p95阈值）"""
+
+    def __init__(self, window: int = 200):
+        self.window = window # 每个key保留的样本数
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, key: str, latency: float):
+        """记录一次耗时（秒）"""
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    def count(self, key: str) -> int:
+        """样本数"""
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, percent: float, min_samples: int = 1) -> Optional[float]:
+        """计算分位数，样本不足时返回None"""
+        samples = self._samples.get(key)
+        if not samples or len(samples) < min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))
+        return ordered[index]
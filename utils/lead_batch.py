@@ -0,0 +1,241 @@
+import math
+from array import array
+from dataclasses import fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import StandardizedLead
+
+# numpy为可选依赖，仅 LeadBatch.to_numpy 使用
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LEAD_FIELDS = [f.name for f in fields(StandardizedLead)]
+# 惰性分配的容器字段：大多数lead为空，不必每条都创建dict/list
+_LAZY_CONTAINERS = {"context": dict, "match_status_history": list}
+# 取值高度重复的字段：按批次做字符串驻留，列中只存整型编码
+CATEGORICAL_FIELDS = (
+    "icp_id", "company_industry", "company_country", "company_country_code", "company_size",
+    "seniority", "department", "language", "match_status"
+)
+_FLOAT_FIELDS = ("lead_score",)
+
+
+class CompactLead:
+    """StandardizedLead的紧凑版本：__slots__存储，无实例__dict__，context/match_status_history首次访问时才分配"""
+
+    __slots__ = tuple(name for name in LEAD_FIELDS if name not in _LAZY_CONTAINERS) + ("_context", "_match_status_history")
+
+    def __init__(self, **values):
+        for name in LEAD_FIELDS:
+            value = values.get(name)
+            if name in _LAZY_CONTAINERS:
+                setattr(self, "_" + name, value or None)
+            else:
+                setattr(self, name, value)
+
+    @property
+    def context(self) -> Dict[str, Any]:
+        if self._context is None:
+            self._context = {}
+        return self._context
+
+    @context.setter
+    def context(self, value: Optional[Dict[str, Any]]):
+        self._context = value
+
+    @property
+    def match_status_history(self) -> List[Dict[str, Any]]:
+        if self._match_status_history is None:
+            self._match_status_history = []
+        return self._match_status_history
+
+    @match_status_history.setter
+    def match_status_history(self, value: Optional[List[Dict[str, Any]]]):
+        self._match_status_history = value
+
+    @classmethod
+    def from_lead(cls, lead: StandardizedLead) -> "CompactLead":
+        return cls(**{name: getattr(lead, name) for name in LEAD_FIELDS})
+
+    def to_lead(self) -> StandardizedLead:
+        values = {name: getattr(self, name) for name in LEAD_FIELDS if name not in _LAZY_CONTAINERS}
+        values["context"] = self._context if self._context is not None else {}
+        values["match_status_history"] = self._match_status_history if self._match_status_history is not None else []
+        return StandardizedLead(**values)
+
+
+class _CategoricalColumn:
+    """字符串驻留列：每个不同取值只存一份，行上存整型编码（-1表示None）"""
+
+    def __init__(self):
+        self.codes = array("i")
+        self.categories: List[str] = []
+        self._lookup: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.categories)
+            self.categories.append(value)
+        return code
+
+    def append(self, value: Optional[str]):
+        self.codes.append(self.encode(value))
+
+    def __getitem__(self, index: int) -> Optional[str]:
+        code = self.codes[index]
+        return None if code < 0 else self.categories[code]
+
+    def __setitem__(self, index: int, value: Optional[str]):
+        self.codes[index] = self.encode(value)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class _FloatColumn:
+    """浮点列：array('d')存储，NaN表示None"""
+
+    def __init__(self):
+        self.values = array("d")
+
+    def append(self, value: Optional[float]):
+        self.values.append(math.nan if value is None else float(value))
+
+    def __getitem__(self, index: int) -> Optional[float]:
+        value = self.values[index]
+        return None if math.isnan(value) else value
+
+    def __setitem__(self, index: int, value: Optional[float]):
+        self.values[index] = math.nan if value is None else float(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class LeadRow:
+    """LeadBatch中一行的视图，按属性读写列数据，可直接交给去重/过滤等按属性访问lead的逻辑"""
+
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "LeadBatch", index: int):
+        object.__setattr__(self, "_batch", batch)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, name: str) -> Any:
+        column = self._batch.columns.get(name)
+        if column is None:
+            raise AttributeError(name)
+        return column[self._index]
+
+    def __setattr__(self, name: str, value: Any):
+        column = self._batch.columns.get(name)
+        if column is None:
+            raise AttributeError(name)
+        column[self._index] = value
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+
+class LeadBatch:
+    """列式lead批次：每个字段一列，重复取值字段做字符串驻留，评分用array('d')存储
+    批量处理（合并去重、过滤、持久化）直接在列上进行，只在API边界与StandardizedLead互转。
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, Any] = {}
+        for name in LEAD_FIELDS:
+            if name in CATEGORICAL_FIELDS:
+                self.columns[name] = _CategoricalColumn()
+            elif name in _FLOAT_FIELDS:
+                self.columns[name] = _FloatColumn()
+            else:
+                self.columns[name] = []
+        self._size = 0
+
+    def append(self, lead: Any):
+        """追加一条lead（StandardizedLead/CompactLead/LeadRow，或字段dict）；空容器不保存"""
+        get = lead.get if isinstance(lead, dict) else lambda name: getattr(lead, name, None)
+        for name in LEAD_FIELDS:
+            value = get(name)
+            if name in _LAZY_CONTAINERS and not value:
+                value = None
+            self.columns[name].append(value)
+        self._size += 1
+
+    def extend(self, leads: Iterable[Any]):
+        for lead in leads:
+            self.append(lead)
+
+    @classmethod
+    def from_leads(cls, leads: Iterable[Any]) -> "LeadBatch":
+        batch = cls()
+        batch.extend(leads)
+        return batch
+
+    @classmethod
+    def concat(cls, batches: Iterable["LeadBatch"]) -> "LeadBatch":
+        batch = cls()
+        for other in batches:
+            batch.extend(other.rows())
+        return batch
+
+    def __len__(self) -> int:
+        return self._size
+
+    def row(self, index: int) -> LeadRow:
+        return LeadRow(self, index)
+
+    def rows(self) -> Iterator[LeadRow]:
+        for index in range(self._size):
+            yield LeadRow(self, index)
+
+    def column(self, name: str) -> List[Any]:
+        """按行解码后的整列取值"""
+        column = self.columns[name]
+        if isinstance(column, list):
+            return column
+        return [column[index] for index in range(self._size)]
+
+    def categories(self, name: str) -> List[str]:
+        """驻留列的不同取值"""
+        return self.columns[name].categories
+
+    def take(self, indices: Iterable[int]) -> "LeadBatch":
+        """按行号取子批次"""
+        batch = LeadBatch()
+        for index in indices:
+            batch.append(LeadRow(self, index))
+        return batch
+
+    def to_numpy(self, name: str):
+        """数值列/驻留列编码导出为numpy数组（需安装numpy）"""
+        if np is None:
+            raise ImportError("to_numpy 需要安装 numpy")
+        column = self.columns[name]
+        if isinstance(column, _FloatColumn):
+            return np.frombuffer(column.values, dtype=np.float64)
+        if isinstance(column, _CategoricalColumn):
+            return np.frombuffer(column.codes, dtype=np.int32)
+        return np.array(column, dtype=object)
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """逐行导出为dict（用于持久化），不创建dataclass"""
+        for index in range(self._size):
+            record = {name: self.columns[name][index] for name in LEAD_FIELDS}
+            for name, factory in _LAZY_CONTAINERS.items():
+                if record[name] is None:
+                    record[name] = factory()
+            yield record
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        return list(self.iter_records())
+
+    def to_leads(self) -> List[StandardizedLead]:
+        """转换回StandardizedLead（API边界使用）"""
+        return [StandardizedLead(**record) for record in self.iter_records()]
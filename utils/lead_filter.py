@@ -0,0 +1,233 @@
+import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Union
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import ICP, StandardizedLead
+from utils.lead_batch import LeadBatch
+
+# pyahocorasick为可选依赖（C实现），未安装时使用纯Python实现
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 模式数不多时，正则多选分支（C实现）比纯Python自动机更快
+_REGEX_MAX_PATTERNS = 200
+
+
+class AhoCorasick:
+    """纯Python Aho-Corasick自动机：一次扫描文本即可判断是否包含任一模式串"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[bool] = [False]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(False)
+            state = next_state
+        self._output[state] = True
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                # 根节点的子节点失败指针指回根
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] or self._output[self._fail[next_state]]
+
+    def search_any(self, text: str) -> bool:
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+class KeywordMatcher:
+    """多模式子串匹配（忽略大小写），编译时按模式数选择实现"""
+
+    def __init__(self, patterns: Iterable[str]):
+        patterns = sorted({p.strip().lower() for p in patterns if p and p.strip()})
+        self.patterns = patterns
+        self._search = None
+        if not patterns:
+            return
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for pattern in patterns:
+                automaton.add_word(pattern, pattern)
+            automaton.make_automaton()
+            self._search = lambda text: next(automaton.iter(text), None) is not None
+        elif len(patterns) <= _REGEX_MAX_PATTERNS:
+            regex = re.compile("|".join(re.escape(p) for p in sorted(patterns, key=len, reverse=True)))
+            self._search = lambda text: regex.search(text) is not None
+        else:
+            self._search = AhoCorasick(patterns).search_any
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def search(self, text: str) -> bool:
+        """text需已转为小写"""
+        return self._search(text) if self._search is not None else False
+
+
+def _as_list(value: Any) -> List[str]:
+    """兼容旧版逗号分隔字符串与列表两种写法"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [v for v in value.split(",") if v.strip()]
+    return [str(v) for v in value if v is not None]
+
+
+def _normalize_set(values: Iterable[str]) -> set:
+    return {v.strip().lower() for v in values if v and v.strip()}
+
+
+# 常见国家的中英文名称与代码，统一为小写ISO二位代码后比较（未收录的按原值小写比较）
+_COUNTRY_ALIASES = {
+    "cn": ("中国", "中华人民共和国", "中国大陆", "china", "mainland china", "people's republic of china", "prc", "chn"),
+    "us": ("美国", "united states", "united states of america", "usa", "america", "u.s.", "u.s.a."),
+    "gb": ("英国", "united kingdom", "uk", "great britain", "britain", "england", "gbr"),
+    "jp": ("日本", "japan", "jpn"),
+    "kr": ("韩国", "south korea", "korea", "republic of korea", "kor"),
+    "de": ("德国", "germany", "deu"),
+    "fr": ("法国", "france", "fra"),
+    "ca": ("加拿大", "canada", "can"),
+    "au": ("澳大利亚", "australia", "aus"),
+    "sg": ("新加坡", "singapore", "sgp"),
+    "in": ("印度", "india", "ind"),
+    "hk": ("中国香港", "香港", "hong kong", "hkg"),
+    "tw": ("中国台湾", "台湾", "taiwan", "twn"),
+}
+_COUNTRY_CODES = {alias: code for code, aliases in _COUNTRY_ALIASES.items() for alias in aliases}
+
+
+def normalize_country(value: str) -> str:
+    """国家名称/代码规范化："中国" / "China" / "CN" -> "cn"，未收录的返回小写原值"""
+    value = value.strip().lower()
+    return _COUNTRY_CODES.get(value, value)
+
+
+class LeadFilter:
+    """编译后的过滤计划：过滤条件只解析一次，之后对整批leads单次遍历
+    - keywords: 公司名/行业/简介中包含任一关键词（Aho-Corasick）
+    - job_titles: 职位包含任一职位关键词
+    - countries: 按中英文名称与代码规范化后集合查找（"中国" / "China" / "CN" 视为相同，lead缺少该字段时不过滤）
+    - sectors: 规范化后集合查找（lead缺少该字段时不过滤）
+    - industries: 行业包含任一取值（旧版dict的industry，子串匹配，lead缺少该字段时不过滤）
+    - email_blacklist: 完整邮箱精确匹配、域名后缀匹配（含子域名）、其余按子串匹配
+    - email_substrings: 邮箱包含任一取值即过滤（旧版dict的email_blacklist）
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), job_titles: Iterable[str] = (),
+                 countries: Iterable[str] = (), sectors: Iterable[str] = (),
+                 email_blacklist: Iterable[str] = (), industries: Iterable[str] = (),
+                 email_substrings: Iterable[str] = ()):
+        self.keywords = KeywordMatcher(keywords)
+        self.job_titles = KeywordMatcher(job_titles)
+        self.countries = {normalize_country(c) for c in _normalize_set(countries)}
+        self.sectors = _normalize_set(sectors)
+        self.industries = KeywordMatcher(industries)
+        blocked_emails, blocked_domains, blocked_substrings = set(), set(), list(_normalize_set(email_substrings))
+        for entry in _normalize_set(email_blacklist):
+            if entry.startswith("@"):
+                blocked_domains.add(entry[1:])
+            elif "@" in entry:
+                blocked_emails.add(entry)
+            elif "." in entry:
+                blocked_domains.add(entry)
+            else:
+                blocked_substrings.append(entry)
+        self.blocked_emails = blocked_emails
+        self.blocked_domains = blocked_domains
+        self.blocked_substrings = KeywordMatcher(blocked_substrings)
+
+    @classmethod
+    def compile(cls, source: Union[ICP, Dict[str, Any]]) -> "LeadFilter":
+        """从ICP或过滤条件dict编译
+        dict兼容旧版写法：keywords/email_blacklist 为逗号分隔字符串，industry 与邮箱黑名单保持子串匹配
+        """
+        if isinstance(source, ICP):
+            return cls(
+                keywords=source.keywords or (),
+                job_titles=source.job_titles or (),
+                countries=source.countries or (),
+                sectors=source.sectors or (),
+                email_blacklist=source.email_blacklist or ()
+            )
+        industry = source.get("industry")
+        return cls(
+            keywords=_as_list(source.get("keywords")),
+            job_titles=_as_list(source.get("job_titles")),
+            countries=_as_list(source.get("countries")),
+            sectors=_as_list(source.get("sectors")),
+            industries=[industry] if isinstance(industry, str) else _as_list(industry),
+            email_substrings=_as_list(source.get("email_blacklist"))
+        )
+
+    def _email_blocked(self, email: Optional[str]) -> bool:
+        if not email:
+            return False
+        email = email.strip().lower()
+        if email in self.blocked_emails:
+            return True
+        if self.blocked_domains:
+            # 域名后缀匹配：mail.corp.com 依次检查 mail.corp.com、corp.com、com
+            domain = email.rpartition("@")[2]
+            while domain:
+                if domain in self.blocked_domains:
+                    return True
+                domain = domain.partition(".")[2]
+        return bool(self.blocked_substrings) and self.blocked_substrings.search(email)
+
+    def matches(self, lead: StandardizedLead) -> bool:
+        """单条lead是否通过过滤"""
+        if self.keywords:
+            text = " ".join(v for v in (lead.company_name, lead.company_industry, lead.summary) if v).lower()
+            if not self.keywords.search(text):
+                return False
+        if self.job_titles and not (lead.job_title and self.job_titles.search(lead.job_title.lower())):
+            return False
+        if self.countries:
+            values = [normalize_country(v) for v in (lead.company_country, lead.company_country_code) if v]
+            if values and not any(v in self.countries for v in values):
+                return False
+        if self.sectors and lead.company_industry:
+            if lead.company_industry.strip().lower() not in self.sectors:
+                return False
+        if self.industries and lead.company_industry:
+            if not self.industries.search(lead.company_industry.lower()):
+                return False
+        if self._email_blocked(lead.work_email) or self._email_blocked(lead.personal_email):
+            return False
+        return True
+
+    def apply(self, leads: Union[Iterable[StandardizedLead], LeadBatch]) -> Union[List[StandardizedLead], LeadBatch]:
+        """整批过滤，单次遍历；传入LeadBatch时在行视图上判断并返回子批次"""
+        matches = self.matches
+        if isinstance(leads, LeadBatch):
+            return leads.take(row.index for row in leads.rows() if matches(row))
+        return [lead for lead in leads if matches(lead)]
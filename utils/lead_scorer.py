@@ -0,0 +1,240 @@
+import math
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import ICP
+from utils.lead_batch import LeadBatch
+from utils.lead_filter import KeywordMatcher, LeadFilter, _as_list, _normalize_set, normalize_country
+
+# 各维度默认权重（ICP未设置的维度不参与评分，剩余权重归一化）
+DEFAULT_WEIGHTS = {
+    "keywords": 0.3,
+    "job_titles": 0.25,
+    "sectors": 0.2,
+    "countries": 0.15,
+    "company_size": 0.1
+}
+# 线索缺少该维度字段时给中性分，交给大模型判断
+UNKNOWN_SCORE = 0.5
+
+# 判定结果
+REJECT = "reject"
+ESCALATE = "escalate"
+ACCEPT = "accept"
+
+# 各维度从线索中取值的字段（兼容StandardizedLead与旧版dict线索）
+_FIELD_ALIASES = {
+    "text": ("company_name", "company_industry", "industry", "summary", "product_desc", "product_keywords"),
+    "job_title": ("job_title",),
+    "sector": ("company_industry", "industry"),
+    "country": ("company_country", "company_country_code", "region", "country"),
+    "company_size": ("company_size",),
+    "email": ("work_email", "personal_email", "email")
+}
+_NUMBER_RE = re.compile(r"\d[\d,]*")
+
+
+def _get(lead: Any, name: str) -> Any:
+    if isinstance(lead, dict):
+        return lead.get(name)
+    return getattr(lead, name, None)
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        value = " ".join(str(v) for v in value if v is not None)
+    value = str(value).strip()
+    return value or None
+
+
+def parse_size_range(value: Optional[str]) -> Optional[Tuple[float, float]]:
+    """解析公司规模区间："100-500人" -> (100, 500)，"1000+" / "10,001 employees" -> (1000, inf)"""
+    if not value:
+        return None
+    numbers = [float(n.replace(",", "")) for n in _NUMBER_RE.findall(str(value))]
+    if not numbers:
+        return None
+    if len(numbers) == 1:
+        return numbers[0], math.inf
+    return min(numbers[:2]), max(numbers[:2])
+
+
+class LeadScorer:
+    """基于ICP的确定性规则预评分，作为大模型匹配前的廉价级联阶段
+    - 维度：keywords / job_titles / sectors / countries / company_size，各维度得分 1(命中) / 0(不符) / 0.5(线索缺字段)
+    - 加权得分写入 lead_score，各维度明细写入 score_detail
+    - 硬性条件（默认只有邮箱黑名单，可用 hard_gates 加入 countries 等维度）直接拒绝
+    - 国家按中英文名称与代码规范化后比较（"中国" / "China" / "CN" 视为相同）
+    - 得分低于 reject_below 判定拒绝；不低于 accept_at 且各维度都已知（没有缺字段）才判定通过（None表示从不直接通过），其余交给大模型
+    整批评分时按列计算：每个维度只对不同取值计算一次，再按行组合。
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), job_titles: Iterable[str] = (),
+                 countries: Iterable[str] = (), sectors: Iterable[str] = (),
+                 company_size: Optional[str] = None, email_blacklist: Iterable[str] = (),
+                 weights: Optional[Dict[str, float]] = None, reject_below: float = 0.3,
+                 accept_at: Optional[float] = 0.95, hard_gates: Iterable[str] = ("email_blacklist",)):
+        self.keywords = KeywordMatcher(keywords)
+        self.job_titles = KeywordMatcher(job_titles)
+        self.countries = {normalize_country(c) for c in _normalize_set(countries)}
+        self.sectors = _normalize_set(sectors)
+        self.size_range = parse_size_range(company_size)
+        # 邮箱黑名单复用LeadFilter的精确/域名后缀/子串匹配
+        self._email_filter = LeadFilter(email_blacklist=email_blacklist)
+        self.reject_below = reject_below
+        self.accept_at = accept_at
+        self.hard_gates = set(hard_gates)
+        active = {
+            "keywords": bool(self.keywords),
+            "job_titles": bool(self.job_titles),
+            "sectors": bool(self.sectors),
+            "countries": bool(self.countries),
+            "company_size": self.size_range is not None
+        }
+        weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        total = sum(weights[name] for name, on in active.items() if on)
+        self.weights = {name: weights[name] / total for name, on in active.items() if on and total > 0}
+
+    @classmethod
+    def compile(cls, source: Union[ICP, Dict[str, Any]], **options) -> "LeadScorer":
+        """从ICP或ICPLoader返回的dict编译；options为权重与阈值"""
+        if isinstance(source, ICP):
+            return cls(
+                keywords=source.keywords or (),
+                job_titles=source.job_titles or (),
+                countries=source.countries or (),
+                sectors=source.sectors or (),
+                company_size=source.company_size,
+                email_blacklist=source.email_blacklist or (),
+                **options
+            )
+        return cls(
+            keywords=_as_list(source.get("keywords")),
+            job_titles=_as_list(source.get("job_titles")),
+            countries=_as_list(source.get("countries")),
+            sectors=_as_list(source.get("sectors")) + _as_list(source.get("industry")),
+            company_size=source.get("company_size"),
+            email_blacklist=_as_list(source.get("email_blacklist")),
+            **options
+        )
+
+    # 单值评分：返回 1.0 / 0.0 / UNKNOWN_SCORE
+
+    def _score_keywords(self, text: Optional[str]) -> float:
+        if not text:
+            return UNKNOWN_SCORE
+        return 1.0 if self.keywords.search(text.lower()) else 0.0
+
+    def _score_job_title(self, title: Optional[str]) -> float:
+        if not title:
+            return UNKNOWN_SCORE
+        return 1.0 if self.job_titles.search(title.lower()) else 0.0
+
+    def _score_sector(self, sector: Optional[str]) -> float:
+        if not sector:
+            return UNKNOWN_SCORE
+        return 1.0 if sector.lower() in self.sectors else 0.0
+
+    def _score_country(self, countries: Optional[Tuple[str, ...]]) -> float:
+        if not countries:
+            return UNKNOWN_SCORE
+        return 1.0 if any(normalize_country(c) in self.countries for c in countries) else 0.0
+
+    def _score_size(self, size: Optional[str]) -> float:
+        lead_range = parse_size_range(size)
+        if lead_range is None:
+            return UNKNOWN_SCORE
+        low, high = self.size_range
+        return 1.0 if lead_range[0] <= high and lead_range[1] >= low else 0.0
+
+    def _email_blocked(self, emails: Optional[Tuple[str, ...]]) -> bool:
+        return bool(emails) and any(self._email_filter._email_blocked(e) for e in emails)
+
+    def _columns(self, leads: List[Any]) -> Dict[str, List[Any]]:
+        """按维度抽取列（只抽取参与评分的维度）"""
+        def first(lead, names):
+            for name in names:
+                value = _text(_get(lead, name))
+                if value:
+                    return value
+            return None
+
+        def every(lead, names):
+            values = tuple(v for v in (_text(_get(lead, name)) for name in names) if v)
+            return values or None
+
+        columns = {"email": [every(lead, _FIELD_ALIASES["email"]) for lead in leads]}
+        if "keywords" in self.weights:
+            columns["keywords"] = [" ".join(every(lead, _FIELD_ALIASES["text"]) or ()) or None for lead in leads]
+        if "job_titles" in self.weights:
+            columns["job_titles"] = [first(lead, _FIELD_ALIASES["job_title"]) for lead in leads]
+        if "sectors" in self.weights:
+            columns["sectors"] = [first(lead, _FIELD_ALIASES["sector"]) for lead in leads]
+        if "countries" in self.weights:
+            columns["countries"] = [every(lead, _FIELD_ALIASES["country"]) for lead in leads]
+        if "company_size" in self.weights:
+            columns["company_size"] = [first(lead, _FIELD_ALIASES["company_size"]) for lead in leads]
+        return columns
+
+    @staticmethod
+    def _map_unique(values: List[Any], func: Callable[[Any], Any]) -> List[Any]:
+        """每个不同取值只计算一次（行业、国家、规模等字段取值高度重复）"""
+        memo: Dict[Any, Any] = {}
+        out = []
+        for value in values:
+            result = memo.get(value, memo)
+            if result is memo:
+                result = memo[value] = func(value)
+            out.append(result)
+        return out
+
+    def score_many(self, leads: Union[Iterable[Any], LeadBatch]) -> List[Dict[str, Any]]:
+        """
+        整批评分，返回与输入一一对应的评分明细：
+        {"rule_score", "components", "hard_fail", "decision"}
+        输入为对象（StandardizedLead / CompactLead / LeadBatch）时同时回填 lead_score 与 score_detail；
+        dict线索不修改，由调用方使用返回值。
+        """
+        batch = leads if isinstance(leads, LeadBatch) else None
+        rows = list(batch.rows()) if batch is not None else list(leads)
+        columns = self._columns(rows)
+        scorers = {
+            "keywords": self._score_keywords,
+            "job_titles": self._score_job_title,
+            "sectors": self._score_sector,
+            "countries": self._score_country,
+            "company_size": self._score_size
+        }
+        component_columns = {name: self._map_unique(columns[name], scorers[name]) for name in self.weights}
+        blocked = self._map_unique(columns["email"], self._email_blocked)
+
+        details = []
+        for i, lead in enumerate(rows):
+            components = {name: component_columns[name][i] for name in self.weights}
+            # ICP没有任何可评分条件时给中性分，全部交给大模型
+            score = round(sum(self.weights[name] * value for name, value in components.items()), 4) if components else UNKNOWN_SCORE
+            hard_fail = []
+            if "email_blacklist" in self.hard_gates and blocked[i]:
+                hard_fail.append("email_blacklist")
+            for name in ("countries", "sectors", "job_titles", "keywords", "company_size"):
+                if name in self.hard_gates and components.get(name) == 0.0:
+                    hard_fail.append(name)
+            if hard_fail or score < self.reject_below:
+                decision = REJECT
+            elif (self.accept_at is not None and score >= self.accept_at
+                  and UNKNOWN_SCORE not in components.values()):
+                # 缺字段的维度按中性分计入，不能据此直接通过
+                decision = ACCEPT
+            else:
+                decision = ESCALATE
+            detail = {"rule_score": score, "components": components, "hard_fail": hard_fail, "decision": decision}
+            details.append(detail)
+            if not isinstance(lead, dict):
+                lead.lead_score = score
+                lead.score_detail = detail
+        return details
+
+    def score(self, lead: Any) -> Dict[str, Any]:
+        """单条评分"""
+        return self.score_many([lead])[0]
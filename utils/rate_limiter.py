@@ -0,0 +1,179 @@
+import asyncio
+import random
+import time
+import weakref
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+
+class TokenBucket:
+    """令牌桶限速器：以rate个/秒的速度补充令牌，最多累积capacity个"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate # 每秒补充的令牌数
+        self.capacity = max(1.0, capacity) # 桶容量（允许的突发量）
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # 锁按事件循环分别创建：令牌状态跨事件循环保留，asyncio原语不能跨循环使用
+        self._locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def per_hour(cls, limit: float, burst: Optional[float] = None) -> "TokenBucket":
+        """按每小时请求数创建，默认允许一分钟的突发量"""
+        return cls(limit / 3600, burst if burst is not None else limit / 60)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """获取令牌，不足时等待补充（超过桶容量的请求按桶容量计）"""
+        tokens = min(tokens, self.capacity)
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        async with lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class AIMDLimiter:
+    """AIMD自适应并发限制：请求顺利时加性增大并发上限，出现限流/5xx/延迟劣化时乘性减小"""
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32,
+                 decrease_factor: float = 0.5, latency_tolerance: float = 2.0,
+                 latency_target: Optional[float] = None):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit)) # 当前并发上限
+        self.decrease_factor = decrease_factor # 过载时的乘性减小系数
+        self.latency_tolerance = latency_tolerance # 延迟超过基线的倍数视为劣化
+        self.latency_target = latency_target # 固定延迟目标（秒），未配置时按观测到的最小延迟自适应
+        self._min_latency: Optional[float] = None
+        self._in_flight = 0
+        self._waiters: deque = deque()
+
+    async def acquire(self):
+        """占用一个并发槽位"""
+        while self._in_flight >= int(self.limit):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def release(self):
+        """释放并发槽位，唤醒等待者重新检查上限"""
+        self._in_flight -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def on_success(self, latency: float):
+        """请求成功：延迟正常时加性增大，延迟劣化时轻度减小"""
+        # 延迟基线：取观测到的最小延迟，并缓慢向新样本漂移，避免个别极快的请求长期压低基线
+        if self._min_latency is None or latency < self._min_latency:
+            self._min_latency = latency
+        else:
+            self._min_latency += (latency - self._min_latency) * 0.01
+        target = self.latency_target or self._min_latency * self.latency_tolerance
+        if latency > target:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_overload(self):
+        """被限流（429）、服务端错误（5xx）或超时：乘性减小"""
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+
+def backoff_delay(attempt: int, base_delay: float = 0.5, max_delay: float = 30.0) -> float:
+    """带抖动的指数退避（full jitter）"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class SourceLimiter:
+    """单个数据源的流量控制：令牌桶限速 + AIMD并发 + 抖动指数退避重试"""
+
+    def __init__(self, source_id: str, bucket: Optional[TokenBucket] = None,
+                 concurrency: Optional[AIMDLimiter] = None, retry_attempts: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 30.0):
+        self.source_id = source_id
+        self.bucket = bucket
+        self.concurrency = concurrency or AIMDLimiter()
+        self.retry_attempts = retry_attempts # 失败后的最大重试次数
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    async def call(self, func: Callable[[], Awaitable[Any]],
+                   is_overload: Callable[[Exception], bool] = lambda e: False,
+                   is_retryable: Callable[[Exception], bool] = lambda e: False) -> Any:
+        """执行一次受控请求
+        :param func: 无参协程函数，每次重试重新调用
+        :param is_overload: 判断异常是否为过载信号（触发并发下调并重试）
+        :param is_retryable: 判断其他异常是否可重试（如连接错误）
+        """
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            await self.concurrency.acquire()
+            start = time.monotonic()
+            try:
+                result = await func()
+            except Exception as e:
+                overload = is_overload(e)
+                if overload:
+                    self.concurrency.on_overload()
+                if attempt >= self.retry_attempts or not (overload or is_retryable(e)):
+                    raise
+            else:
+                self.concurrency.on_success(time.monotonic() - start)
+                return result
+            finally:
+                self.concurrency.release()
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            print(f"{self.source_id} 请求失败，{delay:.2f}秒后第{attempt + 1}次重试")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream(self, func: Callable[[], AsyncIterator[Any]],
+                     is_overload: Callable[[Exception], bool] = lambda e: False,
+                     is_retryable: Callable[[Exception], bool] = lambda e: False) -> AsyncIterator[Any]:
+        """流式版本：整个流占用一个并发名额；只有尚未产出任何数据时才重试，避免重复产出"""
+        attempt = 0
+        while True:
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            await self.concurrency.acquire()
+            start = time.monotonic()
+            produced = False
+            try:
+                async for item in func():
+                    produced = True
+                    yield item
+            except Exception as e:
+                overload = is_overload(e)
+                if overload:
+                    self.concurrency.on_overload()
+                if produced or attempt >= self.retry_attempts or not (overload or is_retryable(e)):
+                    raise
+            else:
+                self.concurrency.on_success(time.monotonic() - start)
+                return
+            finally:
+                self.concurrency.release()
+            delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+            print(f"{self.source_id} 请求失败，{delay:.2f}秒后第{attempt + 1}次重试")
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,195 @@
+import asyncio
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# zstandard为可选依赖，未安装时退回gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_EXTENSIONS = {"zstd": ".ndjson.zst", "gzip": ".ndjson.gz", "none": ".ndjson"}
+_STOP = object()
+
+
+class RawArchive:
+    """原始响应归档：追加写入的NDJSON分段文件
+    - 每次写入压缩为独立的zstd帧/gzip成员追加到当前分段，分段超过max_segment_bytes后轮转
+    - 相同内容（规范化JSON的sha256）只保存一次，重复出现时只记录引用行
+    - 序列化、哈希、压缩与写盘都在后台写线程中完成，append不阻塞事件循环
+    调用append后不要再修改传入的payload。
+    """
+
+    def __init__(self, directory: str, source: str, compression: str = "zstd",
+                 max_segment_bytes: int = 64 * 1024 * 1024, dedup: bool = True, batch_size: int = 64):
+        if compression == "zstd" and zstandard is None:
+            compression = "gzip"
+        if compression not in _EXTENSIONS:
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        self.directory = os.path.join(directory, source)
+        self.source = source
+        self.compression = compression
+        self.max_segment_bytes = max_segment_bytes
+        self.dedup = dedup
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._hashes: Optional[set] = None
+        self._segment: Optional[str] = None
+        self._compressor = zstandard.ZstdCompressor(level=3) if compression == "zstd" else None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def _hash_index_path(self) -> str:
+        return os.path.join(self.directory, "hashes.idx")
+
+    def append(self, payload: Any, meta: Optional[Dict[str, Any]] = None):
+        """加入写入队列（非阻塞）"""
+        if self._closed:
+            raise RuntimeError(f"归档 {self.source} 已关闭")
+        self._ensure_writer()
+        self._queue.put((time.time(), payload, meta or {}))
+
+    def flush(self):
+        """阻塞直到队列中的记录全部写盘"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """写完剩余记录并停止写线程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"raw-archive-{self.source}", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        os.makedirs(self.directory, exist_ok=True)
+        stop = False
+        while not stop:
+            items = [self._queue.get()]
+            # 一次取出已排队的多条记录合并写入，减少压缩帧与系统调用
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in items if item is not _STOP]
+            stop = len(records) != len(items)
+            try:
+                if records:
+                    self._write(records)
+            except Exception as e:
+                print(f"原始数据归档写入失败({self.source}): {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _load_hashes(self) -> set:
+        if self._hashes is None:
+            self._hashes = set()
+            if os.path.exists(self._hash_index_path):
+                with open(self._hash_index_path, "r", encoding="utf-8") as f:
+                    self._hashes.update(line.strip() for line in f if line.strip())
+        return self._hashes
+
+    def _write(self, records: List[tuple]):
+        lines, new_hashes = [], []
+        hashes = self._load_hashes() if self.dedup else None
+        for created, payload, meta in records:
+            try:
+                body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+                digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+                header = json.dumps({"ts": created, "source": self.source, "hash": digest, "meta": meta},
+                                    ensure_ascii=False, separators=(",", ":"))
+            except (TypeError, ValueError) as e:
+                # 单条记录无法序列化时只跳过该条，同批其余记录照常写入
+                print(f"原始数据归档跳过无法序列化的记录({self.source}): {e}")
+                continue
+            if hashes is not None and digest in hashes:
+                # 重复内容只记录引用，保留完整的出现记录供审计
+                lines.append(header[:-1] + ',"ref":true}\n')
+                continue
+            if hashes is not None:
+                hashes.add(digest)
+                new_hashes.append(digest)
+            lines.append(header[:-1] + ',"payload":' + body + "}\n")
+        if not lines:
+            return
+        data = "".join(lines).encode("utf-8")
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        elif self.compression == "gzip":
+            data = gzip.compress(data, compresslevel=6)
+        with open(self._current_segment(len(data)), "ab") as f:
+            f.write(data)
+        if new_hashes:
+            # 先写数据再写哈希索引：崩溃时最多重复保存一次，不会丢数据
+            with open(self._hash_index_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(new_hashes) + "\n")
+
+    def _current_segment(self, incoming: int) -> str:
+        """当前分段路径，写入后超过大小上限时轮转到新分段（重启后续写最后一个分段）"""
+        if self._segment is None:
+            segments = self.segments()
+            self._segment = segments[-1] if segments else self._new_segment()
+        if os.path.exists(self._segment):
+            size = os.path.getsize(self._segment)
+            if size and size + incoming > self.max_segment_bytes:
+                self._segment = self._new_segment()
+        return self._segment
+
+    def _new_segment(self) -> str:
+        index = len(self.segments())
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.directory, f"{self.source}-{index:05d}-{stamp}{_EXTENSIONS[self.compression]}")
+
+    def segments(self) -> List[str]:
+        """全部分段，按创建顺序"""
+        return sorted(glob.glob(os.path.join(self.directory, f"{self.source}-*{_EXTENSIONS[self.compression]}")))
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """按写入顺序读取全部记录（引用行的 ref 为 True、不含payload）"""
+        self.flush()
+        for path in self.segments():
+            with _open_segment(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    async def aflush(self):
+        await asyncio.to_thread(self.flush)
+
+    async def aclose(self):
+        await asyncio.to_thread(self.close)
+
+
+def _open_segment(path: str):
+    """按扩展名打开分段为文本行迭代器"""
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError(f"读取 {path} 需要安装 zstandard")
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
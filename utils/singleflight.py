@@ -0,0 +1,122 @@
+import asyncio
+import copy
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+def _clone_error(error: Exception) -> Exception:
+    """为每个等待者复制一份异常，避免多个调用方共享同一个异常对象（各自raise时traceback互相污染）
+    原异常作为副本的__cause__保留。
+    """
+    try:
+        clone = copy.copy(error)
+        clone.args = error.args
+    except Exception:
+        return error
+    return clone
+
+
+class _Call:
+    """一次进行中的共享调用"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamCall:
+    """一次进行中的共享流：生产者任务把每批结果追加到缓冲区，订阅者各自按下标读取"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """请求合并（single-flight）：相同key的并发调用共享同一个进行中的请求
+    - 任一等待者取消只影响自己；所有等待者都离开后才取消底层请求
+    - 底层请求出错时，每个等待者拿到各自的异常副本
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _StreamCall] = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls or key in self._streams
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行func或加入相同key正在进行的调用，返回共享结果"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            raise _clone_error(e) from e
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(self._calls, key, call)
+
+    async def stream(self, key: str, func: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """流式版本：相同key的订阅者共享同一个异步迭代器，迟到者先补齐已产出的批次"""
+        call = self._streams.get(key)
+        if call is None:
+            call = _StreamCall()
+            self._streams[key] = call
+
+            async def pump():
+                try:
+                    async for item in func():
+                        call.items.append(item)
+                        call.notify()
+                except Exception as e:
+                    call.error = e
+                finally:
+                    call.done = True
+                    call.notify()
+                    self._forget(self._streams, key, call)
+
+            call.task = asyncio.create_task(pump())
+        call.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(call.items):
+                    yield call.items[index]
+                    index += 1
+                if call.done:
+                    break
+                await call.wait()
+            if call.error is not None:
+                raise _clone_error(call.error) from call.error
+            if call.task.cancelled():
+                raise asyncio.CancelledError()
+        finally:
+            call.subscribers -= 1
+            if call.subscribers == 0 and not call.done:
+                call.task.cancel()
+                self._forget(self._streams, key, call)
+
+    @staticmethod
+    def _forget(calls: Dict[str, Any], key: str, call: Any):
+        """移除已结束的调用（只移除自己，避免误删同key的新调用）"""
+        if calls.get(key) is call:
+            del calls[key]
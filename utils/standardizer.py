@@ -1,104 +1,36 @@
-from typing import List, Dict, Any
-from agents.LeadSearchAgent.tools.DataSourceBaseTool import StandardizedLead
-
-
-class DataStandardizer:
-    """数据标准化工具"""
-    
-    @staticmethod
-    def standardize_leads(raw_data: List[Dict[str, Any]], source_name: str) -> List[StandardizedLead]:
-        """标准化leads数据"""
-        standardized_leads = []
-        
-        for item in raw_data:
-            lead = StandardizedLead(
-                name=DataStandardizer._extract_name(item),
-                url=DataStandardizer._extract_url(item),
-                email=DataStandardizer._extract_email(item),
-                industry=DataStandardizer._extract_industry(item),
-                source_name=source_name,
-                raw_data=item
-            )
-            standardized_leads.append(lead)
-        
-        return standardized_leads
-    
-    @staticmethod
-    def _extract_name(item: Dict[str, Any]) -> str:
-        """提取公司名称"""
-        name_fields = ['company_name', 'name', 'company', 'organization']
-        for field in name_fields:
-            if item.get(field):
-                return str(item[field])
-        return ''
-    
-    @staticmethod
-    def _extract_url(item: Dict[str, Any]) -> str:
-        """提取公司网址"""
-        url_fields = ['website', 'url', 'homepage', 'domain']
-        for field in url_fields:
-            if item.get(field):
-                return str(item[field])
-        return ""
-    
-    @staticmethod
-    def _extract_email(item: Dict[str, Any]) -> str:
-        """提取联系邮箱"""
-        email_fields = ['email', 'contact_email', 'primary_email']
-        for field in email_fields:
-            if item.get(field):
-                return str(item[field])
-        return ""
-    
-    @staticmethod
-    def _extract_industry(item: Dict[str, Any]) -> str:
-        """提取所属行业"""
-        industry_fields = ['industry', 'sector', 'business_type', 'category']
-        for field in industry_fields:
-            if item.get(field):
-                return str(item[field])
-        return ""
-    
-    @staticmethod
-    def merge_leads(all_leads: List[List[StandardizedLead]]) -> List[StandardizedLead]:
-        """合并多个数据源的leads"""
-        merged_leads = []
-        # 判断是否重复，用id来判断
-        seen_ids = set()
-        
-        for leads_batch in all_leads:
-            for lead in leads_batch:
-                lead_id = lead.company_id
-                # 简单的去重逻辑：基于公司名称
-                if lead and lead_id not in seen_ids:
-                    merged_leads.append(lead)
-                    seen_ids.add(lead_id)
-        
-        return merged_leads
-    
-    @staticmethod
-    def filter_leads(leads: List[StandardizedLead], filters: Dict[str, Any]) -> List[StandardizedLead]:
-        """根据条件过滤leads"""
-        filtered_leads = []
-        
-        for lead in leads:
-            # 检查关键词过滤
-            if 'keywords' in filters and filters['keywords']:
-                keywords = filters['keywords'].lower().split(',')
-                if not any(keyword in lead.name.lower() for keyword in keywords):
-                    continue
-            
-            # 检查行业过滤
-            if 'industry' in filters and filters['industry'] and lead.industry:
-                if filters['industry'].lower() not in lead.industry.lower():
-                    continue
-            
-            # 检查邮箱黑名单
-            if 'email_blacklist' in filters and filters['email_blacklist'] and lead.email:
-                blacklist = filters['email_blacklist'].lower().split(',')
-                if any(blacklisted in lead.email.lower() for blacklisted in blacklist):
-                    continue
-            
-            filtered_leads.append(lead)
-        
-        return filtered_leads 
\ No newline at end of file
+from typing import List, Dict, Any, Optional, Union
+from agents.LeadSearchAgent.tools.DataSourceBaseTool import StandardizedLead, ICP
+from utils.field_mapper import FieldMapper
+from utils.dedup import LeadDeduplicator, dedupe_batch
+from utils.lead_batch import LeadBatch
+from utils.lead_filter import LeadFilter
+
+
+class DataStandardizer:
+    """数据标准化工具"""
+    
+    @staticmethod
+    def standardize_leads(raw_data: List[Dict[str, Any]], source_name: str, icp_id: Optional[str] = None) -> List[StandardizedLead]:
+        """标准化leads数据：按数据源的字段映射（configs/field_mappings.yaml）批量转换，未配置的数据源使用default映射"""
+        return FieldMapper.for_source(source_name).convert(raw_data, icp_id)
+    
+    @staticmethod
+    def merge_leads(all_leads: List[Union[List[StandardizedLead], LeadBatch]]) -> Union[List[StandardizedLead], LeadBatch]:
+        """合并多个数据源的leads
+        按工作邮箱、LinkedIn、公司域名+姓名、电话等多个键去重，重复记录字段级合并而不是直接丢弃；
+        全部为LeadBatch时在列式批次上合并并返回LeadBatch
+        """
+        if all_leads and all(isinstance(batch, LeadBatch) for batch in all_leads):
+            return dedupe_batch(LeadBatch.concat(all_leads))
+        deduplicator = LeadDeduplicator()
+        for leads_batch in all_leads:
+            deduplicator.extend(lead for lead in leads_batch if lead)
+        return deduplicator.results()
+    
+    @staticmethod
+    def filter_leads(leads: Union[List[StandardizedLead], LeadBatch], filters: Union[ICP, Dict[str, Any]]) -> Union[List[StandardizedLead], LeadBatch]:
+        """根据条件过滤leads
+        过滤条件（ICP或dict）先编译为LeadFilter，再对整批leads单次遍历；
+        同一条件重复过滤时可直接复用 LeadFilter.compile(filters).apply(leads)
+        """
+        return LeadFilter.compile(filters).apply(leads)
\ No newline at end of file
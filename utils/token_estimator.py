@@ -0,0 +1,30 @@
+import re
+from functools import lru_cache
+from typing import Optional
+
+# tiktoken为可选依赖，安装后按模型编码精确计数；否则按字符类别估算
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# 中日韩字符大致每字一个token，其余文本大致每4个字符一个token
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: Optional[str]):
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    """估算文本token数（用于限速预留与上下文预算，允许少量误差）"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4